@@ -1,225 +1,67 @@
 # Laad benodigde packages
 import streamlit as st
-import requests
-import numpy as np
+import uuid
 import pandas as pd
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-import torch
 
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+from klachtenbot.cache import toxicity_cache
+from klachtenbot.duplicates import duplicate_row, index_from_store, sync_index
+from klachtenbot.metrics import metrics
+from klachtenbot.model import STATUS_FAILED, registry
+from klachtenbot.results import score_row, snapshot_parameters
+from klachtenbot.rollups import rollups_from_store, sync_rollups
+from klachtenbot.service import get_service
+from klachtenbot.store import ORDERS, ComplaintStore
+from klachtenbot.worklist import claim_next, complete_item, release_item, sync_worklist, worklist_from_store
+from klachtenbot.triage import DEFAULT_HIGH_PRIORITY_CATEGORIES, analyze_complaint, categories, default_neighborhoods
 
 ######## FUNCTIES #########
 
-# Laad het Nederlandse toxicity model
-tokenizer = AutoTokenizer.from_pretrained("ml6team/robbert-dutch-base-toxic-comments")
-model = AutoModelForSequenceClassification.from_pretrained("ml6team/robbert-dutch-base-toxic-comments")
-model.to(device)  # This works only if model is loaded with real weights, not meta
-
-# Functie: Analyseren van toxiciteit op basis van robBERT-model. Geeft een probability score tussen 0 en 1.
-def analyze_toxicity(text):
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True, max_length=512)
-    inputs = {k: v.to(device) for k, v in inputs.items()}
-    with torch.no_grad():
-        outputs = model(**inputs)
-    probabilities = torch.nn.functional.softmax(outputs.logits, dim=-1)
-    toxicity_score = probabilities[0][1].item()
-    print(f"Toxicity: {toxicity_score}")
-    return toxicity_score
-
-# Functie: Berekenen van de prioriteitsscore op basis van toxicity score, categorie, keywords en wijkscore. Deze score wordt afgerond tussen 1 en 10.
-def calculate_priority_score(toxicity_score, category, found_keywords, text, neighborhood_score):
-    base_score = 2
-
-    # Adjust score based on toxicity
-    if toxicity_score > tox_threshold:
-        toxicity_factor = toxicity_score * 3  # Scale toxicity appropriately
-        base_score += toxicity_factor
-
-    # Adjust score based on category
-    if category in high_priority_categories:
-        base_score += 3
-    if category in categories and not "Onbekend":
-        base_score += 1
-        
-    # Adjust score based on urgent keywords
-    urgent_keywords = ["gevaarlijk", "onveilig", "spoed", "levensgevaar", "gewond", "overstroming", "brand", 
-                       "explosie", "instorting", "giftig", "gaslek", "stroomuitval", "ongeluk", "aanrijding", 
-                       "verwonding", "verstikking", "verdrinking", "bedreiging", "inbraak", "overval", "vandalisme", 
-                       "agressie", "geweld", "paniek", "evacuatie", "noodsituatie", "ramp", "crisis", "epidemie", 
-                       "besmetting", "vergiftiging", "ontploffing", "verzakking", "botsing", "calamiteit"]
-    if any(keyword in text.lower() for keyword in urgent_keywords):
-        base_score += 2
-
-    # Add neighborhood score
-    base_score += neighborhood_score
-
-    # Ensure the final score is between 1 and 10
-    final_score = max(1, min(round(base_score), 10))
-    return final_score
-
-# Functie: Analyseer klacht. Identificeert de categorie, 
-def analyze_complaint(text, updated_categories, neighborhood_score, tox_threshold=0.5):
-    toxicity_score = analyze_toxicity(text)
-    
-    # Match keywords using the updated categories
-    category_matches = {
-        category: [word for word in keywords if word in text.lower()]
-        for category, keywords in updated_categories.items()
-    }
-
-    # Find the category with the most matches
-    matched_category = max(category_matches, key=lambda category: len(category_matches[category]))
-
-    if len(category_matches) == 0:
-        matched_category = "Onbekend"
-    print("Matched Category:", matched_category)
-    print("Matched Keywords:", category_matches[matched_category])
-
-    
-    # Collect relevant keywords
-    relevant_keywords = category_matches[matched_category]
-
-    # Calculate priority score
-    priority_score = calculate_priority_score(toxicity_score, matched_category, relevant_keywords, text, neighborhood_score)
-
-    threat = toxicity_score > tox_threshold
-    return (
-        f"Klacht over {matched_category}: {', '.join(relevant_keywords)}",
-        matched_category,
-        threat,
-        relevant_keywords,
-        toxicity_score,
-        priority_score
-    )
-
-###############################################
-
-# Definieer categorieën en bijbehorende trefwoorden. Trefwoorden kunnen door gebruiker worden aangepast in het zijpaneel.
-categories = {
-    "Onbekend": [],
-    
-    "Infrastructuur": [
-        "wegen", "verkeer", "infrastructuur", "borden", "tunnel", "brug", "wegdek", "wegmarkering", 
-        "rotonde", "snelweg", "stoeprand", "verkeerslichten", "fietspad", "tegel", "putdeksel", "afsluiting", 
-        "fout wegdek", "slecht wegdek", "put", "stoep", "gaten in weg", "werkzaamheden", "wegenis", "wegomlegging", 
-        "verkeersregelaar", "belasting", "verkeershinder", "rijstrook", "oever", "bruggen", "kruispunt", 
-        "beton", "storing", "wegonderhoud", "wegconstructie", "rijbaan", "verkeersbord", "afslag", "politieblokkade", 
-        "borden", "drempel", "sloot", "wegversmalling", "wegbeveiliging", "achterstallig onderhoud", "slipgevaar", 
-        "fietsers", "auto", "afzetting", "straatmeubilair", "hoeken", "achteruitrijden", "snelheidsmeter", "geluidswal"
-    ],
-    
-    "Afvalbeheer": [
-        "afval", "vuilnis", "zwerfvuil", "container", "recycling", "scheiding", "plastic", "papier", "glas", 
-        "groenafval", "restafval", "tuinafval", "milieu", "ophaaldienst", "afvalzak", "afvalbak", "afvalbakken", 
-        "containerpark", "geur", "vuil", "verwerking", "afvalscheiding", "afvalophaal", "bak", "afvalcontainer", 
-        "hondenscheet", "zwerfvuilplaag", "struiken", "plastic zak", "luiers", "borden", "onvoldoende vuilnisbakken", 
-        "afvalindustrie", "restafval", "goederen", "grofvuil", "afvalinslag", "storten", "ongewenst vuil", "afvalverwerking", 
-        "plastic in zee", "afvalput", "geurhinder", "vuilniswagen", "kliko", "dierafval", "afvalmonsters", 
-        "afvaldistributie", "geurvervuiling", "hondenpoep", "afvalbeheer", "chemisch afval", "teveel afval", 
-        "verpakking", "afvalreductie", "gemeente vuil", "gesloten vuilnisbak", "groenafvalophaling", "niet gehaalde zakken"
-    ],
-
-    "Verlichting": [
-        "verlichting", "lampen", "straatverlichting", "verlichtingstekort", "lampen defect", "verlichtingspaal", 
-        "licht", "verlichtingsinstallatie", "lantaarnpaal", "verlichtingsproblemen", "lamp kapot", "flikkering", 
-        "onderhoud verlichting", "lampen branden niet", "energiebesparing verlichting", "lichtsterkte", "oplichtende paal", 
-        "verlichtingsoplossing", "kapotte straatlamp", "fout verlichting", "verkeerde verlichting", "verlichting vervangen", 
-        "verlichting uit", "lichteffecten", "brandende lamp", "lamp vervangen", "verlichtingstekort", "verlichte straat", 
-        "donkere straten", "overlast verlichting", "straatverlichting dimmen", "overlast van verlichting", 
-        "energiezuinige verlichting", "verlichtingsplan", "lichten", "straatlampen", "palen", "lampen schijnen", 
-        "lichtvervuiling", "lantaarns", "dimbaar", "lampen storen", "knipperende verlichting", "verlichtingsinfrastructuur", 
-        "led verlichting", "donkere zones", "nachtverlichting", "verlichting hangende kabels", "verlichting bij overgangen"
-    ],
-
-    "Overlast": [
-        "overlast", "lawaai", "hinder", "storing", "geluid", "overlastgevers", "buurtlawaai", "lawaai overlast", 
-        "storingen", "luidruchtig", "herrie", "geluidsoverlast", "overlast van verkeer", "geluidsoverlast woningen", 
-        "huisdieren", "gesprek", "drummen", "hoorn", "restaurantlawaai", "luide muziek", "scooters", "motorrijders", "vuurwerk", 
-        "geluidsbarrières", "overlast van apparaten", "verkeersgeluiden", "gedoe", "geluidshinder", "horecagelegenheden", 
-        "restauranthinder", "misbruik", "drukte", "onwenselijk gedrag", "groepjes", "stoornis", "woningen", 
-        "onrustige buurt", "buurtprobleem", "geluidsoverlast speeltuinen", "burenlawaai", "luidruchtige feestjes", 
-        "geen privacy", "lawaai van voertuigen", "overlast van bewoners", "lawaai tijdens nacht", "open ramen", 
-        "drukte op straat", "ergernis", "overtreding van stilte", "storing wifi", "smog", "overlast van roken", 
-        "lawaai van kinderen", "probleem met afval", "afvaloverlast", "jongerenlawaai", "weergalmende geluiden",
-        "hangjongeren", "hangjeugd"
-    ],
-
-    "Groenbeheer": [
-        "groen", "tuinen", "plantsoen", "bomen", "gras", "groenvoorziening", "groenonderhoud", "tuinbeheer", 
-        "planten", "bloemen", "tuin", "wilde planten", "planten in de openbare ruimte", "snoeien", "struiken", "takken", 
-        "schoonmaken", "groene plekken", "plantsoenonderhoud", "groene energie", "bomenkap", "dode bomen", "bloemplantsoen", 
-        "bladeren", "verwaarlozing", "onvoldoende groen", "tuinieren", "hagen", "waterbeheer", "wateroverlast", "bloei", 
-        "bomen planten", "tuinservice", "plantgoed", "boomverzorging", "groencompensatie", "zaaien", "gronddoelen", 
-        "ecologisch beheer", "buitenruimte", "bloemenperk", "moestuin", "wildgroei", "plantenverzorging", "kappen", 
-        "bloemenperken", "terrasbeplanting", "tuinonderhoud", "groenvoorzieningen", "onderhoud bomen", "aarden", 
-        "groenisolatie", "wilde bloemen", "afgevallen bladeren", "plantsoendiensten", "groenvoorzieningbeheer", "groenplan", 
-        "natuurbehoud", "natuurbescherming", "groenbeheer", "milieuplan", "rondstruinen", "groenplan"
-    ],
-
-    "Waterbeheer": [
-        "overstroming", "wateroverlast", "waterschade", "riolering", "watervoorziening", "afvoer", "dijk", "vloed", 
-        "stormwater", "waterput", "waterkwaliteit", "afwateren", "kanaal", "rivier", "waterbeheer", "pompstation", 
-        "waterpompen", "overbelaste riolering", "watervloed", "drainage", "regenwater", "waterkracht", "irrigatie", 
-        "sloot", "onderwaterdorp", "droogte", "waterproblematiek", "waterafvoer", "watermolen", "waterafvoersysteem", 
-        "dijkverhoging", "regensensor", "moeras", "polder", "waterberging", "vijver", "regenwatertank", "waterprijs", 
-        "waterinfrastructuur", "binnendijk", "beek", "waterzuivering", "afvoerleidingen", "vloedwal", "wateropvang", 
-        "ondergrondse waterpomp", "dijken", "waterproblemen", "grondwater", "schade door water", "boezem", "regenpijp", 
-        "waterputting", "waterpeil", "vijverbeheer", "overstromingsgebieden", "waterpompstations", "waterschapslasten"
-    ],
-
-    "Verkeer en Mobiliteit": [
-        "verkeer", "files", "verkeersdrukte", "verkeershinder", "stoplichten", "verkeersongeluk", "toegangspaden", 
-        "verkeerscirculatie", "parkeren", "parkeerproblemen", "verkeersregelaar", "omleiding", "auto's", "verkeersbord", 
-        "fietsers", "scooters", "motoren", "taxi's", "ov$", "trein", "bussen", "verkeersignalen", "verkeersintensiteit", 
-        "snelheidsmetingen", "auto parkeren", "blokken", "snelheid", "rijstroken", "stadsverkeer", "verkeersafsluitingen", 
-        "politiecontrole", "parkeerbelasting", "verkeersrondjes", "verkeersomleiding", "rijbanen", "rondrijden", "filedruk", 
-        "achterstallig onderhoud", "mobility as a service", "overvolle bussen", "overtredingen", "stadsvervoer"
-    ],
-
-    "Belastingen en geldzaken": [
-        "belasting", "aangifte", "inkomstenbelasting", "btw", "ozb", "gemeentebelasting", "heffing", "toeslag", "subsidie", "boete",
-        "betalingsregeling", "schuld", "kwijtschelding", "bezwaar", "belastingaanslag", "belastingdienst", "toeslagen", "hypotheek",
-        "lening", "sparen", "begroting", "inkomen", "uitgaven", "financiën", "rekening", "bankzaken", "verzekering", "pensioen",
-        "uitkering", "bijstand", "ww", "aow", "kinderbijslag", "studiefinanciering", "zorgtoeslag", "huurtoeslag", "kinderopvangtoeslag",
-        "belastingteruggave", "belastingaftrek", "vermogensbelasting", "erfbelasting", "schenkbelasting", "autobelasting", "wegenbelasting",
-        "afvalstoffenheffing", "rioolheffing", "waterschapsbelasting", "precariobelasting", "toeristenbelasting", "hondenbelasting",
-        "parkeergeld", "leges", "naheffing", "betalingsachterstand", "incasso", "deurwaarder", "bewindvoering", "budgetbeheer",
-        "schuldhulpverlening", "faillissement", "wsnp", "belastingvrije voet", "box 3", "voorlopige aanslag", "definitieve aanslag"
-]
-}
-
-###############################################
-
-# Lijst van Utrechtse wijken met prioriteitsscores tussen -2 en +2. Deze kunnen worden aangepast door de gebruiker in het zijpaneel.
-default_neighborhoods = {
-    "Binnenstad": 0,
-    "Lombok": 1,
-    "Wittevrouwen": -1,
-    "Oog in Al": -2,
-    "Leidsche Rijn": -1,
-    "Overvecht": 2,
-    "Kanaleneiland": 2,
-    "Zuilen": 1,
-    "Tuindorp": -2,
-    "Hoograven": 1,
-    "Tolsteeg": -1,
-    "Vleuten-De Meern": -1,
-    "Voordorp": -2,
-    "De Uithof (Utrecht Science Park)": 0,
-    "Nieuw Engeland": 1,
-    "Dichterswijk": 0,
-    "Rivierenwijk": 1,
-    "Hoge Weide": -1,
-    "Parkwijk": 0,
-    "Terwijde": -1,
-    "Papendorp": 2,
-    "Elinkwijk": 2,
-}
+# Laad het Nederlandse toxicity model op de achtergrond, zodat de pagina direct getoond wordt. Dankzij
+# st.cache_resource en het modelregister gebeurt dit één keer per proces, niet bij iedere rerun van het script.
+@st.cache_resource(show_spinner=False)
+def load_model():
+    return registry.warm_up_in_background()
+
+# Gedeelde, persistente opslag van alle geanalyseerde klachten (SQLite, zie KLACHTENBOT_DB)
+@st.cache_resource
+def get_store():
+    return ComplaintStore()
+
+# Gedeelde werklijst voor medewerkers, op de achtergrond opgebouwd uit de opslag en daarna bijgewerkt bij elke nieuwe
+# klacht
+@st.cache_resource
+def get_worklist():
+    return worklist_from_store(get_store(), background=True)
+
+# Gedeelde samenvattingen per wijk en categorie, op de achtergrond opgebouwd uit de opslag en daarna bijgewerkt bij
+# elke nieuwe klacht
+@st.cache_resource
+def get_rollups():
+    return rollups_from_store(get_store(), background=True)
+
+# Gedeelde index van bijna-dubbele klachten (petities, actiebrieven), op de achtergrond opgebouwd uit de opslag en
+# daarna bijgewerkt bij elke rerun
+@st.cache_resource
+def get_duplicate_index():
+    return index_from_store(get_store(), background=True)
+
+# Eén pagina van het overzicht. Het resultaat wordt tussen reruns bewaard; `version` verandert zodra er een klacht
+# bijkomt, zodat de cache dan vanzelf ververst.
+@st.cache_data(max_entries=256, show_spinner=False)
+def load_overview_page(version, parameters, neighborhoods, categories, threat, order, page, page_size, collapse):
+    return get_store().query(neighborhoods, categories, threat, order, page_size, (page - 1) * page_size, parameters,
+                             collapse)
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def count_overview(version, parameters, neighborhoods, categories, threat, collapse):
+    return get_store().count(neighborhoods, categories, threat, parameters, collapse)
 
 ################## STREAMLIT UI #############################
 
-# Onderstaande code stelt de Streamlit user interface in. Hierin wordt het uiterlijk van de pagina bepaalt, maar ook de opties voor de gebruiker om parameters van het algoritme aan te passen middels het zijpaneel. 
-# Deze aanpassingen zorgen voor veranderingen in de output van het algoritme. Bij het herladen van de pagina worden deze parameteraanpassingen én output gereset.
+# Onderstaande code stelt de Streamlit user interface in. Hierin wordt het uiterlijk van de pagina bepaalt, maar ook de
+# opties voor de gebruiker om parameters van het algoritme aan te passen middels het zijpaneel.
+# Deze aanpassingen zorgen voor veranderingen in de output van het algoritme. Bij het herladen van de pagina worden
+# deze parameteraanpassingen én output gereset.
 
 
 st.set_page_config(
@@ -231,22 +73,43 @@ st.set_page_config(
 # Streamlit UI
 st.title("🤖 Utrecht Klachtenbot 1.0 🤖")
 
-st.write("Welkom bij **Utrecht Klachtenbot 1.0**. Door middel van de meest geavanceerde AI zal ik ervoor zorgen dat uw klacht direct bij de juiste persoon komt. Zo zorg ik ervoor dat u zo snel mogelijk geholpen wordt.")
+st.write("Welkom bij **Utrecht Klachtenbot 1.0**. Door middel van de meest geavanceerde AI zal ik ervoor zorgen dat uw "
+         "klacht direct bij de juiste persoon komt. Zo zorg ik ervoor dat u zo snel mogelijk geholpen wordt.")
+
+# Model laden (eenmalig per proces, op de achtergrond) en de status tonen in het zijpaneel
+load_model()
+model_status = registry.status()
+model_ready = model_status["warmed_up"]
+if model_status["status"] == STATUS_FAILED:
+    st.error(f"Het toxiciteitsmodel kon niet geladen worden: {model_status['error']}")
+elif not model_ready:
+    st.info("Het toxiciteitsmodel wordt opgewarmd. U kunt uw klacht alvast invoeren.")
 
 # Add a header to the sidebar
 st.sidebar.header("Parameters")
+st.sidebar.caption(f"Model: {model_status['model_id']} ({model_status['backend']}, {model_status['status']}, "
+                   f"{model_status['device']})")
+cache_stats = toxicity_cache.stats()
+st.sidebar.caption(f"Cache: {cache_stats['size']} scores, hit rate {cache_stats['hit_rate']:.0%}")
+# Meetgegevens per stap (alleen met KLACHTENBOT_METRICS=1)
+if metrics.enabled:
+    with st.sidebar.expander("Meetgegevens", expanded=False):
+        st.json(metrics.snapshot(), expanded=False)
 
 # Hoge prioriteit categorieën
 with st.sidebar.expander("Hoge prioriteit categorieën", expanded=True):  # Collapsed by default
     high_priority_categories = st.sidebar.multiselect(
         "Kies categorieën om met hoge prioriteit te behandelen:",
         options=list(categories.keys()),
-        default=["Infrastructuur", "Verkeer en Mobiliteit", "Waterbeheer"]
+        default=DEFAULT_HIGH_PRIORITY_CATEGORIES
     )
 
 # Toxiciteit aanpassen
 with st.sidebar.expander("Toxiciteit", expanded=False):  # Collapsed by default
     tox_threshold = st.slider("Drempel toxiciteitsscore:", min_value=0.0, max_value=1.0, value=0.5, step=0.05)
+    # Lange klachten worden standaard in overlappende delen gescoord in plaats van na 512 tokens afgekapt
+    score_long_texts = st.checkbox("Lange klachten volledig scoren (in overlappende delen)", value=True)
+toxicity_options = {"chunked": score_long_texts}
 include_threats = st.sidebar.checkbox("Als dreigend aangemerkte berichten toevoegen aan resultaten", value=False)
 
 
@@ -269,12 +132,16 @@ with st.sidebar.expander("Trefwoorden per categorie", expanded=False):  # Collap
     updated_categories = {}
     for category, words in categories.items():
         updated_keywords = st.text_area(f"{category}", value=", ".join(words), height=100)
-        updated_categories[category] = [word.strip() for word in updated_keywords.split(",")]
+        # Lege trefwoorden (een leeg tekstvak of een komma aan het eind) worden weggelaten
+        updated_categories[category] = [word.strip() for word in updated_keywords.split(",") if word.strip()]
 
 
-# Create results table
-if 'results' not in st.session_state:
-    st.session_state.results = []
+# Resultaten worden bewaard in de gedeelde opslag, met per klacht de ruwe kenmerken. Het overzicht berekent dreiging en
+# prioriteitsscore met de huidige parameters uit het zijpaneel, zonder het model opnieuw aan te roepen.
+parameters = snapshot_parameters(tox_threshold, high_priority_categories, edited_neighborhoods, updated_categories)
+store = get_store()
+duplicates = get_duplicate_index()
+sync_index(duplicates, store, wait=False)
 
 
 # Verkrijg de locatie
@@ -282,21 +149,50 @@ user_location = st.selectbox("Kies uw wijk:", options=list(default_neighborhoods
 neighborhood_score = edited_neighborhoods[user_location]
 
 # Text box om de klacht in te schrijven
-user_input = st.text_area("Voer hier uw klacht voor de gemeente in. Geef alstublieft aan wat uw klacht is en - indien van toepassing - op welke locatie het probleem zich voordoet.", placeholder="Typ hier uw klacht...", height=250)
+user_input = st.text_area("Voer hier uw klacht voor de gemeente in. Geef alstublieft aan wat uw klacht is en - indien "
+                          "van toepassing - op welke locatie het probleem zich voordoet.",
+                          placeholder="Typ hier uw klacht...", height=250)
 
 # Output
 if user_input:
-    advice, category, threat, found_keywords, toxicity_score, priority_score  = analyze_complaint(user_input, updated_categories, neighborhood_score, tox_threshold)
-
-    # Toevoegen aan resultaten op basis van instelling
-    if include_threats or not threat:
-        st.session_state.results.append({
-            "klacht": user_input,
-            "wijk": user_location,  # Voorbeeldwaarde
-            "categorie": category,
-            "prioriteitsscore": priority_score,
-            "dreigend": threat
-        })
+    # Een bijna-dubbele klacht (bijvoorbeeld een kopie van een petitie) neemt de toxiciteit en trefwoorden van zijn
+    # cluster over. Dit wordt alleen bij het indienen bepaald, zodat reruns de klacht niet met zichzelf vergelijken.
+    submission = (user_input, user_location)
+    new_submission = st.session_state.get("last_submission") != submission
+    if new_submission:
+        st.session_state.duplicate_of = duplicates.match(user_input)
+    duplicate_of = st.session_state.get("duplicate_of")
+    matches = duplicate_category = semantic_category = None
+    if duplicate_of is not None:
+        toxicity_score = duplicate_of[1]["toxiciteit"]
+        matches = (duplicate_of[1]["treffers"], duplicate_of[1]["urgent"])
+        duplicate_category = duplicate_of[1]["categorie"]
+    # De toxiciteit wordt berekend door de gedeelde scoringsservice, die gelijktijdige sessies samen in één batch
+    # scoort; de semantische categorie komt uit dezelfde forward pass
+    elif model_ready:
+        toxicity_score, semantic_category = get_service().score(user_input, with_category=True, **toxicity_options)
+    else:
+        with st.spinner("Het toxiciteitsmodel wordt nog opgewarmd..."):
+            toxicity_score, semantic_category = get_service().score(user_input, with_category=True,
+                                                                    **toxicity_options)
+    advice, category, threat, found_keywords, toxicity_score, priority_score  = analyze_complaint(
+        user_input, updated_categories, neighborhood_score, tox_threshold, high_priority_categories,
+        toxicity_score=toxicity_score, matches=matches, category=duplicate_category,
+        semantic_category=semantic_category)
+
+    # Toevoegen aan resultaten. Een rerun met dezelfde klacht (bijvoorbeeld na het verschuiven van een slider) voegt
+    # geen nieuwe rij toe. Dreigende klachten worden bewaard, maar alleen getoond als dat is ingesteld. Categorie en
+    # treffers worden net als in de ingest-worker met de standaardtrefwoorden opgeslagen; aangepaste trefwoordenlijsten
+    # past het overzicht bij het opvragen toe (zie results.Recategorizer).
+    if new_submission:
+        st.session_state.last_submission = submission
+        stored_parameters = snapshot_parameters(tox_threshold, high_priority_categories, edited_neighborhoods)
+        if duplicate_of is not None:
+            row = duplicate_row(user_input, user_location, stored_parameters, duplicate_of)
+        else:
+            row = score_row(user_input, user_location, toxicity_score, stored_parameters,
+                            semantic_category=semantic_category)
+        duplicates.add_rows([row], store.append([row]))
 
     # Show results
     st.header("Analyse")
@@ -310,13 +206,86 @@ if user_input:
         if found_keywords:
             st.write(f"**Herkende trefwoorden:** {', '.join(found_keywords)}")
         st.write(f"**Locatie van de indiener:** {user_location}\n\n")
+        if duplicate_of is not None:
+            st.caption(f"Deze klacht lijkt sterk op klacht #{duplicate_of[0]}; de beoordeling daarvan is overgenomen.")
 
 
 else:
     st.write("Druk op Ctrl+Enter of tik rechtsonderin het tekstvak om de klacht te analyseren.")
 
-# Display results table
-if st.session_state.results:
+# Display results table. Filteren, sorteren en pagineren gebeurt in de database; alleen de zichtbare pagina wordt
+# opgehaald en naar de browser gestuurd.
+store_version = store.version()
+if store_version:
     st.header("Overzicht van klachten")
-    df = pd.DataFrame(st.session_state.results)
-    st.dataframe(df, use_container_width=False, hide_index=True)
+    filter_columns = st.columns(3)
+    selected_neighborhoods = filter_columns[0].multiselect("Wijk", options=list(default_neighborhoods.keys()))
+    selected_categories = filter_columns[1].multiselect("Categorie", options=list(categories.keys()))
+    if include_threats:
+        threat_choice = filter_columns[2].selectbox("Dreigend", options=["Alle", "Ja", "Nee"])
+        threat_filter = {"Alle": None, "Ja": True, "Nee": False}[threat_choice]
+    else:
+        threat_filter = False
+    order_columns = st.columns(3)
+    order = order_columns[0].selectbox("Sorteren op", options=list(ORDERS.keys()))
+    page_size = order_columns[1].selectbox("Klachten per pagina", options=[25, 50, 100], index=1)
+    # Kopieën van dezelfde petitie of actiebrief als één rij tonen, met het aantal klachten
+    collapse = st.checkbox("Bijna-dubbele klachten samenvoegen", value=True)
+
+    total = count_overview(store_version, parameters, selected_neighborhoods, selected_categories, threat_filter,
+                           collapse)
+    page_count = max(1, -(-total // page_size))
+    page = order_columns[2].number_input("Pagina", min_value=1, max_value=page_count, value=1, step=1)
+    df = load_overview_page(store_version, parameters, selected_neighborhoods, selected_categories,
+                                   threat_filter, order, int(page), page_size, collapse)
+    st.caption(f"Pagina {int(page)} van {page_count} ({total} {'clusters' if collapse else 'klachten'})")
+    st.dataframe(df.drop(columns=["id"]), use_container_width=False, hide_index=True)
+
+    # Samenvatting voor leidinggevenden: aantallen, gemiddelde prioriteit en aandeel dreigend per wijk en categorie.
+    # Deze worden per klacht bijgewerkt, zodat het opvragen niet afhangt van het aantal opgeslagen klachten.
+    rollups = get_rollups()
+    sync_rollups(rollups, store, wait=False)
+    if not rollups.loaded:
+        st.caption("De samenvatting per wijk en categorie wordt opgebouwd…")
+    else:
+        with st.expander("Samenvatting per wijk en categorie", expanded=False):
+            totals = rollups.totals(parameters)
+            total_columns = st.columns(3)
+            total_columns[0].metric("Klachten", totals["aantal"])
+            total_columns[1].metric("Gemiddelde prioriteit", f"{totals['gemiddelde_prioriteit']:.1f}")
+            total_columns[2].metric("Dreigend", f"{totals['aandeel_dreigend']:.0%}")
+            for tab, group in zip(st.tabs(["Per wijk", "Per categorie"]), ["wijk", "categorie"]):
+                summary = rollups.summary(group, parameters)
+                summary["aandeel_dreigend"] *= 100
+                tab.dataframe(summary, use_container_width=False, hide_index=True,
+                              column_config={"gemiddelde_prioriteit": st.column_config.NumberColumn(format="%.1f"),
+                                             "aandeel_dreigend": st.column_config.NumberColumn(format="%.0f%%")})
+
+
+# Werklijst: medewerkers pakken steeds de klacht met de hoogste prioriteit (en bij gelijke prioriteit de oudste) op.
+# Klachten die bij binnenkomst als dreigend zijn aangemerkt worden niet in behandeling genomen. Nieuwe klachten en
+# statuswijzigingen (ook die van een ingest-worker of een andere app in een ander proces) worden bij elke rerun uit de
+# opslag bijgewerkt, zonder te wachten als de werklijst nog wordt opgebouwd.
+worklist = get_worklist()
+sync_worklist(worklist, store, wait=False)
+if 'operator' not in st.session_state:
+    st.session_state.operator = uuid.uuid4().hex[:8]
+if not worklist.loaded:
+    st.caption("De werklijst voor medewerkers wordt opgebouwd…")
+else:
+    with st.expander(f"Werklijst medewerkers ({len(worklist)} open)", expanded=False):
+        next_items = worklist.peek(5)
+        if next_items:
+            st.dataframe(pd.DataFrame(next_items)[["id", "prioriteitsscore", "wijk", "categorie", "klacht"]],
+                         use_container_width=False, hide_index=True)
+            if st.button("Volgende klacht oppakken"):
+                claim_next(worklist, store, st.session_state.operator)
+        for item in worklist.claimed_by(st.session_state.operator):
+            st.write(f"**Opgepakt ({item['prioriteitsscore']}/10):** {item['klacht']}")
+            done_column, release_column = st.columns(2)
+            if done_column.button("Afronden", key=f"afronden-{item['id']}"):
+                complete_item(worklist, store, item["id"], st.session_state.operator)
+                st.rerun()
+            if release_column.button("Teruggeven", key=f"teruggeven-{item['id']}"):
+                release_item(worklist, store, item["id"], st.session_state.operator)
+                st.rerun()
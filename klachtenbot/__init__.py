@@ -0,0 +1,5 @@
+# Herbruikbare onderdelen van de Klachtenbot, los van de Streamlit UI.
+from klachtenbot.model import DEFAULT_MODEL_ID, ModelRegistry, get_model, registry
+from klachtenbot.toxicity import analyze_toxicity, analyze_toxicity_batch
+from klachtenbot.triage import (analyze_complaint, calculate_priority_score, categories, default_neighborhoods,
+                                score_priorities, triage_batch)
@@ -0,0 +1,5 @@
+import sys
+
+from klachtenbot.cli import main
+
+sys.exit(main())
@@ -0,0 +1,117 @@
+# Inferentie-backends voor CPU-servers. Naast het standaard fp32 PyTorch-model zijn er een dynamisch int8-gekwantiseerd
+# PyTorch-model en een naar ONNX geëxporteerde graaf die met ONNX Runtime draait. Alle backends bieden dezelfde
+# aanroep als een transformers-model (`model(**inputs).logits`), zodat de scoringscode niet hoeft te veranderen.
+import os
+import re
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+
+# torch wordt pas geïmporteerd als er een model geladen of gescoord wordt, zodat de app snel opstart.
+
+BACKENDS = ("torch", "torch-int8", "onnx")
+DEFAULT_BACKEND = os.environ.get("KLACHTENBOT_BACKEND", "torch")
+ONNX_DIR = os.environ.get("KLACHTENBOT_ONNX_DIR",
+                          os.path.join(os.path.expanduser("~"), ".cache", "klachtenbot", "onnx"))
+
+
+def resolve_backend(backend=None):
+    backend = backend or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Onbekende backend {backend}; kies uit {', '.join(BACKENDS)}.")
+    return backend
+
+
+# Functie: Huidig geheugengebruik (resident set size) van dit proces in bytes.
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        # Geen /proc (bijvoorbeeld macOS): val terug op het piekgebruik
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == "darwin" else usage * 1024
+
+
+# Functie: Dynamische int8-kwantisatie van alle lineaire lagen. Gewichten worden int8, activaties blijven float; dit
+# werkt alleen op de CPU.
+def quantize_dynamic(model):
+    import torch
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def onnx_path(model_id):
+    return os.path.join(ONNX_DIR, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_id.strip("/")), "model.onnx")
+
+
+# Functie: Exporteert het model naar ONNX met dynamische batch- en sequentielengte. De export gebeurt één keer; daarna
+# wordt het bestand hergebruikt.
+def export_onnx(model, tokenizer, path):
+    import torch
+
+    class LogitsOnly(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    example = tokenizer(["opwarmen", "een iets langere voorbeeldklacht"], return_tensors="pt", padding=True)
+    batch = torch.export.Dim("batch")
+    sequence = torch.export.Dim("sequence", max=model.config.max_position_embeddings)
+    torch.onnx.export(
+        LogitsOnly(model.eval()),
+        (example["input_ids"], example["attention_mask"]),
+        path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_shapes={"input_ids": {0: batch, 1: sequence}, "attention_mask": {0: batch, 1: sequence}},
+        dynamo=True,
+    )
+    return path
+
+
+# Klasse: ONNX Runtime-sessie met dezelfde aanroep als een transformers-model.
+class OnnxSequenceClassifier:
+    def __init__(self, path, num_threads=None):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("Voor de onnx-backend is onnxruntime nodig: pip install onnxruntime") from None
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.path = path
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def __call__(self, **inputs):
+        import torch
+        feeds = {name: np.asarray(inputs[name].cpu(), dtype=np.int64) for name in self.input_names}
+        logits = self.session.run(["logits"], feeds)[0]
+        return SimpleNamespace(logits=torch.from_numpy(logits))
+
+    def to(self, device):
+        return self
+
+    def eval(self):
+        return self
+
+
+# Functie: Zet een geladen fp32-model om naar de gevraagde backend. Geeft het model en het device terug.
+def prepare_backend(model, tokenizer, model_id, backend, device):
+    if backend == "torch":
+        return model.to(device).eval(), device
+    import torch
+    cpu = torch.device("cpu")
+    if backend == "torch-int8":
+        return quantize_dynamic(model.to(cpu).eval()), cpu
+    path = onnx_path(model_id)
+    if not os.path.exists(path):
+        export_onnx(model.to(cpu), tokenizer, path)
+    return OnnxSequenceClassifier(path), cpu
@@ -0,0 +1,157 @@
+# Benchmarks van de triagepijplijn. Elk onderdeel (toxiciteitsmodel, trefwoorden, prioriteitsscore en de volledige
+# analyze_complaint) wordt apart gemeten op synthetische klachten, zodat zichtbaar is waar de tijd heen gaat. Met het
+# lokale testmodel (zie testmodel.py) draait dit volledig offline.
+import json
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from klachtenbot.backends import rss_bytes
+from klachtenbot.cache import ToxicityCache
+from klachtenbot.keywords import get_matcher
+from klachtenbot.model import registry
+from klachtenbot.synthetic import ComplaintGenerator
+from klachtenbot.tokens import token_cache
+from klachtenbot.toxicity import analyze_toxicity, analyze_toxicity_batch
+from klachtenbot.triage import (DEFAULT_HIGH_PRIORITY_CATEGORIES, analyze_complaint, calculate_priority_score,
+                                categories, default_neighborhoods, score_priorities, select_category, urgent_keywords)
+
+# Meet in een vers proces hoe lang importeren, model laden en de eerste score duren, en of torch al bij het importeren
+# van de app-modules geladen werd.
+_STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import klachtenbot.results, klachtenbot.service, klachtenbot.store, klachtenbot.worklist
+imported = time.perf_counter()
+torch_at_import = "torch" in sys.modules
+from klachtenbot.model import registry
+from klachtenbot.toxicity import analyze_toxicity
+loaded = registry.get(sys.argv[1] or None, sys.argv[2] or None)
+ready = time.perf_counter()
+analyze_toxicity("eerste klacht", loaded.model_id, sys.argv[2] or None)
+first = time.perf_counter()
+print(json.dumps({"import_seconds": imported - start, "load_seconds": ready - imported,
+                  "first_score_seconds": first - ready, "torch_at_import": torch_at_import}))
+"""
+
+STAGES = ("toxiciteit", "toxiciteit-batch", "trefwoorden", "prioriteit", "prioriteit-vector", "analyse")
+
+
+# Functie: Hoogste geheugengebruik (RSS) van het proces tot nu toe, in bytes.
+def peak_rss_bytes():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+# Functie: Vat een reeks metingen (seconden per aanroep, met `items` klachten per aanroep) samen tot percentielen in
+# milliseconden, doorvoer en geheugengebruik.
+def summarize(stage, timings, items=1):
+    timings = np.asarray(timings, dtype=np.float64)
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99]) * 1000
+    total = timings.sum()
+    rss = rss_bytes()
+    return {
+        "stage": stage,
+        "calls": len(timings),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "complaints_per_second": len(timings) * items / total if total else float("inf"),
+        "rss_mb": rss / 2**20,
+        "peak_rss_mb": max(rss, peak_rss_bytes()) / 2**20,
+    }
+
+
+def _time_calls(function, arguments):
+    timings = []
+    for args in arguments:
+        start = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+# Functie: Meet de opstarttijd in `runs` nieuwe processen: importeren van de app-modules, laden van het model en de
+# eerste score, plus de totale tijd inclusief het starten van Python. Geeft de mediaan per onderdeel terug.
+def measure_startup(model_id=None, backend=None, runs=3):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", _STARTUP_SCRIPT, model_id or "", backend or ""],
+                                capture_output=True, text=True, check=True).stdout
+        sample = json.loads(output.strip().splitlines()[-1])
+        sample["process_seconds"] = time.perf_counter() - start
+        samples.append(sample)
+    summary = {key: float(np.median([sample[key] for sample in samples]))
+               for key in ("import_seconds", "load_seconds", "first_score_seconds", "process_seconds")}
+    summary["torch_at_import"] = any(sample["torch_at_import"] for sample in samples)
+    summary["runs"] = runs
+    return summary
+
+
+# Functie: Draait alle onderdelen op `n` synthetische klachten en geeft per onderdeel een samenvatting terug.
+# Het model wordt vooraf geladen en opgewarmd; laadtijd telt dus niet mee in de latenties.
+def run_benchmark(n=500, model_id=None, backend=None, batch_size=32, seed=42, length="mixed", duplicate_rate=0.1,
+                  stages=STAGES, warmup=5):
+    complaints = ComplaintGenerator(seed=seed, length=length, duplicate_rate=duplicate_rate).generate(n)
+    texts = [text for text, _ in complaints]
+    loaded = registry.warm_up(model_id, backend)
+    report = []
+
+    matcher = get_matcher(categories, urgent_keywords)
+    matches = [matcher.match(text) for text in texts]
+    chosen = [select_category(category_matches) for category_matches, _ in matches]
+    toxicity = np.random.default_rng(seed).random(n)
+
+    # Elk onderdeel met het model begint met een lege tokencache, zodat tokeniseren steeds meetelt
+    if "toxiciteit" in stages:
+        token_cache.clear()
+        _time_calls(analyze_toxicity, [(text, model_id, backend) for text in texts[:warmup]])
+        report.append(summarize("toxiciteit", _time_calls(analyze_toxicity, [(t, model_id, backend) for t in texts])))
+
+    if "toxiciteit-batch" in stages:
+        token_cache.clear()
+        batches = [texts[i:i + batch_size] for i in range(0, n, batch_size)]
+        timings = _time_calls(
+            lambda batch: analyze_toxicity_batch(batch, batch_size, model_id=model_id, backend=backend),
+            [(batch,) for batch in batches])
+        row = summarize("toxiciteit-batch", timings, batch_size)
+        row["complaints_per_second"] = n / sum(timings)
+        row["padding_ratio"] = token_cache.stats()["padding_ratio"]
+        row["unsorted_padding_ratio"] = token_cache.stats()["unsorted_padding_ratio"]
+        report.append(row)
+
+    if "trefwoorden" in stages:
+        report.append(summarize("trefwoorden", _time_calls(matcher.match, [(text,) for text in texts])))
+
+    if "prioriteit" in stages:
+        arguments = [(toxicity[i], chosen[i], matches[i][0].get(chosen[i], []), texts[i],
+                      default_neighborhoods[complaints[i][1]], 0.5, DEFAULT_HIGH_PRIORITY_CATEGORIES,
+                      bool(matches[i][1]))
+                     for i in range(n)]
+        report.append(summarize("prioriteit", _time_calls(calculate_priority_score, arguments)))
+
+    if "prioriteit-vector" in stages:
+        urgent = np.array([bool(hits) for _, hits in matches])
+        neighborhoods = [neighborhood for _, neighborhood in complaints]
+        timings = _time_calls(score_priorities, [(toxicity, chosen, urgent, neighborhoods)] * 20)
+        report.append(summarize("prioriteit-vector", timings, n))
+
+    if "analyse" in stages:
+        # Een eigen, lege cache: dubbele klachten leveren zo een realistisch aantal cachetreffers op
+        cache = ToxicityCache(maxsize=max(n, 1))
+        token_cache.clear()
+        options = {"model_id": loaded.model_id, "cache": cache}
+        if backend:
+            options["backend"] = backend
+        arguments = [(text, categories, default_neighborhoods[neighborhood], 0.5, DEFAULT_HIGH_PRIORITY_CATEGORIES,
+                      None, options) for text, neighborhood in complaints]
+        row = summarize("analyse", _time_calls(analyze_complaint, arguments))
+        row["cache_hit_rate"] = cache.stats()["hit_rate"]
+        row["token_cache_hit_rate"] = token_cache.stats()["hit_rate"]
+        report.append(row)
+
+    return report
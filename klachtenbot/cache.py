@@ -0,0 +1,157 @@
+# Cache voor toxiciteitsscores, zodat identieke of opnieuw ingediende klachten het model niet opnieuw aanroepen. De
+# sleutel is een hash van de genormaliseerde tekst, het model id en de scoringsinstellingen (inclusief het
+# categoriemodel). Bij de score wordt de semantische categorie uit dezelfde forward pass bewaard (zie
+# klachtenbot.categorizer). Naast een begrensde LRU in het geheugen kan de cache optioneel in een SQLite-bestand worden
+# bewaard.
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from klachtenbot.metrics import metrics
+from klachtenbot.model import DEFAULT_MODEL_ID
+from klachtenbot.tokens import normalize_text, token_cache
+from klachtenbot.toxicity import DEFAULT_BATCH_SIZE, analyze_toxicity_batch, scoring_variant
+
+DEFAULT_CACHE_SIZE = int(os.environ.get("KLACHTENBOT_CACHE_SIZE", "10000"))
+
+def cache_key(text, model_id=None, variant=""):
+    model_id = model_id or DEFAULT_MODEL_ID
+    return hashlib.sha256(f"{model_id}\0{variant}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class ToxicityCache:
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS toxicity (key TEXT PRIMARY KEY, model_id TEXT, score REAL,"
+                             " categorie TEXT)")
+            # Een cachebestand van vóór de semantische categorie
+            if "categorie" not in {row[1] for row in self._db.execute("PRAGMA table_info(toxicity)")}:
+                self._db.execute("ALTER TABLE toxicity ADD COLUMN categorie TEXT")
+            self._db.commit()
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    # Functie: Geeft (score, semantische categorie of None) terug, of None als deze tekst nog niet met dit model en
+    # deze instellingen is gescoord.
+    def get_entry(self, text, model_id=None, variant=""):
+        key = cache_key(text, model_id, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self._db is not None:
+                row = self._db.execute("SELECT score, categorie FROM toxicity WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    entry = (row[0], row[1])
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, entry)
+            return entry
+
+    # Functie: Geeft de opgeslagen score terug, of None als deze tekst nog niet met dit model is gescoord.
+    def get(self, text, model_id=None, variant=""):
+        entry = self.get_entry(text, model_id, variant)
+        return None if entry is None else entry[0]
+
+    def put(self, text, score, model_id=None, variant="", category=None):
+        self.put_many([(text, score, category)], model_id, variant)
+
+    # Functie: Bewaart scores; items zijn (tekst, score) of (tekst, score, semantische categorie).
+    def put_many(self, items, model_id=None, variant=""):
+        model_id = model_id or DEFAULT_MODEL_ID
+        rows = [(cache_key(text, model_id, variant), model_id, float(score), category[0] if category else None)
+                for text, score, *category in items]
+        with self._lock:
+            for key, _, score, category in rows:
+                self._remember(key, (score, category))
+            if self._db is not None:
+                self._db.executemany("INSERT OR REPLACE INTO toxicity (key, model_id, score, categorie)"
+                                     " VALUES (?, ?, ?, ?)", rows)
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM toxicity")
+                self._db.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "path": self.path,
+        }
+
+
+# Eén cache per proces, gedeeld tussen alle sessies. Met KLACHTENBOT_CACHE_DB wordt de cache in SQLite bewaard.
+toxicity_cache = ToxicityCache(path=os.environ.get("KLACHTENBOT_CACHE_DB"))
+
+
+def _cache_metrics():
+    stats = toxicity_cache.stats()
+    tokens = token_cache.stats()
+    return {"cache_entries": stats["size"], "cache_hits": stats["hits"], "cache_misses": stats["misses"],
+            "cache_hit_rate": stats["hit_rate"], "token_cache_hit_rate": tokens["hit_rate"],
+            "padding_ratio": tokens["padding_ratio"], "unsorted_padding_ratio": tokens["unsorted_padding_ratio"]}
+
+
+metrics.add_collector(_cache_metrics)
+
+
+# Functie: Toxiciteitsscore via de cache; alleen bij een cache miss wordt het model aangeroepen. Extra options (zoals
+# chunked of max_length) worden doorgegeven aan analyze_toxicity_batch. Met with_category=True komt er
+# (score, semantische categorie of None) terug.
+def cached_toxicity(text, model_id=None, cache=None, with_category=False, **options):
+    scores, labels = cached_toxicity_batch([text], model_id=model_id, cache=cache, with_categories=True, **options)
+    return (float(scores[0]), labels[0]) if with_category else float(scores[0])
+
+
+# Functie: Gebatchte variant van cached_toxicity. Alleen unieke teksten zonder cache-entry gaan door het model. Met
+# with_categories=True komen ook de semantische categorieën terug (zie analyze_toxicity_batch).
+def cached_toxicity_batch(texts, batch_size=DEFAULT_BATCH_SIZE, model_id=None, cache=None, with_categories=False,
+                          **options):
+    cache = toxicity_cache if cache is None else cache
+    variant = scoring_variant(**options)
+    texts = list(texts)
+    scores = np.empty(len(texts), dtype=np.float32)
+    labels = [None] * len(texts)
+    missing = {}
+    for i, text in enumerate(texts):
+        entry = cache.get_entry(text, model_id, variant)
+        if entry is None:
+            missing.setdefault(normalize_text(text), []).append(i)
+        else:
+            scores[i], labels[i] = entry
+
+    if missing:
+        unique_texts = [texts[indices[0]] for indices in missing.values()]
+        new_scores, new_labels = analyze_toxicity_batch(unique_texts, batch_size=batch_size, model_id=model_id,
+                                                        with_categories=True, **options)
+        for indices, score, label in zip(missing.values(), new_scores, new_labels):
+            scores[indices] = score
+            for i in indices:
+                labels[i] = label
+        cache.put_many(zip(unique_texts, new_scores, new_labels), model_id, variant)
+    return (scores, labels) if with_categories else scores
@@ -0,0 +1,139 @@
+# Semantische categorisering als aanvulling op de trefwoorden. Het toxiciteitsmodel berekent voor elke klacht al de
+# verborgen toestanden van de encoder; het gemiddelde daarvan over de tokens is een embedding van de klacht. Die wordt
+# in dezelfde forward pass als de toxiciteit meegenomen en met één matrixvermenigvuldiging vergeleken met een vooraf
+# berekende centroid per categorie. Een klacht zonder herkende trefwoorden krijgt zo de categorie die er inhoudelijk
+# het meest op lijkt, in plaats van de eerste categorie uit de lijst. De categorie gaat samen met de toxiciteitsscore
+# terug naar de aanroeper (en in de scorecache, zie klachtenbot.cache).
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from klachtenbot.metrics import metrics
+
+DEFAULT_CATEGORIZER = os.environ.get("KLACHTENBOT_CATEGORIZER") or None
+# Minimale cosinusgelijkenis met de dichtstbijzijnde centroid; daaronder blijft de categorie onbepaald
+DEFAULT_MIN_SIMILARITY = 0.2
+# Categorieën met minder voorbeeldklachten krijgen hun trefwoorden er als korte voorbeeldteksten bij
+MIN_EXAMPLES = 5
+
+
+def _normalize_rows(matrix):
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+# Klasse: Centroids per categorie in de embeddingruimte van één model.
+class SemanticCategorizer:
+    def __init__(self, centroids, names, mean=None, min_similarity=DEFAULT_MIN_SIMILARITY, model_id="", name=""):
+        self.centroids = _normalize_rows(np.asarray(centroids, dtype=np.float32))
+        self.names = list(names)
+        # Gemiddelde embedding; wordt eerst afgetrokken, omdat alle embeddings van een encoder dezelfde kant op wijzen
+        self.mean = (np.zeros(self.centroids.shape[1], dtype=np.float32) if mean is None
+                     else np.asarray(mean, np.float32))
+        self.min_similarity = min_similarity
+        self.model_id = model_id
+        self.name = name
+        # Vingerafdruk van centroids, namen en drempel, zodat gecachete categorieën bij dit categoriemodel blijven
+        digest = hashlib.sha256(self.centroids.tobytes() + self.mean.tobytes())
+        digest.update(json.dumps([self.names, self.min_similarity]).encode("utf-8"))
+        self.fingerprint = digest.hexdigest()[:16]
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.classified = 0
+        self.assigned = 0
+
+    # Functie: De dichtstbijzijnde categorie per embedding, of None als de gelijkenis onder min_similarity blijft.
+    # Geeft ook de gelijkenissen terug.
+    def classify(self, embeddings):
+        similarity = _normalize_rows(np.asarray(embeddings, dtype=np.float32) - self.mean) @ self.centroids.T
+        best = similarity.argmax(axis=1)
+        scores = similarity[np.arange(len(best)), best]
+        labels = [self.names[i] if score >= self.min_similarity else None for i, score in zip(best, scores)]
+        return labels, scores
+
+    # Functie: De categorie (of None) van gescoorde teksten uit hun embeddings, met bijhouden van de statistieken.
+    def assign(self, embeddings):
+        labels, _ = self.classify(embeddings)
+        with self._lock:
+            self.classified += len(labels)
+            self.assigned += sum(label is not None for label in labels)
+        return labels
+
+    def stats(self):
+        return {"name": self.name, "categories": len(self.names), "classified": self.classified,
+                "assigned": self.assigned}
+
+    # Functie: Berekent de centroids uit embeddings van voorbeeldteksten met hun categorie: het genormaliseerde
+    # gemiddelde per categorie, na aftrek van de gemiddelde embedding.
+    @classmethod
+    def from_embeddings(cls, embeddings, labels, names=None, **kwargs):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        labels = np.asarray(labels, dtype=object)
+        names = sorted(set(labels)) if names is None else [name for name in names if np.any(labels == name)]
+        mean = embeddings.mean(axis=0)
+        centered = _normalize_rows(embeddings - mean)
+        centroids = np.stack([centered[labels == name].mean(axis=0) for name in names])
+        return cls(centroids, names, mean, **kwargs)
+
+    def save(self, path):
+        config = {"names": self.names, "min_similarity": self.min_similarity, "model_id": self.model_id}
+        np.savez_compressed(path, centroids=self.centroids, mean=self.mean, config=np.array(json.dumps(config)))
+        return path
+
+    @classmethod
+    def load(cls, path, **overrides):
+        with np.load(path) as data:
+            config = json.loads(str(data["config"]))
+            config.update(overrides)
+            return cls(data["centroids"], mean=data["mean"], name=os.path.basename(path), **config)
+
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+# Functie: Laadt een categoriemodel één keer per proces, zodat alle aanroepen dezelfde cache delen.
+def load_categorizer(path):
+    with _loaded_lock:
+        if path not in _loaded:
+            _loaded[path] = SemanticCategorizer.load(path)
+        return _loaded[path]
+
+
+# Functie: Het categoriemodel voor deze aanroep: een pad, een SemanticCategorizer of standaard
+# KLACHTENBOT_CATEGORIZER. Een lege string schakelt de semantische categorisering uit.
+def resolve_categorizer(categorizer=None):
+    if isinstance(categorizer, SemanticCategorizer):
+        return categorizer
+    path = DEFAULT_CATEGORIZER if categorizer is None else categorizer
+    return load_categorizer(path) if path else None
+
+
+# Functie: Voorbeeldteksten per categorie om centroids uit te berekenen: klachten met een bekende categorie (uit een
+# kolom of uit de trefwoorden), aangevuld met de trefwoorden zelf voor categorieën met weinig voorbeelden.
+def training_examples(texts, labels, categories, min_examples=MIN_EXAMPLES):
+    examples = [(text, label) for text, label in zip(texts, labels) if label in categories]
+    counts = {category: 0 for category in categories}
+    for _, label in examples:
+        counts[label] += 1
+    for category, words in categories.items():
+        if counts[category] < min_examples:
+            examples.extend((f"Klacht over {word}", category) for word in words if word)
+    return examples
+
+
+# Functie: Meetwaarden per geladen categoriemodel, met het pad als label.
+def _categorizer_metrics():
+    gauges = {}
+    for path, categorizer in list(_loaded.items()):
+        stats = categorizer.stats()
+        gauges.update({("semantic_classified", (("categorizer", path),)): stats["classified"],
+                       ("semantic_assigned", (("categorizer", path),)): stats["assigned"]})
+    return gauges
+
+
+metrics.add_collector(_categorizer_metrics)
@@ -0,0 +1,684 @@
+# Command line interface voor bulktriage zonder Streamlit. Voorbeeld:
+#
+#   python -m klachtenbot triage klachten.csv resultaten.parquet --text-column klacht --wijk-column wijk
+#
+# De invoer wordt in blokken gelezen, gescoord en direct weggeschreven, zodat het geheugengebruik constant blijft.
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+import numpy as np
+
+from klachtenbot.backends import BACKENDS
+from klachtenbot.benchmark import STAGES, measure_startup, run_benchmark
+from klachtenbot.categorizer import DEFAULT_MIN_SIMILARITY, MIN_EXAMPLES, SemanticCategorizer, training_examples
+from klachtenbot.columnar import ResultBatch, ResultFileWriter, write_results
+from klachtenbot.duplicates import DEFAULT_DUPLICATE_THRESHOLD, NearDuplicateIndex
+from klachtenbot.ingest import (DEFAULT_MAX_IN_FLIGHT, PROCESSING_DIR, DirectorySource, IngestWorker, SocketSource,
+                               submit)
+from klachtenbot.keywords import get_matcher
+from klachtenbot.loadtest import DEFAULT_APP, DEFAULT_LEVELS, run_load_test
+from klachtenbot.metrics import metrics
+from klachtenbot.model import export_artifact, registry
+from klachtenbot.pool import ScoringPool
+from klachtenbot.prefilter import DEFAULT_CLEAN_BELOW, EVALUATION_BANDS, Prefilter, evaluate
+from klachtenbot.results import snapshot_parameters
+from klachtenbot.service import DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT_MS, HttpScoringClient, ScoringService, serve
+from klachtenbot.store import ComplaintStore
+from klachtenbot.synthetic import ComplaintGenerator
+from klachtenbot.toxicity import (AGGREGATES, DEFAULT_BATCH_SIZE, DEFAULT_MAX_LENGTH, DEFAULT_STRIDE,
+                                  analyze_toxicity_batch, compare_backends, embed_texts)
+from klachtenbot.triage import (DEFAULT_HIGH_PRIORITY_CATEGORIES, categories, default_neighborhoods, select_category,
+                                triage_batch)
+from klachtenbot.worklist import WorkList
+
+RESULT_COLUMNS = ["klacht", "wijk", "categorie", "prioriteitsscore", "dreigend", "toxiciteit", "trefwoorden"]
+
+
+def _format_for(path, explicit=None):
+    if explicit:
+        return explicit
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if extension == ".parquet":
+        return "parquet"
+    if extension in (".arrow", ".feather"):
+        return "arrow"
+    raise ValueError(f"Onbekend bestandsformaat voor {path}; gebruik --input-format of --output-format.")
+
+
+# Functie: Leest klachten regel voor regel uit een CSV- of JSONL-bestand en geeft (tekst, wijk, rij) terug.
+def read_complaints(path, text_column="klacht", neighborhood_column="wijk", file_format=None):
+    file_format = _format_for(path, file_format)
+    with open(path, newline="", encoding="utf-8") as f:
+        if file_format == "csv":
+            rows = csv.DictReader(f)
+        elif file_format == "jsonl":
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            raise ValueError(f"Invoerformaat {file_format} wordt niet ondersteund; gebruik csv of jsonl.")
+        for row in rows:
+            text = row.get(text_column) or ""
+            if not text.strip():
+                continue
+            yield text, row.get(neighborhood_column) or "", row
+
+
+class CsvResultWriter:
+    def __init__(self, path, columns):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=columns, extrasaction="ignore")
+        self._writer.writeheader()
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class JsonlResultWriter:
+    def __init__(self, path, columns):
+        self._columns = columns
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, rows):
+        for row in rows:
+            self._file.write(json.dumps({c: row.get(c) for c in self._columns}, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+# Klasse: Schrijft de resultaten kolomsgewijs (zie klachtenbot.columnar): wijk en categorie als dictionary, getallen
+# met een vaste breedte.
+class ParquetResultWriter:
+    file_format = "parquet"
+
+    def __init__(self, path, columns):
+        self._columns = columns
+        self._writer = ResultFileWriter(path, self.file_format)
+
+    def write(self, rows):
+        self._writer.write(ResultBatch.from_rows(rows, self._columns))
+
+    def close(self):
+        # Ook zonder resultaten een bestand met de kolommen
+        if not self._writer.rows:
+            self._writer.write(ResultBatch.from_rows([], self._columns))
+        self._writer.close()
+
+
+# Klasse: Als ParquetResultWriter, maar als Arrow IPC-bestand dat memory-mapped kan worden ingelezen.
+class ArrowResultWriter(ParquetResultWriter):
+    file_format = "arrow"
+
+
+RESULT_WRITERS = {"csv": CsvResultWriter, "jsonl": JsonlResultWriter, "parquet": ParquetResultWriter,
+                  "arrow": ArrowResultWriter}
+
+
+def open_result_writer(path, file_format=None, columns=RESULT_COLUMNS):
+    return RESULT_WRITERS[_format_for(path, file_format)](path, columns)
+
+
+def _load_json(path, default):
+    if not path:
+        return default
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _chunks(iterator, size):
+    iterator = iter(iterator)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Functie: Voert de volledige triage uit over een invoerbestand en schrijft de resultaten blok voor blok weg.
+# Geeft het aantal verwerkte klachten en de verstreken tijd terug.
+def run_triage(args, log=sys.stderr):
+    updated_categories = _load_json(args.keywords, categories)
+    neighborhood_scores = _load_json(args.neighborhoods, default_neighborhoods)
+    columns = RESULT_COLUMNS + ([args.id_column] if args.id_column else [])
+    toxicity_options = {"max_length": args.max_length, "chunked": args.chunked, "stride": args.stride,
+                        "aggregate": args.aggregate, "backend": args.backend, "prefilter": args.prefilter,
+                        "prefilter_threshold": args.prefilter_threshold, "categorizer": args.categorizer}
+
+    service = HttpScoringClient(args.service) if args.service else None
+    pool = None
+    if args.workers > 1 and service is None:
+        pool = ScoringPool(args.workers, args.threads_per_worker, args.model, args.backend, args.batch_size).start()
+        print(f"{pool.workers} scoringsprocessen met elk {pool.threads_per_worker} threads", file=log)
+
+    complaints = read_complaints(args.input, args.text_column, args.wijk_column, args.input_format)
+    writer = open_result_writer(args.output, args.output_format, columns)
+    worklist = WorkList() if args.top else None
+    processed = 0
+    start = time.perf_counter()
+    chunks = _chunks(complaints, args.chunk_size)
+    if pool is not None:
+        # De toxiciteit van de volgende blokken wordt al berekend terwijl dit blok wordt afgehandeld
+        scored = pool.map_chunks(chunks, lambda chunk: [text for text, _, _ in chunk], **toxicity_options)
+    else:
+        scored = ((chunk, None, None) for chunk in chunks)
+    try:
+        for chunk, toxicity_scores, semantic_categories in scored:
+            texts = [text for text, _, _ in chunk]
+            neighborhoods = [neighborhood for _, neighborhood, _ in chunk]
+            results = triage_batch(texts, neighborhoods, updated_categories, neighborhood_scores, args.tox_threshold,
+                                   args.high_priority, args.batch_size, args.model, toxicity_options, service,
+                                   toxicity_scores, semantic_categories)
+            if args.id_column:
+                for result, (_, _, row) in zip(results, chunk):
+                    result[args.id_column] = row.get(args.id_column)
+            if worklist is not None:
+                # Het id in de werklijst is het rijnummer in het invoerbestand (of de --id-column)
+                for row_number, result in enumerate(results, start=processed + 1):
+                    if not (args.exclude_threats and result["dreigend"]):
+                        worklist.push(result.get(args.id_column, row_number), result["prioriteitsscore"], row_number,
+                                      {"wijk": result["wijk"], "categorie": result["categorie"],
+                                       "klacht": result["klacht"][:80]})
+            if args.exclude_threats:
+                results = [result for result in results if not result["dreigend"]]
+            writer.write(results)
+
+            processed += len(chunk)
+            elapsed = time.perf_counter() - start
+            print(f"{processed} klachten verwerkt ({processed / elapsed:.1f} klachten/s)", file=log)
+    finally:
+        writer.close()
+        if pool is not None:
+            pool.stop()
+
+    elapsed = time.perf_counter() - start
+    rate = processed / elapsed if elapsed > 0 else 0.0
+    print(f"Klaar: {processed} klachten in {elapsed:.1f} s ({rate:.1f} klachten/s)", file=log)
+    if worklist is not None:
+        print(f"Top {args.top} van de werklijst:", file=log)
+        for item in worklist.peek(args.top):
+            print(f"  [{item['prioriteitsscore']:>2}] #{item['id']} {item['wijk']} / {item['categorie']}: "
+                  f"{item['klacht']}", file=log)
+    return processed, elapsed
+
+
+# Voorbeeldklachten voor de backendvergelijking als er geen invoerbestand is opgegeven
+SAMPLE_COMPLAINTS = [
+    "De straatverlichting in onze straat is al weken kapot, het is 's avonds erg donker en onveilig.",
+    "Er ligt al dagen zwerfvuil naast de container en de vuilniszakken worden niet opgehaald.",
+    "Het fietspad bij de rotonde zit vol gaten, er zijn al meerdere fietsers gevallen.",
+    "Ik krijg een boete voor parkeren terwijl ik een vergunning heb, dit is belachelijk.",
+    "Jullie zijn een stelletje incompetente idioten, doe eens je werk!",
+    "Na de regenbui van gisteren staat de hele straat blank, de riolering kan het niet aan.",
+    "Hangjongeren maken elke nacht lawaai bij het speeltuintje, we kunnen niet slapen.",
+    "De bomen in het plantsoen worden niet gesnoeid en de takken hangen over de stoep.",
+]
+
+
+# Functie: Drukt een vergelijking van de inferentie-backends af (zie compare_backends).
+def run_backends(args, out=sys.stdout):
+    if args.input:
+        texts = [text for text, _, _ in islice(read_complaints(args.input, args.text_column), args.limit)]
+    else:
+        texts = SAMPLE_COMPLAINTS
+    report = compare_backends(texts, args.backends, args.model, args.batch_size, args.tolerance, args.repeat)
+
+    print(f"{len(texts)} klachten, tolerantie {args.tolerance}", file=out)
+    print(f"{'backend':<12}{'laden (s)':>10}{'RSS (MB)':>10}{'ms/klacht':>11}{'klachten/s':>12}{'max afw.':>10}  ok",
+          file=out)
+    for row in report:
+        within_tolerance = "ja" if row["within_tolerance"] else "nee"
+        print(f"{row['backend']:<12}{row['load_seconds']:>10.2f}{row['rss_mb']:>10.1f}{row['ms_per_complaint']:>11.2f}"
+              f"{row['complaints_per_second']:>12.1f}{row['max_abs_diff']:>10.4f}  {within_tolerance}", file=out)
+    usable = [row for row in report if row["within_tolerance"]]
+    if usable:
+        fastest = max(usable, key=lambda row: row["complaints_per_second"])
+        print(f"Snelste backend binnen de tolerantie: {fastest['backend']}", file=out)
+    return report
+
+
+# Functie: Meet de onderdelen van de pijplijn op synthetische klachten en toont per onderdeel de latenties.
+def run_bench(args, out=sys.stdout):
+    model_id = args.model
+    if args.test_model is not None:
+        from klachtenbot.testmodel import DEFAULT_TEST_MODEL_DIR, build_test_model
+        model_id = build_test_model(args.test_model or DEFAULT_TEST_MODEL_DIR)
+    # De opstarttijd eerst, zodat de bestanden van het model nog niet door deze meting in de cache staan
+    startup = measure_startup(model_id, args.backend, args.startup_runs) if args.startup_runs else None
+    report = run_benchmark(args.n, model_id, args.backend, args.batch_size, args.seed, args.length, args.duplicates,
+                           args.stages)
+
+    loaded_model = registry.status(model_id, args.backend)["model_id"]
+    print(f"{args.n} synthetische klachten ({args.length}), model {loaded_model}", file=out)
+    print(f"{'onderdeel':<19}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'klachten/s':>12}{'RSS MB':>9}{'piek MB':>9}",
+          file=out)
+    for row in report:
+        print(f"{row['stage']:<19}{row['p50_ms']:>9.3f}{row['p95_ms']:>9.3f}{row['p99_ms']:>9.3f}"
+              f"{row['complaints_per_second']:>12.1f}{row['rss_mb']:>9.1f}{row['peak_rss_mb']:>9.1f}", file=out)
+        if "padding_ratio" in row:
+            print(f"{'':<19}opgevulde tokens {row['padding_ratio']:.1%} "
+                  f"(ongesorteerd {row['unsorted_padding_ratio']:.1%})", file=out)
+        if "cache_hit_rate" in row:
+            print(f"{'':<19}cache hit rate {row['cache_hit_rate']:.0%}, tokencache {row['token_cache_hit_rate']:.0%}",
+                  file=out)
+    if startup:
+        print(f"Opstarten (mediaan van {startup['runs']}): importeren {startup['import_seconds']:.2f} s, model laden "
+              f"{startup['load_seconds']:.2f} s, eerste score {startup['first_score_seconds']:.2f} s, "
+              f"totaal {startup['process_seconds']:.2f} s (torch bij importeren: "
+              f"{'ja' if startup['torch_at_import'] else 'nee'})", file=out)
+    stage_rows = [h for h in metrics.snapshot()["histograms"] if h["name"] == "stage_seconds"]
+    if stage_rows:
+        print(f"{'stap':<19}{'aantal':>9}{'totaal s':>10}{'gem. ms':>9}", file=out)
+        for h in stage_rows:
+            print(f"{h['labels']['stage']:<19}{h['count']:>9}{h['sum']:>10.3f}{h['mean'] * 1000:>9.3f}", file=out)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"stages": report, "startup": startup}, f, indent=2)
+    return report
+
+
+# Functie: Belastingtest van de Streamlit-app met een oplopend aantal gelijktijdige sessies (zie klachtenbot.loadtest).
+def run_loadtest(args, out=sys.stdout):
+    model_id = args.model
+    if args.test_model is not None:
+        from klachtenbot.testmodel import DEFAULT_TEST_MODEL_DIR, build_test_model
+        model_id = build_test_model(args.test_model or DEFAULT_TEST_MODEL_DIR)
+    report = run_load_test(args.sessions, args.reruns, model_id, args.app, args.seed, args.think_time, args.timeout,
+                           args.db, log=sys.stderr)
+
+    print(f"{args.reruns} reruns per sessie, model {model_id or 'standaard'}", file=out)
+    print(f"{'sessies':<9}{'reruns/s':>10}{'klachten/s':>12}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'RSS MB':>9}"
+          f"{'MB/sessie':>11}{'fouten':>8}", file=out)
+    for row in report:
+        latency = row["latency"] or {"p50_ms": float("nan"), "p95_ms": float("nan"), "p99_ms": float("nan")}
+        print(f"{row['sessions']:<9}{row['reruns_per_second']:>10.1f}{row['complaints_per_second']:>12.1f}"
+              f"{latency['p50_ms']:>9.0f}{latency['p95_ms']:>9.0f}{latency['p99_ms']:>9.0f}{row['rss_mb']:>9.0f}"
+              f"{row['rss_per_session_mb']:>11.1f}{row['errors']:>8}", file=out)
+    last = report[-1]
+    print(f"Per handeling bij {last['sessions']} sessies:", file=out)
+    for action, latency in last["actions"].items():
+        print(f"  {action:<13}{latency['reruns']:>6}x  p50 {latency['p50_ms']:>7.0f} ms  "
+              f"p95 {latency['p95_ms']:>7.0f} ms", file=out)
+    for row in report:
+        for error in row["first_errors"]:
+            print(f"Fout bij {row['sessions']} sessies: {error}", file=out)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+# Functie: Start een ingest-worker die klachten uit een map of Unix-socket leest en in de opslag zet, totdat het proces
+# wordt gestopt. Meldt elke --report-interval seconden de doorvoer en de latentie van indienen tot opslaan.
+def run_ingest(args, log=sys.stderr):
+    parameters = snapshot_parameters(args.tox_threshold, args.high_priority,
+                                     _load_json(args.neighborhoods, default_neighborhoods),
+                                     _load_json(args.keywords, categories))
+    source = (DirectorySource(args.dir, max_in_flight=args.max_in_flight) if args.dir
+              else SocketSource(args.socket, args.max_in_flight))
+    toxicity_options = {"chunked": args.chunked, "backend": args.backend}
+    worker = IngestWorker(source, ComplaintStore(args.db) if args.db else None, parameters, args.batch_size,
+                          args.max_wait_ms, args.model, toxicity_options,
+                          duplicates=NearDuplicateIndex(args.duplicate_threshold))
+    registry.warm_up(args.model, args.backend)
+    print(f"Ingest-worker leest uit {args.dir or args.socket} (batch {args.batch_size}, "
+          f"wachttijd {args.max_wait_ms} ms)", file=log)
+    if args.dir and source.recovered:
+        print(f"{source.recovered} onderbroken bestand(en) uit {PROCESSING_DIR}/ opnieuw in de wachtrij gezet",
+              file=log)
+    last_report = time.monotonic()
+    try:
+        while True:
+            worker.step(timeout=args.max_wait_ms / 1000)
+            if time.monotonic() - last_report >= args.report_interval:
+                last_report = time.monotonic()
+                stats = worker.stats()
+                print(f"{stats['processed']} klachten opgeslagen ({stats['duplicates']} bijna-dubbel), "
+                      f"gemiddelde batch {stats['mean_batch_size']:.1f}, "
+                      f"latentie p50 {stats['latency_p50_ms']:.0f} ms / p95 {stats['latency_p95_ms']:.0f} ms",
+                      file=log)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        source.close()
+    return worker.stats()
+
+
+# Functie: Stuurt klachten uit een JSONL-bestand (of stdin) naar een ingest-worker op een Unix-socket.
+def run_submit(args, out=sys.stdout):
+    stream = open(args.input, encoding="utf-8") if args.input else sys.stdin
+    with stream:
+        records = [json.loads(line) for line in stream if line.strip()]
+    for response in submit(args.socket, records):
+        print(json.dumps(response), file=out)
+
+
+# Functie: Traint een voorfilter op de scores van het transformermodel en toont per grens welk deel van de klachten
+# het model zou overslaan en hoe vaak het voorfilter het dan met het model eens is (gemeten op een aparte validatieset).
+def run_train_prefilter(args, log=sys.stderr):
+    if args.input:
+        texts = [text for text, _, _ in islice(read_complaints(args.input, args.text_column), args.limit)]
+    else:
+        texts = [text for text, _ in ComplaintGenerator(seed=args.seed).generate(args.limit)]
+    start = time.perf_counter()
+    scores = analyze_toxicity_batch(texts, args.batch_size, model_id=args.model, backend=args.backend, prefilter="")
+    print(f"{len(texts)} klachten gescoord door het model in {time.perf_counter() - start:.1f} s", file=log)
+
+    order = np.random.default_rng(args.seed).permutation(len(texts))
+    split = int(len(texts) * (1 - args.validation))
+    train, validation = order[:split], order[split:]
+    prefilter = Prefilter.train([texts[i] for i in train], scores[train], epochs=args.epochs,
+                                clean_below=args.clean_below)
+
+    print(f"Validatie op {len(validation)} klachten (toxisch boven {args.tox_threshold}):", file=log)
+    print(f"{'grens':>8}{'overgeslagen':>14}{'eens (overgeslagen)':>21}{'gemist':>8}{'eens (totaal)':>15}", file=log)
+    report = evaluate(prefilter, [texts[i] for i in validation], scores[validation], args.tox_threshold,
+                      sorted(set(EVALUATION_BANDS) | {args.clean_below}))
+    for row in report:
+        marker = "  <" if row["clean_below"] == args.clean_below else ""
+        print(f"{row['clean_below']:>8.2f}{row['skip_rate']:>14.1%}{row['agreement_skipped']:>21.2%}"
+              f"{row['missed_toxic']:>8}{row['agreement']:>15.2%}{marker}", file=log)
+    prefilter.save(args.output)
+    print(f"Voorfilter opgeslagen in {args.output}. Gebruik het met "
+          f"KLACHTENBOT_PREFILTER={os.path.abspath(args.output)} of --prefilter.", file=log)
+    return report
+
+
+# Functie: Berekent een categoriemodel (een centroid per categorie, zie klachtenbot.categorizer) uit voorbeeldklachten.
+# Zonder --label-column krijgt elke klacht met herkende trefwoorden de categorie volgens de trefwoorden. Een deel van de
+# voorbeelden wordt apart gehouden om te meten hoe vaak de semantische categorie daarmee overeenkomt.
+def run_train_categorizer(args, log=sys.stderr):
+    updated_categories = _load_json(args.keywords, categories)
+    keyword_categories = {category: words for category, words in updated_categories.items() if words}
+    if args.input:
+        rows = list(islice(read_complaints(args.input, args.text_column), args.limit))
+        texts = [text for text, _, _ in rows]
+        labels = [row.get(args.label_column) for _, _, row in rows] if args.label_column else None
+    else:
+        texts = [text for text, _ in ComplaintGenerator(seed=args.seed).generate(args.limit)]
+        labels = None
+    if labels is None:
+        matcher = get_matcher(keyword_categories)
+        labels = []
+        for text in texts:
+            category_matches, _ = matcher.match(text)
+            labels.append(select_category(category_matches) if any(category_matches.values()) else None)
+
+    labelled = [i for i, label in enumerate(labels) if label in keyword_categories]
+    unlabelled = [i for i, label in enumerate(labels) if label not in keyword_categories]
+    order = np.random.default_rng(args.seed).permutation(labelled)
+    split = int(len(order) * (1 - args.validation))
+    train, validation = order[:split], order[split:]
+    examples = training_examples([texts[i] for i in train], [labels[i] for i in train], keyword_categories,
+                                 args.min_examples)
+    model_id = registry.get(args.model, args.backend).model_id
+    start = time.perf_counter()
+    embeddings = embed_texts([text for text, _ in examples], args.batch_size, args.max_length, args.model, args.backend)
+    print(f"{len(examples)} voorbeelden ({len(train)} klachten) ingebed in {time.perf_counter() - start:.1f} s",
+          file=log)
+    categorizer = SemanticCategorizer.from_embeddings(embeddings, [label for _, label in examples],
+                                                      list(keyword_categories), min_similarity=args.min_similarity,
+                                                      model_id=model_id)
+
+    report = {"examples": len(examples), "categories": len(categorizer.names)}
+    if len(validation):
+        predicted, _ = categorizer.classify(embed_texts([texts[i] for i in validation], args.batch_size,
+                                                        args.max_length, args.model, args.backend))
+        assigned = [(label, labels[i]) for label, i in zip(predicted, validation) if label is not None]
+        report["coverage"] = len(assigned) / len(validation)
+        report["agreement"] = (sum(label == expected for label, expected in assigned) / len(assigned)
+                               if assigned else 0.0)
+        print(f"Validatie op {len(validation)} klachten met trefwoorden: {report['coverage']:.1%} krijgt een "
+              f"categorie, daarvan {report['agreement']:.1%} gelijk aan de trefwoorden", file=log)
+    if unlabelled:
+        sample = unlabelled[:args.limit]
+        predicted, _ = categorizer.classify(embed_texts([texts[i] for i in sample], args.batch_size, args.max_length,
+                                                        args.model, args.backend))
+        report["coverage_without_keywords"] = sum(label is not None for label in predicted) / len(sample)
+        print(f"{len(sample)} klachten zonder trefwoorden: {report['coverage_without_keywords']:.1%} krijgt een "
+              f"semantische categorie", file=log)
+    categorizer.save(args.output)
+    print(f"Categoriemodel opgeslagen in {args.output}. Gebruik het met "
+          f"KLACHTENBOT_CATEGORIZER={os.path.abspath(args.output)} of --categorizer.", file=log)
+    return report
+
+
+# Functie: Slaat het model op als lokaal artefact voor een snelle koude start (zie klachtenbot.model.export_artifact).
+def run_export_model(args, log=sys.stderr):
+    start = time.perf_counter()
+    path = export_artifact(args.output, args.model)
+    print(f"Model opgeslagen in {path} ({time.perf_counter() - start:.1f} s). "
+          f"Gebruik het met KLACHTENBOT_MODEL={os.path.abspath(path)}", file=log)
+
+
+# Functie: Schrijft de klachtenopslag kolomsgewijs naar een Parquet- of Arrow-bestand voor verdere analyse.
+def run_export(args, log=sys.stderr):
+    store = ComplaintStore(args.db) if args.db else ComplaintStore()
+    start = time.perf_counter()
+    rows = write_results(store.iter_batches(args.chunk_size, args.after_id), args.output, args.output_format)
+    store.close()
+    print(f"{rows} klachten geëxporteerd naar {args.output} in {time.perf_counter() - start:.1f} s", file=log)
+    return rows
+
+
+# Functie: Laadt het model en start de scoringsservice totdat het proces wordt gestopt.
+def run_serve(args, log=sys.stderr):
+    registry.warm_up(args.model, args.backend)
+    options = {"backend": args.backend} if args.backend else None
+    service = ScoringService(args.max_batch_size, args.max_wait_ms, args.model, options).start()
+    print(f"Scoringsservice luistert op http://{args.host}:{args.port} "
+          f"(batch {args.max_batch_size}, wachttijd {args.max_wait_ms} ms)", file=log)
+    try:
+        asyncio.run(serve(service, args.host, args.port, ComplaintStore(args.db) if args.db else None))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="klachtenbot", description="Klachtenbot zonder webinterface.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    triage = commands.add_parser("triage", help="Analyseer een CSV- of JSONL-bestand met klachten.")
+    triage.add_argument("input", help="Invoerbestand (.csv of .jsonl)")
+    triage.add_argument("output", help="Uitvoerbestand (.csv, .jsonl, .parquet of .arrow)")
+    triage.add_argument("--input-format", choices=["csv", "jsonl"])
+    triage.add_argument("--output-format", choices=sorted(RESULT_WRITERS))
+    triage.add_argument("--text-column", default="klacht", help="Kolom met de tekst van de klacht")
+    triage.add_argument("--wijk-column", default="wijk", help="Kolom met de wijk van de indiener")
+    triage.add_argument("--id-column", help="Kolom die ongewijzigd naar de uitvoer wordt doorgegeven")
+    triage.add_argument("--tox-threshold", type=float, default=0.5, help="Drempel toxiciteitsscore")
+    triage.add_argument("--high-priority", nargs="*", default=DEFAULT_HIGH_PRIORITY_CATEGORIES,
+                        help="Categorieën met hoge prioriteit")
+    triage.add_argument("--exclude-threats", action="store_true", help="Laat als dreigend aangemerkte klachten weg")
+    triage.add_argument("--keywords", help="JSON-bestand met trefwoorden per categorie")
+    triage.add_argument("--neighborhoods", help="JSON-bestand met prioriteitsscores per wijk")
+    triage.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    triage.add_argument("--chunk-size", type=int, default=1024, help="Aantal klachten per schrijfblok")
+    triage.add_argument("--max-length", type=int, default=DEFAULT_MAX_LENGTH, help="Maximaal aantal tokens per venster")
+    triage.add_argument("--chunked", action="store_true",
+                        help="Score lange klachten in overlappende vensters in plaats van ze af te kappen")
+    triage.add_argument("--stride", type=int, default=DEFAULT_STRIDE, help="Overlap tussen vensters in tokens")
+    triage.add_argument("--aggregate", choices=AGGREGATES, default="max",
+                        help="Samenvoegen van vensterscores per klacht")
+    triage.add_argument("--model", help="Model id of lokale map (standaard: KLACHTENBOT_MODEL of robBERT)")
+    triage.add_argument("--backend", choices=BACKENDS,
+                        help="Inferentie-backend (standaard: KLACHTENBOT_BACKEND of torch)")
+    triage.add_argument("--service", help="URL van een draaiende scoringsservice (zie serve)")
+    triage.add_argument("--prefilter",
+                        help="Voorfilter (zie train-prefilter); standaard KLACHTENBOT_PREFILTER, '' voor geen")
+    triage.add_argument("--prefilter-threshold", type=float,
+                        help="Klachten met een voorfilterschatting onder deze grens slaan het model over")
+    triage.add_argument("--categorizer",
+                        help="Categoriemodel (zie train-categorizer); standaard KLACHTENBOT_CATEGORIZER, '' voor geen")
+    triage.add_argument("--workers", type=int, default=1,
+                        help="Aantal scoringsprocessen; het model staat één keer in gedeeld geheugen (standaard 1)")
+    triage.add_argument("--threads-per-worker", type=int,
+                        help="Aantal torch-threads per scoringsproces (standaard: cores gedeeld door --workers)")
+    triage.add_argument("--top", type=int, default=0, help="Toon na afloop de N klachten met de hoogste prioriteit")
+    triage.add_argument("--metrics", metavar="BESTAND",
+                        help="Meet de tijd per stap en schrijf de meetwaarden naar dit bestand (.json of .prom)")
+    triage.set_defaults(func=run_triage)
+
+    backends = commands.add_parser("backends", help="Vergelijk snelheid, geheugen en scores van de backends.")
+    backends.add_argument("input", nargs="?", help="CSV- of JSONL-bestand met voorbeeldklachten")
+    backends.add_argument("--text-column", default="klacht")
+    backends.add_argument("--limit", type=int, default=256, help="Maximaal aantal klachten uit het invoerbestand")
+    backends.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    backends.add_argument("--tolerance", type=float, default=0.02, help="Toegestane afwijking van de fp32-score")
+    backends.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    backends.add_argument("--repeat", type=int, default=3)
+    backends.add_argument("--model")
+    backends.set_defaults(func=run_backends)
+
+    server = commands.add_parser("serve", help="Start een lokale scoringsservice met micro-batching.")
+    server.add_argument("--host", default="127.0.0.1")
+    server.add_argument("--port", type=int, default=8765)
+    server.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    server.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS,
+                        help="Maximale wachttijd om een batch te vullen")
+    server.add_argument("--model")
+    server.add_argument("--backend", choices=BACKENDS)
+    server.add_argument("--metrics", action="store_true", help="Meet de tijd per stap (op te vragen via GET /metrics)")
+    server.add_argument("--db", help="Klachtenopslag voor de samenvattingen via GET /rollups")
+    server.set_defaults(func=run_serve)
+
+    ingest = commands.add_parser("ingest", help="Verwerk doorlopend klachten uit een map of Unix-socket.")
+    source = ingest.add_mutually_exclusive_group(required=True)
+    source.add_argument("--dir", help="Map met binnenkomende *.json- en *.jsonl-bestanden")
+    source.add_argument("--socket", help="Pad van een Unix-socket voor JSON-regels")
+    ingest.add_argument("--db", help="Klachtenopslag (standaard: KLACHTENBOT_DB)")
+    ingest.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    ingest.add_argument("--max-wait-ms", type=float, default=20, help="Maximale wachttijd om een batch te vullen")
+    ingest.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                        help="Maximaal aantal gelezen maar nog niet opgeslagen klachten")
+    ingest.add_argument("--tox-threshold", type=float, default=0.5)
+    ingest.add_argument("--high-priority", nargs="*", default=DEFAULT_HIGH_PRIORITY_CATEGORIES)
+    ingest.add_argument("--keywords")
+    ingest.add_argument("--neighborhoods")
+    ingest.add_argument("--chunked", action="store_true")
+    ingest.add_argument("--duplicate-threshold", type=float, default=DEFAULT_DUPLICATE_THRESHOLD,
+                        help="Minimale gelijkenis om de scores van een bijna-dubbele klacht over te nemen (0 = uit)")
+    ingest.add_argument("--model")
+    ingest.add_argument("--backend", choices=BACKENDS)
+    ingest.add_argument("--report-interval", type=float, default=10, help="Seconden tussen voortgangsmeldingen")
+    ingest.add_argument("--metrics", metavar="BESTAND", help="Schrijf bij het stoppen de meetwaarden naar dit bestand")
+    ingest.set_defaults(func=run_ingest)
+
+    submitter = commands.add_parser("submit", help="Stuur klachten (JSONL) naar een ingest-worker op een Unix-socket.")
+    submitter.add_argument("socket")
+    submitter.add_argument("input", nargs="?", help="JSONL-bestand met klachten (standaard: stdin)")
+    submitter.set_defaults(func=run_submit)
+
+    exporter = commands.add_parser("export", help="Exporteer de klachtenopslag naar Parquet of Arrow.")
+    exporter.add_argument("output", help="Uitvoerbestand (.parquet, .arrow of .feather)")
+    exporter.add_argument("--output-format", choices=["parquet", "arrow"])
+    exporter.add_argument("--db", help="Klachtenopslag (standaard: KLACHTENBOT_DB)")
+    exporter.add_argument("--after-id", type=int, default=0, help="Alleen klachten met een hoger id")
+    exporter.add_argument("--chunk-size", type=int, default=50000, help="Aantal klachten per blok")
+    exporter.set_defaults(func=run_export)
+
+    prefilter = commands.add_parser("train-prefilter",
+                                    help="Train een snel voorfilter op de scores van het toxiciteitsmodel.")
+    prefilter.add_argument("input", nargs="?",
+                           help="CSV- of JSONL-bestand met klachten (standaard: synthetische klachten)")
+    prefilter.add_argument("output", help="Bestand voor het voorfilter (.npz)")
+    prefilter.add_argument("--text-column", default="klacht")
+    prefilter.add_argument("--limit", type=int, default=20000, help="Maximaal aantal klachten")
+    prefilter.add_argument("--validation", type=float, default=0.2, help="Deel van de klachten voor de validatie")
+    prefilter.add_argument("--clean-below", type=float, default=DEFAULT_CLEAN_BELOW,
+                           help="Klachten met een schatting onder deze grens slaan het model over")
+    prefilter.add_argument("--tox-threshold", type=float, default=0.5)
+    prefilter.add_argument("--epochs", type=int, default=300)
+    prefilter.add_argument("--seed", type=int, default=42)
+    prefilter.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    prefilter.add_argument("--model")
+    prefilter.add_argument("--backend", choices=BACKENDS)
+    prefilter.set_defaults(func=run_train_prefilter)
+
+    categorizer = commands.add_parser("train-categorizer",
+                                      help="Bereken een semantisch categoriemodel voor klachten zonder trefwoorden.")
+    categorizer.add_argument("input", nargs="?",
+                             help="CSV- of JSONL-bestand met klachten (standaard: synthetische klachten)")
+    categorizer.add_argument("output", help="Bestand voor het categoriemodel (.npz)")
+    categorizer.add_argument("--text-column", default="klacht")
+    categorizer.add_argument("--label-column", help="Kolom met de categorie (standaard: volgens de trefwoorden)")
+    categorizer.add_argument("--keywords", help="JSON-bestand met trefwoorden per categorie")
+    categorizer.add_argument("--limit", type=int, default=20000, help="Maximaal aantal klachten")
+    categorizer.add_argument("--validation", type=float, default=0.2, help="Deel van de klachten voor de validatie")
+    categorizer.add_argument("--min-similarity", type=float, default=DEFAULT_MIN_SIMILARITY,
+                             help="Minimale gelijkenis met een centroid om een categorie toe te kennen")
+    categorizer.add_argument("--min-examples", type=int, default=MIN_EXAMPLES,
+                             help="Vul categorieën met minder voorbeelden aan met hun trefwoorden")
+    categorizer.add_argument("--max-length", type=int, default=DEFAULT_MAX_LENGTH)
+    categorizer.add_argument("--seed", type=int, default=42)
+    categorizer.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    categorizer.add_argument("--model")
+    categorizer.add_argument("--backend", choices=["torch", "torch-int8"])
+    categorizer.set_defaults(func=run_train_categorizer)
+
+    export = commands.add_parser("export-model",
+                                 help="Sla het model op als lokaal artefact voor een snelle koude start.")
+    export.add_argument("output", help="Map waarin het model wordt opgeslagen")
+    export.add_argument("--model", help="Model id of lokale map (standaard: KLACHTENBOT_MODEL of robBERT)")
+    export.set_defaults(func=run_export_model)
+
+    bench = commands.add_parser("bench", help="Meet latentie, doorvoer en geheugen per onderdeel van de pijplijn.")
+    bench.add_argument("-n", type=int, default=500, help="Aantal synthetische klachten")
+    bench.add_argument("--length", choices=["short", "mixed", "long"], default="mixed")
+    bench.add_argument("--duplicates", type=float, default=0.1, help="Aandeel (bijna) dubbele klachten")
+    bench.add_argument("--seed", type=int, default=42)
+    bench.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    bench.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    bench.add_argument("--model")
+    bench.add_argument("--test-model", nargs="?", const="", metavar="MAP",
+                       help="Gebruik (en maak zo nodig) een klein lokaal testmodel; werkt zonder netwerk")
+    bench.add_argument("--backend", choices=BACKENDS)
+    bench.add_argument("--startup-runs", type=int, default=3,
+                       help="Aantal nieuwe processen voor de opstarttijd (0: niet meten)")
+    bench.add_argument("--json", help="Schrijf de resultaten ook als JSON naar dit bestand")
+    bench.add_argument("--metrics", metavar="BESTAND",
+                       help="Meet ook de tijd per stap (tokeniseren, forward pass, ...) en schrijf die naar dit "
+                            "bestand")
+    bench.set_defaults(func=run_bench)
+
+    loadtest = commands.add_parser("loadtest", help="Belastingtest van de Streamlit-app met gelijktijdige sessies.")
+    loadtest.add_argument("--sessions", type=int, nargs="+", default=list(DEFAULT_LEVELS),
+                          help="Aantallen gelijktijdige sessies, elk in een nieuw proces")
+    loadtest.add_argument("--reruns", type=int, default=20, help="Aantal handelingen per sessie")
+    loadtest.add_argument("--think-time", type=float, default=0.0,
+                          help="Gemiddelde pauze tussen twee handelingen van een sessie, in seconden")
+    loadtest.add_argument("--seed", type=int, default=42)
+    loadtest.add_argument("--app", default=DEFAULT_APP, help="Pad naar het Streamlit-script")
+    loadtest.add_argument("--timeout", type=float, default=120, help="Maximale duur van één rerun, in seconden")
+    loadtest.add_argument("--db", help="Klachtenopslag (standaard: een lege tijdelijke opslag per meting)")
+    loadtest.add_argument("--model")
+    loadtest.add_argument("--test-model", nargs="?", const="", metavar="MAP",
+                          help="Gebruik (en maak zo nodig) een klein lokaal testmodel; werkt zonder netwerk")
+    loadtest.add_argument("--json", help="Schrijf de resultaten ook als JSON naar dit bestand")
+    loadtest.set_defaults(func=run_loadtest)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if getattr(args, "metrics", None):
+        metrics.enable()
+    args.func(args)
+    if isinstance(getattr(args, "metrics", None), str):
+        metrics.dump(args.metrics)
+    return 0
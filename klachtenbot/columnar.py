@@ -0,0 +1,336 @@
+# Compacte, kolomsgewijze opslag van resultaatrijen. Een lijst dicts kost per klacht een dict met een eigen kopie van de
+# wijk- en categorienaam en een Python-object per getal. Een ResultBatch bewaart dezelfde resultaten in de indeling van
+# Apache Arrow:
+# - wijk en categorie als code per rij met elke naam één keer (dictionary encoding),
+# - toxiciteit, prioriteitsscore en de vlaggen als NumPy-arrays met een vaste breedte (met een masker als er lege
+#   waarden zijn),
+# - de teksten als één UTF-8-buffer met offsets.
+# Omzetten naar pandas (pd.Categorical, NumPy of een nullable kolom) en Arrow gebeurt zonder de gegevens te kopiëren,
+# behalve de vlaggen (Arrow slaat booleans als bits op). pyarrow is alleen nodig voor Arrow, Parquet en tekstkolommen
+# zonder kopie in pandas.
+import numpy as np
+import pandas as pd
+
+# Kolommen met een vaste breedte
+NUMERIC_TYPES = {
+    "id": np.int64,
+    "prioriteitsscore": np.int8,
+    "toxiciteit": np.float32,
+    "dreigend": np.bool_,
+    "urgent": np.bool_,
+    # Id van de representant van een cluster van bijna-dubbele klachten; leeg als de klacht geen kopie is
+    "cluster": np.int64,
+}
+# Kolommen met weinig verschillende waarden; alle andere kolommen zijn tekst
+DICTIONARY_COLUMNS = ("wijk", "categorie")
+FORMATS = {".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow"}
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError("Voor Arrow- en Parquet-uitvoer is pyarrow nodig: pip install pyarrow") from None
+    return pa
+
+
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# Functie: Het kleinste type voor de codes van een dictionary-kolom; hetzelfde type dat pandas voor een Categorical
+# kiest, zodat de codes zonder kopie worden overgenomen.
+def _code_type(size):
+    for dtype in (np.int8, np.int16, np.int32):
+        if size < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+# Klasse: Tekstkolom als één UTF-8-buffer met de begin- en eindpositie van elke waarde (Arrow large_string).
+class TextColumn:
+    __slots__ = ("data", "offsets", "valid")
+
+    def __init__(self, data, offsets, valid=None):
+        self.data = data
+        self.offsets = offsets
+        # Welke waarden niet leeg (None) zijn; None als alle waarden aanwezig zijn
+        self.valid = valid
+
+    @classmethod
+    def from_values(cls, values):
+        encoded = [b"" if value is None else str(value).encode("utf-8") for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+        valid = np.fromiter((value is not None for value in values), dtype=bool, count=len(encoded))
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets, None if valid.all() else valid)
+
+    @classmethod
+    def concat(cls, columns):
+        data = np.concatenate([column.data for column in columns])
+        starts = np.cumsum([0] + [len(column.data) for column in columns[:-1]])
+        offsets = np.concatenate([[0]] + [column.offsets[1:] + start for column, start in zip(columns, starts)])
+        valid = None
+        if any(column.valid is not None for column in columns):
+            valid = np.concatenate([np.ones(len(column), dtype=bool) if column.valid is None else column.valid
+                                    for column in columns])
+        return cls(data, offsets.astype(np.int64), valid)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if self.valid is not None and not self.valid[i]:
+            return None
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.offsets.nbytes + (0 if self.valid is None else self.valid.nbytes)
+
+    def to_arrow(self):
+        pa = _pyarrow()
+        bitmap = None if self.valid is None else pa.py_buffer(np.packbits(self.valid, bitorder="little"))
+        null_count = 0 if self.valid is None else int(len(self) - self.valid.sum())
+        return pa.LargeStringArray.from_buffers(len(self), pa.py_buffer(self.offsets), pa.py_buffer(self.data),
+                                                bitmap, null_count)
+
+    # Functie: Als pandas-kolom; met pyarrow zonder kopie (dtype large_string[pyarrow]), anders als Python-strings.
+    def to_pandas(self):
+        if _has_pyarrow():
+            return pd.arrays.ArrowExtensionArray(self.to_arrow())
+        return np.array([self[i] for i in range(len(self))], dtype=object)
+
+
+# Klasse: Kolom met een vaste breedte en lege waarden: de waarden als NumPy-array (0 op een lege plek) en welke
+# waarden aanwezig zijn. In pandas wordt dat een nullable kolom (Int64, Float32, boolean), in Arrow een null-bitmap.
+class MaskedColumn:
+    __slots__ = ("values", "valid")
+
+    def __init__(self, values, valid):
+        self.values = values
+        self.valid = valid
+
+    @classmethod
+    def from_values(cls, values, dtype):
+        valid = np.fromiter((value is not None for value in values), dtype=bool, count=len(values))
+        return cls(np.asarray([0 if value is None else value for value in values], dtype=dtype), valid)
+
+    # Functie: Voegt kolommen samen; delen zonder lege waarden mogen gewone NumPy-arrays zijn.
+    @classmethod
+    def concat(cls, columns):
+        values = np.concatenate([column.values if isinstance(column, cls) else column for column in columns])
+        valid = np.concatenate([column.valid if isinstance(column, cls) else np.ones(len(column), dtype=bool)
+                                for column in columns])
+        return cls(values, valid)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        return self.values[i].item() if self.valid[i] else None
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.valid.nbytes
+
+    def to_arrow(self):
+        return _pyarrow().array(self.values, mask=~self.valid)
+
+    def to_pandas(self):
+        if self.values.dtype == np.bool_:
+            return pd.arrays.BooleanArray(self.values, ~self.valid)
+        if self.values.dtype.kind == "f":
+            return pd.arrays.FloatingArray(self.values, ~self.valid)
+        return pd.arrays.IntegerArray(self.values, ~self.valid)
+
+
+# Klasse: Kolom met een code per rij en elke verschillende waarde één keer (-1 voor een lege waarde).
+class DictionaryColumn:
+    __slots__ = ("codes", "labels")
+
+    def __init__(self, codes, labels):
+        self.codes = codes
+        self.labels = list(labels)
+
+    @classmethod
+    def from_values(cls, values):
+        codes, labels = pd.factorize(np.asarray(values, dtype=object))
+        return cls(codes.astype(_code_type(len(labels))), [str(label) for label in labels])
+
+    # Functie: Voegt kolommen samen; codes van latere kolommen worden omgezet naar de gezamenlijke lijst met waarden.
+    @classmethod
+    def concat(cls, columns):
+        labels = list(columns[0].labels)
+        position = {label: code for code, label in enumerate(labels)}
+        parts = []
+        for column in columns:
+            mapping = np.array([position.setdefault(label, len(position)) for label in column.labels] + [-1],
+                               dtype=np.int64)
+            parts.append(mapping[column.codes])
+        labels = list(position)
+        return cls(np.concatenate(parts).astype(_code_type(len(labels))), labels)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        code = self.codes[i]
+        return None if code < 0 else self.labels[code]
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + sum(len(label.encode("utf-8")) for label in self.labels)
+
+    def to_arrow(self):
+        pa = _pyarrow()
+        codes = pa.array(self.codes, mask=self.codes < 0) if (self.codes < 0).any() else pa.array(self.codes)
+        return pa.DictionaryArray.from_arrays(codes, pa.array(self.labels, pa.string()))
+
+    def to_pandas(self):
+        return pd.Categorical.from_codes(self.codes, categories=self.labels, validate=False)
+
+
+# Functie: Een kolom voor de waarden; getallen en vlaggen als NumPy-array, of als MaskedColumn als er lege waarden zijn.
+def _column(name, values):
+    if name in NUMERIC_TYPES:
+        if any(value is None for value in values):
+            return MaskedColumn.from_values(values, NUMERIC_TYPES[name])
+        return np.asarray(values, dtype=NUMERIC_TYPES[name])
+    if name in DICTIONARY_COLUMNS:
+        return DictionaryColumn.from_values(values)
+    return TextColumn.from_values(values)
+
+
+# Klasse: Een blok resultaten in kolommen (zie de toelichting bovenaan). Kolommen zijn NumPy-arrays (vaste breedte),
+# MaskedColumn (vaste breedte met lege waarden), DictionaryColumn (wijk, categorie) of TextColumn (overige).
+class ResultBatch:
+    def __init__(self, columns):
+        self.columns = dict(columns)
+        lengths = {len(column) for column in self.columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Kolommen met verschillende lengtes: {sorted(lengths)}.")
+        self._length = lengths.pop() if lengths else 0
+
+    # Functie: Zet resultaatrijen (zoals gemaakt door results.score_row of triage_batch) om naar kolommen.
+    @classmethod
+    def from_rows(cls, rows, columns):
+        return cls({name: _column(name, [row.get(name) for row in rows]) for name in columns})
+
+    # Functie: Maakt een batch uit een lijst waarden per kolom, bijvoorbeeld rechtstreeks uit een databasequery.
+    @classmethod
+    def from_columns(cls, values):
+        return cls({name: _column(name, column) for name, column in values.items()})
+
+    @classmethod
+    def concat(cls, batches):
+        batches = list(batches)
+        if not batches:
+            return cls({})
+        columns = {}
+        for name, first in batches[0].columns.items():
+            parts = [batch.columns[name] for batch in batches]
+            if all(isinstance(part, np.ndarray) for part in parts):
+                columns[name] = np.concatenate(parts)
+            elif any(isinstance(part, MaskedColumn) for part in parts):
+                columns[name] = MaskedColumn.concat(parts)
+            else:
+                columns[name] = type(first).concat(parts)
+        return cls(columns)
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self.columns.values())
+
+    # Functie: Rij i als dict, zoals de oorspronkelijke resultaatrij.
+    def row(self, i):
+        return {name: column[i].item() if isinstance(column, np.ndarray) else column[i]
+                for name, column in self.columns.items()}
+
+    def to_pandas(self):
+        return pd.DataFrame({name: column if isinstance(column, np.ndarray) else column.to_pandas()
+                             for name, column in self.columns.items()}, copy=False)
+
+    def to_arrow(self):
+        pa = _pyarrow()
+        return pa.table({name: pa.array(column) if isinstance(column, np.ndarray) else column.to_arrow()
+                         for name, column in self.columns.items()})
+
+
+# Klasse: Schrijft ResultBatches blok voor blok naar een Parquet- of Arrow IPC-bestand (.arrow/.feather). Beide kunnen
+# daarna met read_results memory-mapped worden ingelezen. De waarden van wijk en categorie worden over alle blokken
+# bijgehouden, zodat elke kolom één woordenboek houdt dat alleen groeit (Arrow: dictionary deltas).
+class ResultFileWriter:
+    def __init__(self, path, file_format=None):
+        self._pa = _pyarrow()
+        self.path = path
+        self.file_format = file_format or result_format(path)
+        self._writer = None
+        self._labels = {}
+        self.rows = 0
+
+    # Functie: Zet de codes van wijk en categorie om naar de woordenboeken van het bestand (int32, vast type).
+    def _align(self, batch):
+        columns = dict(batch.columns)
+        for name, column in columns.items():
+            if isinstance(column, DictionaryColumn):
+                position = self._labels.setdefault(name, {})
+                mapping = np.array([position.setdefault(label, len(position)) for label in column.labels] + [-1],
+                                   dtype=np.int32)
+                columns[name] = DictionaryColumn(mapping[column.codes], list(position))
+        return ResultBatch(columns)
+
+    # Functie: Schrijft een blok. Een leeg blok maakt alleen het bestand aan, als dat nog niet bestaat.
+    def write(self, batch):
+        if not len(batch) and self._writer is not None:
+            return
+        table = self._align(batch).to_arrow()
+        if self._writer is None:
+            if self.file_format == "parquet":
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            else:
+                options = self._pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+                self._writer = self._pa.ipc.new_file(self.path, table.schema, options=options)
+        self._writer.write_table(table)
+        self.rows += len(batch)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def result_format(path):
+    for extension, file_format in FORMATS.items():
+        if path.lower().endswith(extension):
+            return file_format
+    raise ValueError(f"Onbekend bestandsformaat voor {path}; gebruik .parquet, .arrow of .feather.")
+
+
+# Functie: Schrijft ResultBatches naar een Parquet- of Arrow-bestand. Geeft het aantal rijen terug.
+def write_results(batches, path, file_format=None):
+    writer = ResultFileWriter(path, file_format)
+    try:
+        for batch in batches:
+            writer.write(batch)
+    finally:
+        writer.close()
+    return writer.rows
+
+
+# Functie: Leest een bestand van write_results als pyarrow.Table. Een Arrow-bestand wordt memory-mapped: de gegevens
+# worden pas van schijf gelezen als ze gebruikt worden, en table.to_pandas() neemt de getallen zonder kopie over.
+def read_results(path, columns=None):
+    pa = _pyarrow()
+    if result_format(path) == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_table(path, columns=columns, memory_map=True)
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    return table if columns is None else table.select(columns)
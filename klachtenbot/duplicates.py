@@ -0,0 +1,257 @@
+# Herkenning van bijna-dubbele klachten. Buurtpetities en actiebrieven komen binnen als honderden licht aangepaste
+# kopieën. Van elke klacht wordt een MinHash-handtekening berekend over overlappende stukjes tekst (shingles); via
+# locality-sensitive hashing (LSH) vindt de index in een paar opzoekingen het cluster waarvan de eerste klacht (de
+# representant) naar schatting minstens `threshold` met de nieuwe klacht overeenkomt (Jaccard-gelijkenis). Zo'n klacht
+# neemt de toxiciteit, trefwoorden en categorie van de representant over, zonder modelaanroep, en wordt in de opslag
+# aan het cluster gekoppeld, zodat het overzicht de kopieën kan samenvoegen.
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from klachtenbot.metrics import metrics
+from klachtenbot.results import score_row
+from klachtenbot.tokens import normalize_text
+
+# Minimale geschatte gelijkenis om bij een cluster te horen; 0 schakelt de herkenning uit. Een kopie met een andere
+# aanhef, ondertekening en een paar gewijzigde woorden komt doorgaans boven 0.7 uit, losse klachten onder 0.1.
+DEFAULT_DUPLICATE_THRESHOLD = float(os.environ.get("KLACHTENBOT_DUPLICATE_THRESHOLD", "0.7"))
+# Maximaal aantal clusters in de index; de langst niet gebruikte clusters vallen eruit
+DEFAULT_INDEX_SIZE = int(os.environ.get("KLACHTENBOT_DUPLICATE_INDEX_SIZE", "50000"))
+DEFAULT_NUM_PERM = 128
+# 32 banden van 4 waarden: een klacht met gelijkenis 0.7 deelt vrijwel zeker een bucket met de representant, een
+# klacht met gelijkenis 0.3 maar in een kwart van de gevallen (en wordt dan bij het vergelijken afgewezen)
+DEFAULT_BANDS = 32
+# Lengte van een shingle in bytes (van de genormaliseerde tekst in kleine letters)
+SHINGLE_SIZE = 5
+# Aantal shingles dat per keer tegen alle permutaties wordt gehasht, om het geheugen bij lange brieven te begrenzen
+_BLOCK = 2048
+_SHIFT = np.uint64(32)
+
+
+# Functie: De verschillende shingles van een tekst als getallen: elke reeks van `size` opeenvolgende bytes vormt
+# rechtstreeks één 64-bits waarde. Teksten korter dan een shingle worden aangevuld.
+def shingles(text, size=SHINGLE_SIZE):
+    data = np.frombuffer(normalize_text(text).lower().encode("utf-8"), dtype=np.uint8)
+    if len(data) == 0:
+        return np.empty(0, dtype=np.uint64)
+    if len(data) < size:
+        data = np.pad(data, (0, size - len(data)))
+    windows = np.lib.stride_tricks.sliding_window_view(data, size).astype(np.uint64)
+    values = np.zeros(len(windows), dtype=np.uint64)
+    for column in range(size):
+        values = (values << np.uint64(8)) | windows[:, column]
+    return np.unique(values)
+
+
+# Functie: De kenmerken van een representant die een bijna-dubbele klacht overneemt.
+def _features(row):
+    return {"toxiciteit": float(row["toxiciteit"]), "categorie": row["categorie"], "treffers": row["treffers"],
+            "urgent": bool(row["urgent"])}
+
+
+class NearDuplicateIndex:
+    def __init__(self, threshold=DEFAULT_DUPLICATE_THRESHOLD, num_perm=DEFAULT_NUM_PERM, bands=DEFAULT_BANDS,
+                 shingle_size=SHINGLE_SIZE, maxsize=DEFAULT_INDEX_SIZE, seed=1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) moet een veelvoud zijn van het aantal banden ({bands}).")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.shingle_size = shingle_size
+        self.maxsize = maxsize
+        # Hashfuncties h(x) = (a*x + b) mod 2^64, waarvan de bovenste 32 bits worden gebruikt (multiply-shift)
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(0, 2 ** 64, num_perm, dtype=np.uint64, endpoint=False) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 64, num_perm, dtype=np.uint64, endpoint=False)
+        self._clusters = OrderedDict()  # id van de representant -> (handtekening, kenmerken)
+        self._buckets = [{} for _ in range(bands)]
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        # Hoogste id uit de opslag dat al in de index is verwerkt (zie sync_index)
+        self.synced_id = 0
+        self.lookups = 0
+        self.hits = 0
+
+    @property
+    def enabled(self):
+        return self.threshold > 0
+
+    def __len__(self):
+        return len(self._clusters)
+
+    def __contains__(self, cluster_id):
+        return cluster_id in self._clusters
+
+    # Functie: MinHash-handtekening van een tekst (num_perm waarden van 32 bits), of None voor een lege tekst.
+    def signature(self, text):
+        values = shingles(text, self.shingle_size)
+        if len(values) == 0:
+            return None
+        signature = np.full(self.num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+        for start in range(0, len(values), _BLOCK):
+            block = values[start:start + _BLOCK]
+            hashed = (self._a[:, None] * block[None, :] + self._b[:, None]) >> _SHIFT
+            np.minimum(signature, hashed.min(axis=1), out=signature)
+        return signature.astype(np.uint32)
+
+    def _keys(self, signature):
+        r = self.rows_per_band
+        return [signature[band * r:(band + 1) * r].tobytes() for band in range(self.bands)]
+
+    # Functie: Zoekt het cluster dat het meest op deze handtekening lijkt, met een geschatte gelijkenis van minstens
+    # `threshold`. Geeft (id van de representant, kenmerken) terug, of None.
+    def query(self, signature):
+        if signature is None or not self.enabled:
+            return None
+        with self._lock:
+            self.lookups += 1
+            candidates = set()
+            for bucket, key in zip(self._buckets, self._keys(signature)):
+                candidates.update(bucket.get(key, ()))
+            if not candidates:
+                return None
+            candidates = sorted(candidates)
+            stacked = np.stack([self._clusters[cluster_id][0] for cluster_id in candidates])
+            similarity = (stacked == signature).mean(axis=1)
+            best = int(np.argmax(similarity))
+            if similarity[best] < self.threshold:
+                return None
+            cluster_id = candidates[best]
+            self._clusters.move_to_end(cluster_id)
+            self.hits += 1
+            return cluster_id, self._clusters[cluster_id][1]
+
+    # Functie: Zoekt het cluster van een tekst (zie query).
+    def match(self, text):
+        return self.query(self.signature(text))
+
+    # Functie: Neemt een klacht op als representant van een nieuw cluster. Een id dat al in de index staat wordt
+    # overgeslagen.
+    def add(self, cluster_id, signature, features):
+        if signature is None:
+            return
+        with self._lock:
+            if cluster_id in self._clusters:
+                return
+            self._clusters[cluster_id] = (signature, features)
+            for bucket, key in zip(self._buckets, self._keys(signature)):
+                bucket.setdefault(key, []).append(cluster_id)
+            while len(self._clusters) > self.maxsize:
+                old_id, (old_signature, _) = self._clusters.popitem(last=False)
+                for bucket, key in zip(self._buckets, self._keys(old_signature)):
+                    members = bucket[key]
+                    members.remove(old_id)
+                    if not members:
+                        del bucket[key]
+
+    # Functie: Neemt na ComplaintStore.append de opgeslagen rijen die geen kopie zijn als nieuwe clusters op.
+    def add_rows(self, rows, ids):
+        for row, complaint_id in zip(rows, ids):
+            if row.get("cluster") is None and row.get("cluster_row") is None:
+                signature = row.get("_signature")
+                if signature is None:
+                    signature = self.signature(row["klacht"])
+                self.add(complaint_id, signature, _features(row))
+
+    def stats(self):
+        return {
+            "clusters": len(self._clusters),
+            "maxsize": self.maxsize,
+            "threshold": self.threshold,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+        }
+
+
+# Functie: Resultaatrij voor een klacht die bij een bestaand cluster hoort (match zoals teruggegeven door query): de
+# toxiciteit en trefwoorden komen van de representant, de wijk en prioriteitsscore van de klacht zelf.
+def duplicate_row(text, neighborhood, parameters, match):
+    cluster_id, features = match
+    row = score_row(text, neighborhood, features["toxiciteit"], parameters, (features["treffers"], features["urgent"]),
+                    features["categorie"])
+    row["cluster"] = cluster_id
+    return row
+
+
+# Functie: Maakt resultaatrijen (zie results.score_row) voor een batch klachten. Klachten die op een bestaand cluster
+# lijken, of op een eerdere klacht in dezelfde batch, nemen diens toxiciteit en trefwoorden over; alleen de overige
+# klachten worden met `toxicity` (een functie van een lijst teksten naar scores en semantische categorieën, zie
+# cache.cached_toxicity_batch met with_categories=True) gescoord. Een kopie van een klacht
+# uit dezelfde batch verwijst met "cluster_row" naar de positie van die klacht, wat ComplaintStore.append bij het
+# opslaan omzet naar het id. Geef daarna de nieuwe ids door aan index.add_rows.
+def score_rows(texts, neighborhoods, parameters, toxicity, index=None):
+    texts = list(texts)
+    if index is None or not index.enabled:
+        scores, labels = toxicity(texts) if texts else ([], [])
+        return [score_row(text, neighborhood, float(score), parameters, semantic_category=label)
+                for text, neighborhood, score, label in zip(texts, neighborhoods, scores, labels)]
+
+    batch = NearDuplicateIndex(index.threshold, index.num_perm, index.bands, index.shingle_size, len(texts) + 1)
+    signatures = [index.signature(text) for text in texts]
+    matches = []
+    for position, signature in enumerate(signatures):
+        match = index.query(signature)
+        if match is None:
+            earlier = batch.query(signature)
+            if earlier is None:
+                batch.add(position, signature, None)
+            else:
+                match = (None, earlier[0])
+        matches.append(match)
+
+    new = [position for position, match in enumerate(matches) if match is None]
+    scores, labels = toxicity([texts[position] for position in new]) if new else ([], [])
+    scores, labels = dict(zip(new, scores)), dict(zip(new, labels))
+    rows = []
+    for position, (text, neighborhood) in enumerate(zip(texts, neighborhoods)):
+        match = matches[position]
+        if match is None:
+            row = score_row(text, neighborhood, float(scores[position]), parameters,
+                            semantic_category=labels[position])
+            row["_signature"] = signatures[position]
+        elif match[0] is None:
+            original = rows[match[1]]
+            row = score_row(text, neighborhood, original["toxiciteit"], parameters,
+                            (original["treffers"], original["urgent"]), original["categorie"])
+            row["cluster_row"] = match[1]
+        else:
+            row = duplicate_row(text, neighborhood, parameters, match)
+        rows.append(row)
+    metrics.increment("near_duplicates", len(texts) - len(new))
+    return rows
+
+
+# Functie: Neemt de clusters op die sinds de vorige aanroep aan de opslag zijn toegevoegd, bijvoorbeeld door een
+# ingest-worker in een ander proces. Bij de eerste aanroep worden alleen de laatste `maxsize` klachten bekeken.
+# Met wait=False keert de functie direct terug als er al een synchronisatie bezig is (bijvoorbeeld het opbouwen op
+# de achtergrond). Geeft het aantal nieuwe clusters terug.
+def sync_index(index, store, wait=True):
+    if not index.enabled or not index._sync_lock.acquire(blocking=wait):
+        return 0
+    try:
+        if index.synced_id == 0:
+            index.synced_id = max(0, store.version() - index.maxsize)
+        added = 0
+        for row in store.iter_rows(after_id=index.synced_id):
+            if row["cluster"] is None and row["id"] not in index:
+                index.add(row["id"], index.signature(row["klacht"]), _features(row))
+                added += 1
+            index.synced_id = row["id"]
+        return added
+    finally:
+        index._sync_lock.release()
+
+
+# Functie: Bouwt een index op uit de klachten in de opslag. Met background=True gebeurt dat in een aparte thread en
+# is de index direct bruikbaar; tot het opbouwen klaar is, worden kopieën van oudere klachten nog niet herkend.
+def index_from_store(store, background=False, **kwargs):
+    index = NearDuplicateIndex(**kwargs)
+    if background:
+        threading.Thread(target=sync_index, args=(index, store), name="dubbele-klachten", daemon=True).start()
+    else:
+        sync_index(index, store)
+    return index
@@ -0,0 +1,407 @@
+# Doorlopende verwerking van binnenkomende klachten. Een ingest-worker leest klachten uit een lokale bron (een map
+# waarin JSON-bestanden worden gezet, of een Unix-socket), scoort ze in micro-batches en schrijft de resultaten naar
+# de klachtenopslag, waar ze direct in het overzicht en de werklijst van de app verschijnen. Er zijn nooit meer dan
+# `max_in_flight` klachten gelezen maar nog niet opgeslagen; daarboven wacht de bron (tegendruk).
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+from klachtenbot.cache import cached_toxicity_batch
+from klachtenbot.duplicates import NearDuplicateIndex, score_rows, sync_index
+from klachtenbot.metrics import SIZE_BUCKETS, metrics
+from klachtenbot.results import snapshot_parameters
+from klachtenbot.store import ComplaintStore
+from klachtenbot.toxicity import DEFAULT_BATCH_SIZE
+from klachtenbot.triage import DEFAULT_HIGH_PRIORITY_CATEGORIES, categories, default_neighborhoods
+
+DEFAULT_MAX_IN_FLIGHT = int(os.environ.get("KLACHTENBOT_MAX_IN_FLIGHT", "256"))
+DEFAULT_MAX_WAIT_MS = 20
+# Submappen van een bewaakte map
+PROCESSING_DIR = "bezig"
+DONE_DIR = "verwerkt"
+FAILED_DIR = "fouten"
+
+
+# Klasse: Eén binnengekomen klacht. `received` is het moment van indienen (of van inlezen als dat niet bekend is);
+# `on_done` wordt aangeroepen met het id in de opslag of met een fout.
+class Message:
+    __slots__ = ("text", "neighborhood", "received", "extra", "on_done")
+
+    def __init__(self, text, neighborhood, received=None, extra=None, on_done=None):
+        self.text = text
+        self.neighborhood = neighborhood
+        self.received = time.time() if received is None else received
+        self.extra = extra or {}
+        self.on_done = on_done
+
+    def done(self, complaint_id=None, error=None):
+        if self.on_done is not None:
+            self.on_done(self, complaint_id, error)
+
+
+# Functie: Zet een aangeleverd tijdstip (ISO 8601) om naar de notatie van de opslag, in lokale tijd. Een tijdstip met
+# tijdzone wordt eerst naar lokale tijd omgerekend. Geeft een ValueError als het geen geldig tijdstip is.
+def _timestamp(value):
+    try:
+        moment = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"ongeldig tijdstip {value!r}; gebruik ISO 8601, bijvoorbeeld 2026-03-01 09:30:00") from None
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment.isoformat(sep=" ", timespec="seconds")
+
+
+def _message(record, received=None, on_done=None):
+    if not isinstance(record, dict) or not isinstance(record.get("klacht"), str):
+        raise ValueError("een klacht is een JSON-object met minstens het veld 'klacht'")
+    extra = {key: value for key, value in record.items() if key not in ("klacht", "wijk")}
+    if extra.get("tijdstip") not in (None, ""):
+        extra["tijdstip"] = _timestamp(extra["tijdstip"])
+    return Message(record["klacht"], record.get("wijk") or "", received, extra, on_done)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # bestaat, maar van een andere gebruiker
+    return True
+
+
+# Klasse: Bewaakt een map. Producenten schrijven een bestand eerst onder een tijdelijke naam en hernoemen het daarna
+# naar *.json (één klacht of een lijst) of *.jsonl (één klacht per regel). Een bestand wordt geclaimd door het naar
+# bezig/<pid>/ te verplaatsen, zodat meerdere workers op deze machine dezelfde map kunnen bewaken, en gaat na
+# verwerking naar verwerkt/ (of naar fouten/ als het niet gelezen kon worden of een klacht ongeldig is). Grote
+# bestanden worden regel voor regel gelezen, nooit meer dan max_in_flight klachten vooruit.
+# Bij het starten worden bestanden die een gestopte of gecrashte worker in bezig/ heeft achtergelaten teruggezet in de
+# map en opnieuw gelezen. Klachten daaruit die al waren opgeslagen, worden dan nog eens opgeslagen (at-least-once).
+class DirectorySource:
+    def __init__(self, path, poll_interval=0.05, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.max_in_flight = max_in_flight
+        self._processing = os.path.join(path, PROCESSING_DIR, str(os.getpid()))
+        for directory in (self._processing, os.path.join(path, DONE_DIR), os.path.join(path, FAILED_DIR)):
+            os.makedirs(directory, exist_ok=True)
+        self._current = None
+        self._open = {}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.recovered = self._recover()
+
+    # Functie: Zet een bestand terug in de bewaakte map. Bestaat daar al een bestand met dezelfde naam, dan krijgt het
+    # teruggezette bestand een voorvoegsel.
+    def _requeue(self, path, prefix):
+        target = os.path.join(self.path, os.path.basename(path))
+        if os.path.exists(target):
+            target = os.path.join(self.path, f"{prefix}-{os.path.basename(path)}")
+        try:
+            os.rename(path, target)
+        except FileNotFoundError:
+            return False  # door een andere worker teruggezet
+        return True
+
+    # Functie: Zet de bestanden in bezig/ van workers die niet meer draaien terug in de map. Geeft het aantal
+    # teruggezette bestanden terug.
+    def _recover(self):
+        recovered = 0
+        for entry in os.scandir(os.path.join(self.path, PROCESSING_DIR)):
+            if entry.is_file():
+                recovered += self._requeue(entry.path, "hersteld")
+            elif entry.is_dir() and entry.path != self._processing and not (entry.name.isdigit()
+                                                                             and _alive(int(entry.name))):
+                for child in os.scandir(entry.path):
+                    if child.is_file():
+                        recovered += self._requeue(child.path, f"hersteld-{entry.name}")
+                try:
+                    os.rmdir(entry.path)
+                except OSError:
+                    pass
+        return recovered
+
+    def _claim_next(self):
+        try:
+            entries = sorted((entry for entry in os.scandir(self.path)
+                              if entry.is_file() and entry.name.endswith((".json", ".jsonl"))),
+                             key=lambda entry: entry.stat().st_mtime)
+        except FileNotFoundError:
+            return None
+        for entry in entries:
+            target = os.path.join(self._processing, entry.name)
+            try:
+                received = entry.stat().st_mtime
+                os.rename(entry.path, target)
+            except FileNotFoundError:
+                continue  # door een andere worker geclaimd
+            return target, received
+        return None
+
+    def _records(self, path):
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".jsonl"):
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                data = json.load(f)
+                yield from (data if isinstance(data, list) else [data])
+
+    def _finish(self, path, failed=False):
+        with self._lock:
+            self._open.pop(path, None)
+        destination = os.path.join(self.path, FAILED_DIR if failed else DONE_DIR, os.path.basename(path))
+        os.replace(path, destination)
+
+    def _on_done(self, message, complaint_id, error):
+        path = message.extra.get("_bestand")
+        with self._lock:
+            state = self._open.get(path)
+            if state is None:
+                return
+            self._in_flight -= 1
+            state["pending"] -= 1
+            state["failed"] = state["failed"] or error is not None
+            finished = state["pending"] == 0 and state["exhausted"]
+        if finished:
+            self._finish(path, state["failed"])
+
+    # Functie: Leest hoogstens n klachten; wacht maximaal `timeout` seconden als er niets klaarstaat of als er al
+    # max_in_flight klachten gelezen maar nog niet afgehandeld zijn.
+    def take(self, n, timeout):
+        deadline = time.monotonic() + timeout
+        messages = []
+        while len(messages) < n:
+            if self._in_flight >= self.max_in_flight:
+                if messages or time.monotonic() >= deadline:
+                    break
+                time.sleep(self.poll_interval)
+                continue
+            if self._current is None:
+                claimed = self._claim_next()
+                if claimed is None:
+                    if messages or time.monotonic() >= deadline:
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+                path, received = claimed
+                with self._lock:
+                    self._open[path] = {"pending": 0, "exhausted": False, "failed": False}
+                self._current = (path, received, self._records(path))
+            path, received, records = self._current
+            try:
+                record = next(records, None)
+                message = None if record is None else _message(record, received, self._on_done)
+            except ValueError:  # ook json.JSONDecodeError
+                self._current = None
+                with self._lock:
+                    self._open[path]["exhausted"] = True
+                    self._open[path]["failed"] = True
+                    done = self._open[path]["pending"] == 0
+                if done:
+                    self._finish(path, failed=True)
+                continue
+            if message is None:
+                self._current = None
+                with self._lock:
+                    self._open[path]["exhausted"] = True
+                    done = self._open[path]["pending"] == 0
+                if done:
+                    self._finish(path)
+                continue
+            message.extra["_bestand"] = path
+            with self._lock:
+                self._open[path]["pending"] += 1
+                self._in_flight += 1
+            messages.append(message)
+        return messages
+
+    # Functie: Zet bestanden die nog niet helemaal verwerkt zijn terug in de map. Aanroepen nadat de worker gestopt is.
+    def close(self):
+        with self._lock:
+            self._open.clear()
+            self._in_flight = 0
+        self._current = None
+        for entry in os.scandir(self._processing):
+            self._requeue(entry.path, f"hersteld-{os.getpid()}")
+        try:
+            os.rmdir(self._processing)
+        except OSError:
+            pass
+
+
+class _SocketHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        lock = threading.Lock()
+
+        def reply(message, complaint_id, error):
+            response = {"id": complaint_id} if error is None else {"error": str(error)}
+            response.update({key: value for key, value in message.extra.items() if key == "ref"})
+            with lock:
+                try:
+                    self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+                except (OSError, ValueError):
+                    pass  # de indiener heeft de verbinding al gesloten
+
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            record = None
+            try:
+                record = json.loads(line)
+                message = _message(record, on_done=reply)
+            except ValueError as e:
+                # Met het meegestuurde "ref", zodat de indiener weet welke klacht geweigerd is
+                extra = {"ref": record["ref"]} if isinstance(record, dict) and "ref" in record else None
+                reply(Message("", "", extra=extra), None, e)
+                continue
+            # Blokkeert als de wachtrij vol is; de indiener merkt dat doordat de socket niet verder gelezen wordt
+            self.server.messages.put(message)
+
+
+class _SocketServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+# Klasse: Unix-socket waarop klachten als JSON-regels worden aangeleverd. Per klacht komt er een regel terug met het
+# id in de opslag ({"id": ...}, plus een eventueel meegestuurd "ref"), zodra de klacht is opgeslagen.
+class SocketSource:
+    def __init__(self, path, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        self.path = path
+        if os.path.exists(path):
+            os.unlink(path)
+        self._server = _SocketServer(path, _SocketHandler)
+        self._server.messages = queue.Queue(maxsize=max_in_flight)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="ingest-socket", daemon=True)
+        self._thread.start()
+
+    def take(self, n, timeout):
+        messages = []
+        try:
+            messages.append(self._server.messages.get(timeout=timeout))
+            deadline = time.monotonic() + timeout
+            while len(messages) < n:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                messages.append(self._server.messages.get(timeout=remaining))
+        except queue.Empty:
+            pass
+        return messages
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+# Functie: Stuurt klachten naar een SocketSource en wacht op de bevestigingen. Geeft per klacht het antwoord terug.
+def submit(path, records, timeout=30):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(path)
+        client.sendall("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8"))
+        responses = []
+        with client.makefile("r", encoding="utf-8") as reader:
+            for line in reader:
+                responses.append(json.loads(line))
+                if len(responses) == len(records):
+                    break
+        return responses
+
+
+# Klasse: Haalt klachten uit een bron, scoort ze in micro-batches (toxiciteit via de cache, daarna categorie,
+# trefwoorden en prioriteit zoals analyze_complaint) en slaat ze per batch in één transactie op. Een batch wordt
+# verwerkt zodra hij vol is of de eerste klacht `max_wait_ms` heeft gewacht. Bijna-dubbele klachten (zie duplicates)
+# nemen de scores van hun cluster over; geef een index met threshold=0 mee om dat uit te schakelen.
+class IngestWorker:
+    def __init__(self, source, store=None, parameters=None, max_batch_size=DEFAULT_BATCH_SIZE,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS, model_id=None, toxicity_options=None, latency_window=10000,
+                 duplicates=None):
+        self.source = source
+        self.store = ComplaintStore() if store is None else store
+        self.parameters = parameters or snapshot_parameters(0.5, DEFAULT_HIGH_PRIORITY_CATEGORIES,
+                                                            default_neighborhoods, categories)
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.model_id = model_id
+        self.toxicity_options = toxicity_options or {}
+        self.duplicates = NearDuplicateIndex() if duplicates is None else duplicates
+        self.processed = 0
+        self.failed = 0
+        self.duplicate_count = 0
+        self.batches = 0
+        self._latencies = deque(maxlen=latency_window)
+        self._stop = threading.Event()
+
+    # Functie: Verwerkt één micro-batch. Geeft het aantal verwerkte klachten terug (0 als er niets binnenkwam).
+    def step(self, timeout=0.5):
+        messages = self.source.take(self.max_batch_size, timeout)
+        if not messages:
+            return 0
+        metrics.observe("batch_size", len(messages), SIZE_BUCKETS, source="ingest")
+        try:
+            # Clusters van klachten die intussen door anderen (de app, een andere worker) zijn opgeslagen
+            sync_index(self.duplicates, self.store)
+            rows = score_rows([message.text for message in messages], [message.neighborhood for message in messages],
+                              self.parameters, self._toxicity, self.duplicates)
+            for message, row in zip(messages, rows):
+                if message.extra.get("tijdstip"):
+                    row["tijdstip"] = message.extra["tijdstip"]
+            ids = self.store.append(rows)
+            self.duplicates.add_rows(rows, ids)
+        except Exception as e:
+            self.failed += len(messages)
+            for message in messages:
+                message.done(error=e)
+            return len(messages)
+
+        stored = time.time()
+        for message, complaint_id in zip(messages, ids):
+            latency = stored - message.received
+            self._latencies.append(latency)
+            metrics.observe("ingest_latency_seconds", latency)
+            message.done(complaint_id)
+        self.processed += len(messages)
+        self.duplicate_count += sum(row.get("cluster") is not None or "cluster_row" in row for row in rows)
+        self.batches += 1
+        return len(messages)
+
+    def _toxicity(self, texts):
+        return cached_toxicity_batch(texts, batch_size=self.max_batch_size, model_id=self.model_id,
+                                     with_categories=True, **self.toxicity_options)
+
+    # Functie: Verwerkt klachten totdat stop() wordt aangeroepen.
+    def run(self):
+        self._stop.clear()
+        while not self._stop.is_set():
+            self.step(timeout=self.max_wait_ms / 1000)
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        latencies = np.asarray(self._latencies)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (0.0, 0.0, 0.0)
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "duplicates": self.duplicate_count,
+            "batches": self.batches,
+            "mean_batch_size": self.processed / self.batches if self.batches else 0.0,
+            "latency_p50_ms": float(p50) * 1000,
+            "latency_p95_ms": float(p95) * 1000,
+            "latency_p99_ms": float(p99) * 1000,
+        }
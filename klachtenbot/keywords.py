@@ -0,0 +1,85 @@
+# Gecompileerde trefwoordherkenning. Alle trefwoorden (per categorie en voor urgentie) worden samengevoegd in één
+# reguliere expressie in de vorm van een trie, zodat de tekst in één keer doorlopen wordt in plaats van per trefwoord.
+import re
+from functools import lru_cache
+
+
+# Functie: Bouwt een regex-patroon met de structuur van een trie. Per positie in de tekst wordt zo alleen de tak van
+# het volgende teken geprobeerd, en levert de greedy match altijd het langste trefwoord op die positie op.
+def _trie_pattern(words):
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            return "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    def __init__(self, categories, urgent=()):
+        # Een leeg trefwoord komt in elke tekst voor en zou elke klacht een treffer voor die categorie geven
+        for category, words in list(categories.items()) + [("urgentie", urgent)]:
+            if any(not word for word in words):
+                raise ValueError(f"Leeg trefwoord in {category!r}; laat lege trefwoorden weg.")
+        self.categories = {category: list(words) for category, words in categories.items()}
+        self.urgent = list(urgent)
+
+        # Per trefwoord de posities waarop het in de categorielijsten voorkomt, zodat de volgorde (en eventuele
+        # dubbelingen) van de oorspronkelijke lijsten behouden blijft.
+        self._positions = {}
+        for category, words in self.categories.items():
+            for index, word in enumerate(words):
+                self._positions.setdefault(word, []).append((category, index))
+        self._urgent = set(self.urgent)
+
+        vocabulary = set(self._positions) | self._urgent
+        # Op elke positie vindt de regex alleen het langste trefwoord; kortere trefwoorden die daarin besloten liggen
+        # (zoals "put" in "putdeksel") worden via deze tabel aangevuld.
+        self._contained = {
+            word: [other for other in vocabulary if other in word]
+            for word in vocabulary
+        }
+        self._regex = re.compile("(?=(" + _trie_pattern(vocabulary) + "))") if vocabulary else None
+
+    # Functie: Alle trefwoorden die in de tekst voorkomen, met dezelfde betekenis als `word in text.lower()`.
+    def find(self, text):
+        if self._regex is None:
+            return set()
+        found = set()
+        for longest in set(match.group(1) for match in self._regex.finditer(text.lower())):
+            found.update(self._contained[longest])
+        return found
+
+    # Functie: Geeft per categorie de herkende trefwoorden (in de volgorde van de lijst) en de herkende
+    # urgentietrefwoorden terug.
+    def match(self, text):
+        found = self.find(text)
+        hits = sorted(position for word in found for position in self._positions.get(word, ()))
+        category_matches = {category: [] for category in self.categories}
+        for category, index in hits:
+            category_matches[category].append(self.categories[category][index])
+        urgent_hits = [word for word in self.urgent if word in found]
+        return category_matches, urgent_hits
+
+
+@lru_cache(maxsize=16)
+def _build_matcher(categories_key, urgent_key):
+    return KeywordMatcher(dict(categories_key), urgent_key)
+
+
+# Functie: Geeft een matcher voor deze trefwoordconfiguratie. De matcher wordt alleen opnieuw opgebouwd als de
+# trefwoorden daadwerkelijk veranderd zijn.
+def get_matcher(categories, urgent=()):
+    categories_key = tuple((category, tuple(words)) for category, words in categories.items())
+    return _build_matcher(categories_key, tuple(urgent))
@@ -0,0 +1,199 @@
+# Belastingtest van de Streamlit-app. Elke gesimuleerde sessie is een eigen AppTest met een eigen session_state, in
+# een eigen proces: AppTest zet per run de globale Runtime-instantie van Streamlit en ruimt die na afloop op, zodat
+# runs in één proces niet tegelijk kunnen lopen. Met een proces per sessie overlappen de reruns echt; de sessies delen
+# de opslag (SQLite in WAL-modus), elk proces heeft een eigen model, scoringsservice en caches. De sessies dienen
+# klachten in, verschuiven sliders en passen trefwoorden aan in het zijpaneel. Per sessie wordt de duur van elke rerun
+# gemeten. Elk aantal gelijktijdige sessies draait in een nieuw proces met een lege opslag, zodat geheugen en caches
+# niet van een vorige meting afhangen. Met het lokale testmodel (zie testmodel.py) draait dit volledig offline.
+import json
+import multiprocessing
+import os
+import queue
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from klachtenbot.backends import rss_bytes
+from klachtenbot.benchmark import peak_rss_bytes
+from klachtenbot.synthetic import ComplaintGenerator
+from klachtenbot.triage import categories, default_neighborhoods
+
+DEFAULT_APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Klachtenbot.py")
+# Relatieve kans per handeling van een sessie
+ACTIONS = {"klacht": 0.5, "drempel": 0.2, "wijkscore": 0.1, "trefwoorden": 0.05, "rerun": 0.15}
+DEFAULT_LEVELS = (1, 2, 4, 8)
+
+_SESSIONS_SCRIPT = """
+import json, sys
+from klachtenbot.loadtest import run_sessions
+print(json.dumps(run_sessions(**json.loads(sys.argv[1]))))
+"""
+
+
+# Functie: Voert een run van de app uit en geeft de duur in seconden terug.
+def _run(app):
+    start = time.perf_counter()
+    app.run()
+    return time.perf_counter() - start
+
+
+def _widget(widgets, label):
+    for widget in widgets:
+        if widget.label.startswith(label):
+            return widget
+    raise LookupError(f"Geen element met het label {label!r} op de pagina.")
+
+
+# Functie: Voert één handeling uit in een sessie en geeft de duur van de rerun terug, in seconden.
+def _act(app, action, generator, rng):
+    if action == "klacht":
+        text, neighborhood = generator.complaint()
+        _widget(app.selectbox, "Kies uw wijk").set_value(neighborhood)
+        _widget(app.text_area, "Voer hier uw klacht").input(text)
+    elif action == "drempel":
+        _widget(app.slider, "Drempel toxiciteitsscore").set_value(rng.choice(np.arange(0.2, 0.85, 0.05).round(2)))
+    elif action == "wijkscore":
+        _widget(app.slider, rng.choice(list(default_neighborhoods))).set_value(rng.randint(-2, 2))
+    elif action == "trefwoorden":
+        area = _widget(app.text_area, rng.choice([category for category, words in categories.items() if words]))
+        area.input(f"{area.value}, testwoord{rng.randint(0, 999)}")
+    return _run(app)
+
+
+# Functie: Eén gesimuleerde sessie in een eigen proces. Laadt en warmt eerst het model op en wacht bij `barrier` op de
+# andere sessies, zodat de laadtijd niet in de latenties meetelt. Daarna een eerste run en `reruns` willekeurige
+# handelingen (zie ACTIONS), met gemiddeld `think_time` seconden pauze ertussen. Zet (handeling, seconden), fouten en
+# het geheugengebruik van het proces in `results`.
+def _session(app_path, reruns, seed, think_time, timeout, barrier, results):
+    timings, errors = [], []
+    warm_up_seconds = 0.0
+    try:
+        from streamlit.testing.v1 import AppTest
+
+        from klachtenbot.model import registry
+
+        start = time.perf_counter()
+        registry.warm_up()
+        warm_up_seconds = time.perf_counter() - start
+    except Exception as e:
+        errors.append(repr(e))
+    finally:
+        barrier.wait()
+    rng = random.Random(seed)
+    generator = ComplaintGenerator(seed=seed)
+    try:
+        if errors:
+            raise RuntimeError("Opwarmen mislukt")
+        app = AppTest.from_file(app_path, default_timeout=timeout)
+        timings.append(("start", _run(app)))
+        for _ in range(reruns):
+            if think_time:
+                time.sleep(rng.expovariate(1 / think_time))
+            action = rng.choices(list(ACTIONS), weights=list(ACTIONS.values()))[0]
+            timings.append((action, _act(app, action, generator, rng)))
+            errors.extend(str(exception.value) for exception in app.exception)
+    except Exception as e:
+        errors.append(repr(e))
+    results.put({"timings": timings, "errors": errors, "warm_up_seconds": warm_up_seconds, "rss_after": rss_bytes(),
+                 "peak_rss": peak_rss_bytes()})
+
+
+def _latency(timings):
+    timings = np.asarray(timings, dtype=np.float64)
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99]) * 1000
+    return {"reruns": len(timings), "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99),
+            "max_ms": float(timings.max() * 1000)}
+
+
+# Functie: Haalt de resultaten van de sessieprocessen op. Een proces dat zonder resultaat stopt (bijvoorbeeld door een
+# crash van de interpreter) telt als sessie met een fout, zodat de meting niet blijft hangen.
+def _collect(processes, results):
+    collected = []
+    while len(collected) < len(processes):
+        try:
+            collected.append(results.get(timeout=1))
+        except queue.Empty:
+            if not any(process.is_alive() for process in processes):
+                try:
+                    collected.append(results.get(timeout=1))
+                except queue.Empty:
+                    missing = len(processes) - len(collected)
+                    collected.extend({"timings": [], "errors": ["Sessieproces gestopt zonder resultaat"],
+                                      "warm_up_seconds": 0.0, "rss_after": 0, "peak_rss": 0}
+                                     for _ in range(missing))
+    for process in processes:
+        process.join()
+    return collected
+
+
+# Functie: Draait `sessions` gelijktijdige sessies, elk in een eigen proces met een eigen AppTest. De sessies starten
+# pas als elk proces het model heeft geladen en opgewarmd, zodat de laadtijd niet in de latenties meetelt. Geeft
+# latentiepercentielen (alle reruns en per handeling), doorvoer en het geheugengebruik van de sessieprocessen terug.
+def run_sessions(sessions, reruns=20, app_path=DEFAULT_APP, seed=42, think_time=0.0, timeout=120):
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(sessions + 1)
+    results = context.Queue()
+    processes = [context.Process(target=_session, args=(app_path, reruns, seed + i, think_time, timeout, barrier,
+                                                        results), daemon=True)
+                 for i in range(sessions)]
+    for process in processes:
+        process.start()
+    barrier.wait()
+    start = time.perf_counter()
+    collected = _collect(processes, results)
+    elapsed = time.perf_counter() - start
+
+    timings = [timing for result in collected for timing in result["timings"]]
+    errors = [error for result in collected for error in result["errors"]]
+    reruns_done = [seconds for action, seconds in timings if action != "start"]
+    rss_after = sum(result["rss_after"] for result in collected)
+    report = {
+        "sessions": sessions,
+        "seconds": elapsed,
+        "warm_up_seconds": max(result["warm_up_seconds"] for result in collected),
+        "reruns_per_second": len(reruns_done) / elapsed if elapsed else 0.0,
+        "complaints_per_second": sum(action == "klacht" for action, _ in timings) / elapsed if elapsed else 0.0,
+        "errors": len(errors),
+        "first_errors": errors[:3],
+        # Het geheugen van alle sessieprocessen samen; per sessie het hele proces, inclusief het eigen model
+        "rss_mb": rss_after / 2**20,
+        "peak_rss_mb": sum(max(result["rss_after"], result["peak_rss"]) for result in collected) / 2**20,
+        "rss_per_session_mb": rss_after / 2**20 / sessions,
+        "latency": _latency(reruns_done) if reruns_done else None,
+        "actions": {action: _latency([seconds for name, seconds in timings if name == action])
+                    for action in ["start"] + list(ACTIONS) if any(name == action for name, _ in timings)},
+    }
+    return report
+
+
+# Functie: Meet de app bij een oplopend aantal gelijktijdige sessies (`levels`), elk niveau in een nieuw proces met
+# een eigen, lege opslag (tenzij `db` is opgegeven). Geeft per niveau het resultaat van run_sessions terug.
+def run_load_test(levels=DEFAULT_LEVELS, reruns=20, model_id=None, app_path=DEFAULT_APP, seed=42, think_time=0.0,
+                  timeout=120, db=None, env=None, log=None):
+    report = []
+    with tempfile.TemporaryDirectory(prefix="klachtenbot-loadtest-") as directory:
+        for sessions in levels:
+            child_env = dict(os.environ if env is None else env)
+            child_env["KLACHTENBOT_DB"] = db or os.path.join(directory, f"klachten-{sessions}.db")
+            # De sessies moeten de scoringsservice van het eigen proces gebruiken
+            child_env.pop("KLACHTENBOT_SERVICE_URL", None)
+            if model_id:
+                child_env["KLACHTENBOT_MODEL"] = model_id
+            package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            child_env["PYTHONPATH"] = os.pathsep.join(filter(None, [package_root, child_env.get("PYTHONPATH")]))
+            arguments = {"sessions": sessions, "reruns": reruns, "app_path": app_path, "seed": seed,
+                         "think_time": think_time, "timeout": timeout}
+            process = subprocess.run([sys.executable, "-c", _SESSIONS_SCRIPT, json.dumps(arguments)],
+                                     capture_output=True, text=True, env=child_env)
+            if process.returncode != 0:
+                raise RuntimeError(f"Belastingtest met {sessions} sessies mislukt:\n{process.stderr[-2000:]}")
+            result = json.loads(process.stdout.strip().splitlines()[-1])
+            report.append(result)
+            if log is not None:
+                print(f"{sessions} sessies: {result['reruns_per_second']:.1f} reruns/s, "
+                      f"p95 {result['latency']['p95_ms'] if result['latency'] else float('nan'):.0f} ms", file=log)
+    return report
@@ -0,0 +1,203 @@
+# Instrumentatie van de pijplijn: tijden per stap (tokeniseren, forward pass, softmax, trefwoorden, prioriteit),
+# batchgroottes en cachestatistieken. De metingen zijn op te vragen als JSON of in het tekstformaat van Prometheus.
+# Standaard uitgeschakeld; zet KLACHTENBOT_METRICS=1 of roep metrics.enable() aan. Uitgeschakeld kost een meetpunt
+# alleen een controle van `metrics.enabled`.
+import json
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger("klachtenbot")
+
+# Bovengrenzen van de histogrambakjes: seconden voor tijden, aantallen voor batchgroottes
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+# Klasse: Meet de duur van één stap en legt die bij het verlaten van het `with`-blok vast.
+class _StageTimer:
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe("stage_seconds", time.perf_counter() - self.start, stage=self.stage)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels):
+    return ",".join(f'{name}="{_label_value(value)}"' for name, value in labels)
+
+
+# Functie: Naam van een reeks met labels, zoals in het tekstformaat van Prometheus: prefilter_passed{prefilter="a"}.
+def _series_name(name, labels):
+    return f"{name}{{{_label_text(labels)}}}" if labels else name
+
+
+# Klasse: Verzameling histogrammen en tellers, gedeeld door alle threads van het proces. Reeksen worden aangeduid met
+# een naam en labels, zoals stage_seconds{stage="forward"}. Collectors leveren bij het uitlezen actuele waarden
+# (bijvoorbeeld de cachestatistieken), zodat die niet in het hete pad bijgehouden hoeven te worden.
+class Metrics:
+    def __init__(self, enabled=False, prefix="klachtenbot"):
+        self.enabled = enabled
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._collectors = []
+
+    def enable(self):
+        self.enabled = True
+        return self
+
+    def disable(self):
+        self.enabled = False
+        return self
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    # Functie: Contextmanager die de duur van een stap meet: `with metrics.time("forward"): ...`
+    def time(self, stage):
+        return _StageTimer(self, stage) if self.enabled else _NULL_TIMER
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    # Functie: Registreert een functie die bij het uitlezen een dict met actuele meetwaarden teruggeeft. De sleutel is
+    # een naam, of (naam, labels) met labels als tuple van (label, waarde)-paren, bijvoorbeeld één reeks per geladen
+    # voorfilter.
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    # Functie: Gestructureerde logregel (JSON) op DEBUG-niveau. Kost niets als het loggen op dat niveau uit staat.
+    def event(self, name, **fields):
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(json.dumps({"event": name, **fields}, ensure_ascii=False, default=str))
+
+    # Functie: De waarden van alle collectors als {(naam, labels): waarde}.
+    def _gauges(self):
+        gauges = {}
+        for collector in self._collectors:
+            for key, value in collector().items():
+                name, labels = (key, ()) if isinstance(key, str) else key
+                gauges[(name, tuple(sorted(labels)))] = value
+        return gauges
+
+    # Functie: Alle meetwaarden als dict, geschikt voor een JSON-dump.
+    def snapshot(self):
+        with self._lock:
+            histograms = [
+                {"name": name, "labels": dict(labels), "count": h.count, "sum": h.sum,
+                 "mean": h.sum / h.count if h.count else 0.0,
+                 "buckets": {str(bound): count for bound, count in zip(h.buckets, h.counts)}}
+                for (name, labels), h in sorted(self._histograms.items())
+            ]
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self._counters.items())]
+        gauges = {_series_name(name, labels): value for (name, labels), value in sorted(self._gauges().items())}
+        return {"enabled": self.enabled, "histograms": histograms, "counters": counters, "gauges": gauges}
+
+    def to_json(self, indent=2):
+        return json.dumps(self.snapshot(), indent=indent)
+
+    # Functie: Alle meetwaarden in het tekstformaat van Prometheus (histogrammen met cumulatieve bakjes).
+    def prometheus_text(self):
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        typed = set()
+        for (name, labels), h in histograms:
+            metric = f"{self.prefix}_{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip(h.buckets, h.counts):
+                cumulative += count
+                lines.append(f"{metric}_bucket{{{_label_text(labels + (('le', bound),))}}} {cumulative}")
+            lines.append(f"{metric}_bucket{{{_label_text(labels + (('le', '+Inf'),))}}} {h.count}")
+            label_text = f"{{{_label_text(labels)}}}" if labels else ""
+            lines.append(f"{metric}_sum{label_text} {h.sum}")
+            lines.append(f"{metric}_count{label_text} {h.count}")
+        for (name, labels), value in counters:
+            metric = f"{self.prefix}_{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{{{_label_text(labels)}}} {value}" if labels else f"{metric} {value}")
+        for (name, labels), value in sorted(self._gauges().items()):
+            metric = f"{self.prefix}_{name}"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{self.prefix}_{_series_name(name, labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    # Functie: Schrijft de meetwaarden naar een bestand: Prometheus-tekst bij de extensie .prom of .txt, anders JSON.
+    def dump(self, path):
+        text = self.prometheus_text() if os.path.splitext(path)[1] in (".prom", ".txt") else self.to_json()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+metrics = Metrics(enabled=os.environ.get("KLACHTENBOT_METRICS", "") not in ("", "0"))
@@ -0,0 +1,190 @@
+# Gedeeld modelregister. Streamlit voert het script bij iedere interactie opnieuw uit; door het model hier
+# (in een geïmporteerde module) te bewaren wordt het per proces maar één keer geladen en gedeeld tussen
+# alle sessies en reruns.
+# torch en transformers worden pas bij het laden van een model geïmporteerd; zo kan de app al getoond worden terwijl
+# het model op de achtergrond wordt opgewarmd.
+import json
+import os
+import threading
+import time
+
+from klachtenbot.backends import prepare_backend, resolve_backend
+
+DEFAULT_MODEL_ID = os.environ.get("KLACHTENBOT_MODEL", "ml6team/robbert-dutch-base-toxic-comments")
+# Bestandsnaam van de beschrijving in een lokaal modelartefact (zie export_artifact)
+ARTIFACT_MANIFEST = "klachtenbot.json"
+
+# Gezondheidstoestanden van een model in het register
+STATUS_COLD = "cold"
+STATUS_LOADING = "loading"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+
+def default_device():
+    import torch
+    return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+
+# Functie: Slaat tokenizer en model op als lokaal artefact: een snelle tokenizer (tokenizer.json), de gewichten als
+# safetensors (bij het laden memory-mapped) en een beschrijving met de modelklasse. Zet KLACHTENBOT_MODEL op deze map
+# om het model daarna zonder de Hugging Face hub te laden.
+def export_artifact(path, model_id=None):
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    model_id = model_id or DEFAULT_MODEL_ID
+    tokenizer = AutoTokenizer.from_pretrained(model_id, use_fast=True)
+    model = AutoModelForSequenceClassification.from_pretrained(model_id)
+    os.makedirs(path, exist_ok=True)
+    tokenizer.save_pretrained(path)
+    model.save_pretrained(path, safe_serialization=True)
+    manifest = {"source": model_id, "architecture": type(model).__name__, "tokenizer": type(tokenizer).__name__}
+    with open(os.path.join(path, ARTIFACT_MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return path
+
+
+# Functie: Laadt tokenizer en model. Een lokaal artefact wordt direct met de juiste klassen geladen, zonder de
+# Auto-klassen en zonder de hub; andere lokale mappen worden ook zonder hub geladen.
+def load_pretrained(model_id):
+    local = os.path.isdir(model_id)
+    manifest_path = os.path.join(model_id, ARTIFACT_MANIFEST)
+    if local and os.path.exists(manifest_path):
+        import transformers
+
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        tokenizer = getattr(transformers, manifest["tokenizer"]).from_pretrained(model_id, local_files_only=True)
+        model = getattr(transformers, manifest["architecture"]).from_pretrained(model_id, local_files_only=True,
+                                                                               use_safetensors=True)
+        return tokenizer, model
+
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(model_id, local_files_only=local)
+    model = AutoModelForSequenceClassification.from_pretrained(model_id, local_files_only=local)
+    return tokenizer, model
+
+
+# Een geladen tokenizer/model-paar met de bijbehorende metadata.
+class LoadedModel:
+    def __init__(self, model_id, tokenizer, model, device, load_seconds, backend="torch"):
+        self.model_id = model_id
+        self.backend = backend
+        self.tokenizer = tokenizer
+        self.model = model
+        self.device = device
+        self.load_seconds = load_seconds
+        self.warmed_up = False
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._models = {}
+        self._status = {}
+        self._errors = {}
+        self._locks = {}
+        self._warmers = {}
+        self._lock = threading.Lock()
+
+    def _model_lock(self, model_id):
+        with self._lock:
+            return self._locks.setdefault(model_id, threading.Lock())
+
+    # Functie: Geeft het geladen model terug en laadt het alleen als dat in dit proces nog niet is gebeurd. Elke
+    # combinatie van model en backend (zie klachtenbot.backends) wordt apart bewaard.
+    def get(self, model_id=None, backend=None):
+        key = (model_id or DEFAULT_MODEL_ID, resolve_backend(backend))
+        loaded = self._models.get(key)
+        if loaded is not None:
+            return loaded
+
+        # Per model een eigen lock, zodat gelijktijdige sessies niet elk hun eigen kopie laden
+        with self._model_lock(key):
+            loaded = self._models.get(key)
+            if loaded is not None:
+                return loaded
+            model_id, backend = key
+            self._status[key] = STATUS_LOADING
+            self._errors.pop(key, None)
+            start = time.perf_counter()
+            try:
+                tokenizer, model = load_pretrained(model_id)
+                model, device = prepare_backend(model, tokenizer, model_id, backend, default_device())
+            except Exception as e:
+                self._status[key] = STATUS_FAILED
+                self._errors[key] = repr(e)
+                raise
+            loaded = LoadedModel(model_id, tokenizer, model, device, time.perf_counter() - start, backend)
+            self._models[key] = loaded
+            self._status[key] = STATUS_READY
+            return loaded
+
+    # Functie: Zet een elders geladen model in het register, bijvoorbeeld een model in gedeeld geheugen dat een
+    # werkproces van het hoofdproces heeft gekregen (zie klachtenbot.pool).
+    def register(self, loaded):
+        key = (loaded.model_id, resolve_backend(loaded.backend))
+        with self._model_lock(key):
+            self._models[key] = loaded
+            self._status[key] = STATUS_READY
+        return loaded
+
+    # Functie: Laadt het model en draait één korte inferentie, zodat de eerste echte klacht geen opstartkosten betaalt.
+    def warm_up(self, model_id=None, backend=None):
+        loaded = self.get(model_id, backend)
+        if not loaded.warmed_up:
+            import torch
+            inputs = loaded.tokenizer("opwarmen", return_tensors="pt", truncation=True, max_length=16)
+            inputs = {k: v.to(loaded.device) for k, v in inputs.items()}
+            with torch.no_grad():
+                loaded.model(**inputs)
+            loaded.warmed_up = True
+        return loaded
+
+    # Functie: Start het laden en opwarmen in een achtergrondthread en keert direct terug. Een tweede aanroep start
+    # geen nieuwe thread, behalve als het vorige laden mislukt is. De voortgang is te volgen via status().
+    def warm_up_in_background(self, model_id=None, backend=None):
+        key = (model_id or DEFAULT_MODEL_ID, resolve_backend(backend))
+        with self._lock:
+            thread = self._warmers.get(key)
+            if thread is not None and (thread.is_alive() or self._status.get(key) != STATUS_FAILED):
+                return thread
+            if key not in self._models:
+                self._status[key] = STATUS_LOADING
+            thread = threading.Thread(target=self._warm_up_quietly, args=key, name=f"warm-up {key[0]}", daemon=True)
+            self._warmers[key] = thread
+        thread.start()
+        return thread
+
+    def _warm_up_quietly(self, model_id, backend):
+        try:
+            self.warm_up(model_id, backend)
+        except Exception:
+            pass  # de fout staat in status() en wordt bij de eerste echte aanroep opnieuw opgegooid
+
+    # Functie: Gezondheidsinformatie over een model, bruikbaar voor de UI en voor health checks.
+    def status(self, model_id=None, backend=None):
+        key = (model_id or DEFAULT_MODEL_ID, resolve_backend(backend))
+        loaded = self._models.get(key)
+        return {
+            "model_id": key[0],
+            "backend": key[1],
+            "status": self._status.get(key, STATUS_COLD),
+            "device": str(loaded.device) if loaded else None,
+            "load_seconds": loaded.load_seconds if loaded else None,
+            "warmed_up": loaded.warmed_up if loaded else False,
+            "error": self._errors.get(key),
+        }
+
+    def unload(self, model_id=None, backend=None):
+        key = (model_id or DEFAULT_MODEL_ID, resolve_backend(backend))
+        with self._model_lock(key):
+            self._models.pop(key, None)
+            self._status[key] = STATUS_COLD
+
+
+# Eén register per proces
+registry = ModelRegistry()
+
+
+def get_model(model_id=None, backend=None):
+    return registry.get(model_id, backend)
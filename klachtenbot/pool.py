@@ -0,0 +1,133 @@
+# Pool van scoringsprocessen voor grote bulkruns op machines met veel cores. Eén PyTorch-proces schaalt op de CPU niet
+# lineair met het aantal cores; daarom wordt de stroom klachten in blokken over meerdere processen verdeeld, elk met
+# een beperkt aantal threads. Een kopie van de fp32-gewichten wordt één keer in gedeeld geheugen gezet en door alle
+# processen alleen gelezen. Resultaten komen in de oorspronkelijke volgorde terug en er staan nooit meer dan
+# `max_pending` blokken tegelijk uit, zodat het geheugengebruik begrensd blijft.
+import copy
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from klachtenbot.backends import resolve_backend
+from klachtenbot.model import DEFAULT_MODEL_ID, LoadedModel, registry
+from klachtenbot.toxicity import DEFAULT_BATCH_SIZE
+
+DEFAULT_WORKERS = int(os.environ.get("KLACHTENBOT_WORKERS", "0")) or max(1, (os.cpu_count() or 1) // 4)
+
+# Scorecache van een werkproces (zie _init_worker)
+_worker_cache = None
+
+
+def default_threads(workers):
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+# Functie: De instellingen van torch in dit proces die de uitkomst van de berekeningen beïnvloeden. Werkprocessen
+# starten met spawn en erven ze niet; ze krijgen ze mee, zodat ze op dezelfde manier rekenen als het hoofdproces.
+def numeric_settings():
+    import torch
+    return {"dtype": torch.get_default_dtype(), "matmul_precision": torch.get_float32_matmul_precision(),
+            "mkldnn": torch.backends.mkldnn.enabled}
+
+
+# Functie: Initialisatie van een werkproces: het aantal threads vastleggen en het model in het register van dit proces
+# zetten. Met `shared` (tokenizer en model in gedeeld geheugen) wordt niets opnieuw geladen; anders laadt het proces
+# het model zelf (bijvoorbeeld voor de onnx-backend, waarvan ONNX Runtime het bestand zelf memory-mapt). Een werkproces
+# houdt zijn scorecache alleen in het geheugen, zodat de processen niet tegelijk in het bestand van
+# KLACHTENBOT_CACHE_DB schrijven.
+def _init_worker(threads, model_id, backend, shared, settings):
+    import torch
+    from klachtenbot.cache import ToxicityCache
+    global _worker_cache
+    _worker_cache = ToxicityCache()
+    torch.set_num_threads(threads)
+    torch.set_default_dtype(settings["dtype"])
+    torch.set_float32_matmul_precision(settings["matmul_precision"])
+    torch.backends.mkldnn.enabled = settings["mkldnn"]
+    if shared is not None:
+        tokenizer, model = shared
+        registry.register(LoadedModel(model_id, tokenizer, model, torch.device("cpu"), 0.0, backend))
+    registry.warm_up(model_id, backend)
+
+
+# Functie: Scoort een blok teksten in een werkproces; geeft de scores en de semantische categorieën terug.
+def _score_shard(texts, batch_size, model_id, options):
+    from klachtenbot.cache import cached_toxicity_batch
+    return cached_toxicity_batch(texts, batch_size=batch_size, model_id=model_id, cache=_worker_cache,
+                                 with_categories=True, **options)
+
+
+class ScoringPool:
+    def __init__(self, workers=DEFAULT_WORKERS, threads_per_worker=None, model_id=None, backend=None,
+                 batch_size=DEFAULT_BATCH_SIZE, max_pending=None):
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker or default_threads(workers)
+        self.model_id = model_id or DEFAULT_MODEL_ID
+        self.backend = resolve_backend(backend)
+        self.batch_size = batch_size
+        self.max_pending = max_pending or 2 * workers
+        self._executor = None
+
+    # Functie: Start de werkprocessen. Voor de torch-backend wordt het model hier geladen en een kopie in gedeeld
+    # geheugen gezet; de processen krijgen alleen een verwijzing naar dat geheugen mee. Het model in het register van
+    # dit proces blijft ongewijzigd (device, gradients), zodat de app of de service het ongestoord kan blijven
+    # gebruiken.
+    def start(self):
+        import torch.multiprocessing
+
+        shared = None
+        if self.backend == "torch":
+            loaded = registry.get(self.model_id, self.backend)
+            model = copy.deepcopy(loaded.model).to("cpu").eval()
+            for parameter in model.parameters():
+                parameter.requires_grad_(False)
+            shared = (loaded.tokenizer, model.share_memory())
+        self._executor = ProcessPoolExecutor(
+            self.workers, mp_context=torch.multiprocessing.get_context("spawn"), initializer=_init_worker,
+            initargs=(self.threads_per_worker, self.model_id, self.backend, shared, numeric_settings()))
+        return self
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self.start() if self._executor is None else self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def _submit(self, texts, options):
+        return self._executor.submit(_score_shard, texts, self.batch_size, self.model_id,
+                                     {"backend": self.backend, **options})
+
+    # Functie: Scoort een stroom blokken (bijvoorbeeld rijen uit een invoerbestand) en geeft per blok (blok, scores,
+    # semantische categorieën) terug, in de volgorde van de invoer. `texts_of` haalt de teksten uit een blok. Er worden
+    # pas nieuwe blokken ingelezen als er minder dan max_pending onderweg zijn.
+    def map_chunks(self, chunks, texts_of=list, **options):
+        options.pop("backend", None)
+        pending = deque()
+        for chunk in chunks:
+            pending.append((chunk, self._submit(texts_of(chunk), options)))
+            if len(pending) >= self.max_pending:
+                chunk, future = pending.popleft()
+                yield (chunk, *future.result())
+        while pending:
+            chunk, future = pending.popleft()
+            yield (chunk, *future.result())
+
+    # Functie: Zelfde interface als ScoringService.score_many: scoort een lijst teksten, verdeeld over de processen.
+    def score_many(self, texts, with_categories=False, **options):
+        texts = list(texts)
+        size = max(self.batch_size, -(-len(texts) // self.workers))
+        shards = [texts[i:i + size] for i in range(0, len(texts), size)]
+        scores, categories = [], []
+        for _, shard_scores, shard_categories in self.map_chunks(shards, **options):
+            scores.append(shard_scores)
+            categories.extend(shard_categories)
+        scores = np.concatenate(scores) if scores else np.empty(0, dtype=np.float32)
+        return (scores, categories) if with_categories else scores
@@ -0,0 +1,196 @@
+# Goedkoop voorfilter voor het toxiciteitsmodel. Een logistisch model op gehashte woord- en lettergroepen, getraind op
+# de scores van het transformermodel zelf, schat in een fractie van de tijd hoe toxisch een klacht is. Klachten waarvan
+# het voorfilter zeker weet dat ze schoon zijn (schatting onder `clean_below`) slaan het transformermodel over; alle
+# andere gaan er gewoon doorheen. Een klein, vast deel van de overgeslagen klachten wordt ter controle toch door het
+# model gehaald, zodat de overeenstemming met het volledige model in productie zichtbaar blijft.
+import json
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from klachtenbot.metrics import metrics
+from klachtenbot.tokens import normalize_text
+
+DEFAULT_PREFILTER = os.environ.get("KLACHTENBOT_PREFILTER") or None
+DEFAULT_CLEAN_BELOW = 0.1
+DEFAULT_AUDIT_RATE = float(os.environ.get("KLACHTENBOT_PREFILTER_AUDIT", "0.02"))
+DEFAULT_FEATURES = 2 ** 18
+# Een gecontroleerde klacht telt als overeenstemming als het volledige model hem ook niet toxisch vindt
+AGREEMENT_THRESHOLD = 0.5
+# Grenzen die bij het trainen worden vergeleken
+EVALUATION_BANDS = (0.02, 0.05, 0.1, 0.2, 0.3)
+
+_word = re.compile(r"\w+")
+
+
+def _hash(feature, n_features):
+    return zlib.crc32(feature.encode("utf-8")) % n_features
+
+
+# Functie: Gehashte kenmerken van een tekst: woorden, woordparen en lettergroepjes van drie binnen woorden (voor
+# samenstellingen en spelfouten). Geeft unieke indices terug; elk kenmerk telt even zwaar.
+def text_features(text, n_features=DEFAULT_FEATURES):
+    words = _word.findall(normalize_text(text).lower())
+    features = {_hash("w:" + word, n_features) for word in words}
+    features.update(_hash(f"b:{a} {b}", n_features) for a, b in zip(words, words[1:]))
+    for word in words:
+        padded = f"<{word}>"
+        features.update(_hash("c:" + padded[i:i + 3], n_features) for i in range(len(padded) - 2))
+    return np.fromiter(features, dtype=np.int64, count=len(features))
+
+
+# Functie: Kenmerken van een lijst teksten in een compacte rij-indeling: per kenmerk het rijnummer, de index en het
+# gewicht (1/wortel van het aantal kenmerken van die tekst).
+def _feature_matrix(texts, n_features):
+    per_text = [text_features(text, n_features) for text in texts]
+    counts = np.array([len(features) for features in per_text], dtype=np.int64)
+    rows = np.repeat(np.arange(len(per_text)), counts)
+    indices = np.concatenate(per_text) if per_text else np.empty(0, dtype=np.int64)
+    values = np.repeat(1 / np.sqrt(np.maximum(counts, 1)), counts)
+    return rows, indices, values
+
+
+class Prefilter:
+    def __init__(self, weights, bias=0.0, clean_below=DEFAULT_CLEAN_BELOW, audit_rate=DEFAULT_AUDIT_RATE, name=""):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.clean_below = clean_below
+        self.audit_rate = audit_rate
+        self.name = name
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def n_features(self):
+        return len(self.weights)
+
+    def reset_stats(self):
+        self.passed = 0
+        self.routed = 0
+        self.audited = 0
+        self.agreed = 0
+
+    # Functie: Geschatte kans op toxiciteit per tekst.
+    def predict(self, texts):
+        rows, indices, values = _feature_matrix(texts, self.n_features)
+        logits = np.bincount(rows, weights=self.weights[indices] * values, minlength=len(texts)) + self.bias
+        return (1 / (1 + np.exp(-logits))).astype(np.float32)
+
+    # Functie: Bepaalt per tekst of die het transformermodel kan overslaan. Geeft de schattingen terug, welke teksten
+    # naar het model moeten en welke overgeslagen teksten ter controle toch gescoord worden. De controle is
+    # deterministisch per tekst, zodat dezelfde klacht steeds dezelfde route volgt.
+    def route(self, texts, clean_below=None):
+        clean_below = self.clean_below if clean_below is None else clean_below
+        estimates = self.predict(texts)
+        clean = estimates < clean_below
+        audit = np.zeros(len(texts), dtype=bool)
+        if self.audit_rate > 0:
+            for i in np.flatnonzero(clean):
+                audit[i] = zlib.crc32(normalize_text(texts[i]).encode("utf-8")) % 10000 < self.audit_rate * 10000
+        return estimates, ~clean | audit, audit
+
+    # Functie: Legt vast hoeveel teksten zijn overgeslagen en hoe vaak het model het bij de controles eens was.
+    def record(self, passed, routed, audited, agreed):
+        with self._lock:
+            self.passed += passed
+            self.routed += routed
+            self.audited += audited
+            self.agreed += agreed
+
+    def stats(self):
+        total = self.passed + self.routed
+        return {
+            "name": self.name,
+            "clean_below": self.clean_below,
+            "passed": self.passed,
+            "routed": self.routed,
+            "skip_rate": self.passed / total if total else 0.0,
+            "audited": self.audited,
+            "agreement_rate": self.agreed / self.audited if self.audited else None,
+        }
+
+    # Functie: Traint het voorfilter op teksten met de scores van het transformermodel als (zachte) doelwaarden.
+    # Logistische regressie met L2-regularisatie, geoptimaliseerd met Adam over de hele set tegelijk.
+    @classmethod
+    def train(cls, texts, targets, n_features=DEFAULT_FEATURES, epochs=300, learning_rate=0.05, l2=1e-6, **kwargs):
+        rows, indices, values = _feature_matrix(texts, n_features)
+        targets = np.asarray(targets, dtype=np.float64)
+        count = len(targets)
+        weights = np.zeros(n_features)
+        bias = np.log(max(targets.mean(), 1e-6) / max(1 - targets.mean(), 1e-6))
+        moments = [np.zeros(n_features + 1), np.zeros(n_features + 1)]
+        for step in range(1, epochs + 1):
+            logits = np.bincount(rows, weights=weights[indices] * values, minlength=count) + bias
+            error = 1 / (1 + np.exp(-logits)) - targets
+            gradient = np.append(np.bincount(indices, weights=error[rows] * values, minlength=n_features) / count
+                                 + l2 * weights, error.mean())
+            moments[0] = 0.9 * moments[0] + 0.1 * gradient
+            moments[1] = 0.999 * moments[1] + 0.001 * gradient ** 2
+            corrected = moments[0] / (1 - 0.9 ** step), moments[1] / (1 - 0.999 ** step)
+            update = learning_rate * corrected[0] / (np.sqrt(corrected[1]) + 1e-8)
+            weights -= update[:-1]
+            bias -= update[-1]
+        return cls(weights, bias, **kwargs)
+
+    def save(self, path):
+        config = {"bias": self.bias, "clean_below": self.clean_below, "audit_rate": self.audit_rate}
+        np.savez_compressed(path, weights=self.weights, config=np.array(json.dumps(config)))
+        return path
+
+    @classmethod
+    def load(cls, path, **overrides):
+        with np.load(path) as data:
+            config = json.loads(str(data["config"]))
+            config.update(overrides)
+            return cls(data["weights"], name=os.path.basename(path), **config)
+
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+# Functie: Laadt een voorfilter één keer per proces, zodat de statistieken over alle aanroepen worden bijgehouden.
+def load_prefilter(path):
+    with _loaded_lock:
+        if path not in _loaded:
+            _loaded[path] = Prefilter.load(path)
+        return _loaded[path]
+
+
+# Functie: Meetwaarden per geladen voorfilter, met het pad als label.
+def _prefilter_metrics():
+    gauges = {}
+    for path, prefilter in list(_loaded.items()):
+        stats = prefilter.stats()
+        labels = (("prefilter", path),)
+        gauges.update({("prefilter_passed", labels): stats["passed"], ("prefilter_routed", labels): stats["routed"],
+                       ("prefilter_skip_rate", labels): stats["skip_rate"],
+                       ("prefilter_audited", labels): stats["audited"],
+                       ("prefilter_agreement_rate", labels): stats["agreement_rate"] or 0.0})
+    return gauges
+
+
+metrics.add_collector(_prefilter_metrics)
+
+
+# Functie: Vergelijkt het voorfilter met de scores van het volledige model voor een aantal grenzen: welk deel wordt
+# overgeslagen, hoe vaak is het model het eens dat een overgeslagen klacht niet toxisch is, hoeveel toxische klachten
+# zouden er gemist worden en hoe vaak komt de uiteindelijke beslissing (toxisch of niet) overeen.
+def evaluate(prefilter, texts, scores, tox_threshold=0.5, bands=EVALUATION_BANDS):
+    estimates = prefilter.predict(texts)
+    toxic = np.asarray(scores) > tox_threshold
+    report = []
+    for band in bands:
+        clean = estimates < band
+        missed = int(np.sum(clean & toxic))
+        report.append({
+            "clean_below": band,
+            "skip_rate": float(clean.mean()) if len(clean) else 0.0,
+            "agreement_skipped": float(1 - missed / clean.sum()) if clean.any() else 1.0,
+            "missed_toxic": missed,
+            "agreement": float(1 - missed / len(clean)) if len(clean) else 1.0,
+        })
+    return report
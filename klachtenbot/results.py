@@ -0,0 +1,129 @@
+# Resultaatrijen van de app en de ingest-worker: naast de afgeleide kolommen (categorie, prioriteitsscore, dreigend)
+# ook de ruwe kenmerken van elke klacht (toxiciteit, herkende trefwoorden per categorie en urgentie), zodat de opslag
+# (zie klachtenbot.store) en de samenvattingen (zie klachtenbot.rollups) later met andere parameters kunnen rekenen
+# zonder het model opnieuw aan te roepen. Ook andere trefwoordenlijsten kunnen achteraf worden toegepast: alleen
+# klachten met een toegevoegd of verwijderd trefwoord worden dan opnieuw vergeleken (zie Recategorizer).
+from functools import lru_cache
+
+from klachtenbot.keywords import get_matcher
+from klachtenbot.triage import (DEFAULT_HIGH_PRIORITY_CATEGORIES, calculate_priority_score, categories, categorize,
+                                default_neighborhoods, select_category, urgent_keywords)
+
+# De trefwoordenlijsten waarmee de opgeslagen categorie is bepaald (zie Recategorizer)
+_DEFAULT_CATEGORIES = {category: tuple(words) for category, words in categories.items()}
+
+
+# Functie: Maakt een onveranderlijke momentopname van de parameters, zodat wijzigingen betrouwbaar te vergelijken zijn.
+def snapshot_parameters(tox_threshold=0.5, high_priority_categories=DEFAULT_HIGH_PRIORITY_CATEGORIES,
+                        neighborhood_scores=None, updated_categories=None):
+    neighborhood_scores = default_neighborhoods if neighborhood_scores is None else neighborhood_scores
+    updated_categories = categories if updated_categories is None else updated_categories
+    return {
+        "tox_threshold": float(tox_threshold),
+        "high_priority_categories": tuple(high_priority_categories),
+        "neighborhood_scores": dict(neighborhood_scores),
+        "categories": {category: tuple(words) for category, words in updated_categories.items()},
+    }
+
+
+# Functie: De parameters die categorie, dreiging en prioriteitsscore van opgeslagen klachten bepalen, als sleutel voor
+# een weergave per parameterset (zie klachtenbot.rollups en klachtenbot.store).
+def parameter_key(parameters):
+    return (parameters["tox_threshold"], tuple(sorted(parameters["high_priority_categories"])),
+            tuple(sorted(parameters["neighborhood_scores"].items())),
+            tuple((category, tuple(words)) for category, words in parameters["categories"].items()))
+
+
+# Functie: De trefwoorden die tussen twee sets trefwoordenlijsten verschillen: toegevoegd, verwijderd of naar een andere
+# categorie verplaatst. Alleen klachten met een van deze woorden kunnen een andere categorie krijgen.
+def changed_keywords(old, new):
+    words = set()
+    for category in old.keys() | new.keys():
+        words |= set(old.get(category, ())) ^ set(new.get(category, ()))
+    return words
+
+
+# Functie: Een functie die aangeeft of een tekst een van de trefwoorden bevat (zelfde betekenis als
+# `word in text.lower()`), of None zonder trefwoorden. Bedoeld voor een handvol gewijzigde trefwoorden; voor alle
+# trefwoorden tegelijk is de KeywordMatcher sneller.
+def keyword_test(words):
+    words = sorted(words)
+    if not words:
+        return None
+
+    def contains(text):
+        lowered = text.lower()
+        return any(word in lowered for word in words)
+
+    return contains
+
+
+# Klasse: Bepaalt de categorie van opgeslagen klachten met andere trefwoordenlijsten. De opgeslagen categorie en
+# treffers gelden als die van de standaardlijsten (triage.categories); alleen een klacht met een trefwoord dat in de
+# gegeven lijsten is toegevoegd, verwijderd of verplaatst (zie affects) kan een andere categorie krijgen. De nieuwe
+# treffers volgen uit de opgeslagen treffers en de gewijzigde trefwoorden in de tekst, zonder alle trefwoorden opnieuw
+# te zoeken. Wordt er geen enkel trefwoord meer herkend, dan blijft een categorie staan die bij het analyseren ook
+# zonder trefwoord is gekozen (de semantische categorie, zie triage.categorize); anders wordt het de eerste categorie,
+# zoals bij een nieuwe klacht zonder categoriemodel.
+class Recategorizer:
+    def __init__(self, updated_categories):
+        self.categories = {category: tuple(words) for category, words in updated_categories.items()}
+        self.changed = sorted(changed_keywords(_DEFAULT_CATEGORIES, self.categories))
+        self._contains = keyword_test(self.changed)
+
+    # Functie: Of de categorie van de tekst anders kan zijn dan de opgeslagen categorie.
+    def affects(self, text):
+        return self._contains is not None and self._contains(text)
+
+    # Functie: De categorie van een klacht, met `treffers` de bij het analyseren herkende trefwoorden per categorie.
+    def category(self, text, stored, treffers):
+        lowered = text.lower()
+        found = {word for word in self.changed if word in lowered}
+        if not found:
+            return stored
+        found.update(word for words in treffers.values() for word in words)
+        category_matches = {category: [word for word in words if word in found]
+                            for category, words in self.categories.items()}
+        if not any(category_matches.values()) and not any(treffers.values()) and stored in category_matches:
+            return stored
+        return select_category(category_matches)
+
+
+# Functie: De Recategorizer voor de trefwoordenlijsten van een parameterset, of None bij de standaardlijsten (dan geldt
+# de opgeslagen categorie).
+def recategorizer(parameters):
+    key = tuple((category, tuple(words)) for category, words in parameters["categories"].items())
+    return _recategorizer(key)
+
+
+@lru_cache(maxsize=16)
+def _recategorizer(key):
+    recategorizer = Recategorizer(dict(key))
+    return recategorizer if recategorizer.changed else None
+
+
+# Functie: Berekent voor één gescoorde klacht de ruwe kenmerken en de afgeleide kolommen met de gegeven parameters.
+# Met matches en category (trefwoordtreffers per categorie, urgentie en categorie, bijvoorbeeld van een bijna-dubbele
+# klacht) worden de trefwoorden niet opnieuw gezocht. semantic_category is de semantische categorie die samen met de
+# toxiciteitsscore is bepaald (zie triage.categorize).
+def score_row(text, neighborhood, toxicity_score, parameters, matches=None, category=None, semantic_category=None):
+    p = parameters
+    if matches is None:
+        matches = get_matcher(p["categories"], urgent_keywords).match(text)
+    category_matches, urgent_hits = matches
+    category = category or categorize(category_matches, semantic_category)
+    priority_score = calculate_priority_score(
+        toxicity_score, category, category_matches.get(category, []), text,
+        p["neighborhood_scores"].get(neighborhood, 0), p["tox_threshold"], p["high_priority_categories"],
+        bool(urgent_hits))
+    return {
+        "klacht": text,
+        "wijk": neighborhood,
+        "categorie": category,
+        "prioriteitsscore": priority_score,
+        "dreigend": toxicity_score > p["tox_threshold"],
+        "toxiciteit": float(toxicity_score),
+        "trefwoorden": ", ".join(category_matches.get(category, [])),
+        "urgent": bool(urgent_hits),
+        "treffers": category_matches,
+    }
@@ -0,0 +1,322 @@
+# Samenvattingen per wijk en per categorie (aantal klachten, gemiddelde prioriteitsscore en aandeel dreigend) die
+# bijgehouden worden terwijl klachten binnenkomen, zodat het dashboard ze niet bij elke rerun uit de hele geschiedenis
+# hoeft te berekenen. Een nieuwe klacht bijwerken kost O(1); een samenvatting opvragen kost alleen het aantal wijken of
+# categorieën. Dreiging en prioriteitsscore hangen af van de parameters in het zijpaneel. Daarom wordt per parameterset
+# een weergave bijgehouden. Een nieuwe weergave wordt afgeleid van de laatst gebruikte door alleen de klachten te
+# herberekenen waarop de gewijzigde parameters invloed hebben. Met andere trefwoordenlijsten kan ook de categorie van
+# een klacht anders zijn; daarom houdt elke weergave haar eigen categorie per klacht bij.
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from klachtenbot.results import parameter_key, recategorizer, snapshot_parameters
+from klachtenbot.triage import score_priorities
+
+GROUPS = ("wijk", "categorie")
+SUMMARY_COLUMNS = ["aantal", "gemiddelde_prioriteit", "aandeel_dreigend"]
+# Maximaal aantal parametersets waarvoor een weergave wordt bijgehouden (bijvoorbeeld sessies met andere instellingen)
+DEFAULT_MAX_VIEWS = int(os.environ.get("KLACHTENBOT_ROLLUP_VIEWS", "8"))
+_INITIAL_CAPACITY = 1024
+
+
+def _grow(array, size):
+    if size <= len(array):
+        return array
+    grown = np.zeros(max(size, 2 * len(array)), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+# Klasse: Categorie, dreiging en prioriteitsscore van alle klachten met één parameterset, met de sommen per wijk en
+# categorie en het aantal klachten per categorie.
+class _View:
+    __slots__ = ("parameters", "categories", "category_counts", "priority", "threat", "priority_sums", "threat_sums")
+
+    def __init__(self, parameters, capacity):
+        self.parameters = parameters
+        self.categories = np.zeros(capacity, dtype=np.int32)
+        self.category_counts = []
+        self.priority = np.zeros(capacity, dtype=np.int8)
+        self.threat = np.zeros(capacity, dtype=bool)
+        self.priority_sums = {group: [] for group in GROUPS}
+        self.threat_sums = {group: [] for group in GROUPS}
+
+    # Functie: De codes van wijk of categorie per klacht in deze weergave.
+    def codes(self, rollups, group):
+        return self.categories if group == "categorie" else rollups._codes[group]
+
+    def copy(self, parameters):
+        view = _View(parameters, 0)
+        view.categories = self.categories.copy()
+        view.category_counts = list(self.category_counts)
+        view.priority = self.priority.copy()
+        view.threat = self.threat.copy()
+        view.priority_sums = {group: list(sums) for group, sums in self.priority_sums.items()}
+        view.threat_sums = {group: list(sums) for group, sums in self.threat_sums.items()}
+        return view
+
+
+# Klasse: De samenvattingen. Met `store` (zie klachtenbot.store) kunnen ook andere trefwoordenlijsten worden toegepast
+# op de klachten die al zijn verwerkt; zonder opslag alleen de standaardlijsten.
+class Rollups:
+    def __init__(self, parameters=None, max_views=DEFAULT_MAX_VIEWS, store=None):
+        self.default_parameters = parameters or snapshot_parameters()
+        self.max_views = max_views
+        self.store = store
+        # Ruwe kenmerken per klacht in kolommen; wijk en opgeslagen categorie als code in self._names
+        self._size = 0
+        self._ids = np.zeros(_INITIAL_CAPACITY, dtype=np.int64)
+        self._toxicity = np.zeros(_INITIAL_CAPACITY, dtype=np.float64)
+        self._urgent = np.zeros(_INITIAL_CAPACITY, dtype=bool)
+        self._codes = {group: np.zeros(_INITIAL_CAPACITY, dtype=np.int32) for group in GROUPS}
+        self._names = {group: [] for group in GROUPS}
+        self._code_of = {group: {} for group in GROUPS}
+        # Aantal klachten per wijk en opgeslagen categorie; per weergave telt view.category_counts de categorieën
+        self._counts = {group: [] for group in GROUPS}
+        self._views = OrderedDict()
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        # Hoogste id uit de opslag dat al in de samenvattingen is verwerkt (zie sync_rollups)
+        self.synced_id = 0
+        self.rescored = 0
+        # Wordt True zodra de samenvattingen een eerste keer uit de opslag zijn opgebouwd
+        self.loaded = False
+
+    def __len__(self):
+        return self._size
+
+    def _code(self, group, label):
+        code = self._code_of[group].get(label)
+        if code is None:
+            code = self._code_of[group][label] = len(self._names[group])
+            self._names[group].append(label)
+            self._counts[group].append(0)
+            for view in self._views.values():
+                view.priority_sums[group].append(0)
+                view.threat_sums[group].append(0)
+                if group == "categorie":
+                    view.category_counts.append(0)
+        return code
+
+    # Functie: De labels (wijk of categorie) bij de gegeven codes.
+    def _labels(self, group, codes):
+        return np.array(self._names[group], dtype=object)[codes]
+
+    def _score(self, indices, category_codes, parameters):
+        toxicity = self._toxicity[indices]
+        priority = score_priorities(toxicity, self._labels("categorie", category_codes), self._urgent[indices],
+                                    self._labels("wijk", self._codes["wijk"][indices]), parameters["tox_threshold"],
+                                    parameters["high_priority_categories"], parameters["neighborhood_scores"])
+        return priority, toxicity > parameters["tox_threshold"]
+
+    # Functie: De categoriecodes van de klachten tot `size` met de trefwoordenlijsten van de parameters: de opgeslagen
+    # categorie, behalve voor de klachten die de opslag met die lijsten anders indeelt (zie
+    # ComplaintStore.recategorized). Aanroepen met self._lock.
+    def _categories(self, parameters, size):
+        codes = self._codes["categorie"][:size].copy()
+        if size == 0 or recategorizer(parameters) is None:
+            return codes
+        if self.store is None:
+            raise ValueError("Andere trefwoordenlijsten toepassen op verwerkte klachten kan alleen met de opslag; "
+                             "gebruik rollups_from_store.")
+        changed = self.store.recategorized(parameters, int(self._ids[size - 1]))
+        if changed:
+            positions = np.searchsorted(self._ids[:size], np.fromiter(changed, dtype=np.int64, count=len(changed)))
+            codes[positions] = [self._code("categorie", label) for label in changed.values()]
+        return codes
+
+    # Functie: Verwerkt nieuwe resultaatrijen (zie results.score_row of ComplaintStore.iter_rows) in de kolommen en in
+    # de sommen van elke bijgehouden weergave.
+    def add_rows(self, rows):
+        rows = list(rows)
+        with self._lock:
+            start = self._size
+            for row in rows:
+                position = self._size
+                size = position + 1
+                if size > len(self._toxicity):
+                    self._ids = _grow(self._ids, size)
+                    self._toxicity = _grow(self._toxicity, size)
+                    self._urgent = _grow(self._urgent, size)
+                    self._codes = {group: _grow(codes, size) for group, codes in self._codes.items()}
+                self._ids[position] = row.get("id", 0)
+                self._toxicity[position] = float(row["toxiciteit"])
+                self._urgent[position] = bool(row.get("urgent", False))
+                for group in GROUPS:
+                    code = self._code(group, row[group])
+                    self._codes[group][position] = code
+                    self._counts[group][code] += 1
+                self._size = size
+            if self._size == start:
+                return 0
+            indices = np.arange(start, self._size)
+            for view in list(self._views.values()):
+                category_codes = self._codes["categorie"][indices]
+                recategorize = recategorizer(view.parameters)
+                if recategorize is not None:
+                    # Nieuwe rijen hebben de tekst en de treffers bij zich; de opslag is hier niet nodig
+                    category_codes = np.array([self._code("categorie", recategorize.category(
+                        row["klacht"], row["categorie"], row.get("treffers") or {})) for row in rows], dtype=np.int32)
+                priority, threat = self._score(indices, category_codes, view.parameters)
+                view.categories = _grow(view.categories, self._size)
+                view.priority = _grow(view.priority, self._size)
+                view.threat = _grow(view.threat, self._size)
+                view.categories[indices] = category_codes
+                view.priority[indices] = priority
+                view.threat[indices] = threat
+                for code in category_codes.tolist():
+                    view.category_counts[code] += 1
+                for group in GROUPS:
+                    codes = view.codes(self, group)[indices]
+                    for code, value, is_threat in zip(codes.tolist(), priority.tolist(), threat.tolist()):
+                        view.priority_sums[group][code] += value
+                        view.threat_sums[group][code] += is_threat
+            return self._size - start
+
+    # Functie: Leidt een weergave voor nieuwe parameters af van een bestaande. Alleen klachten waarvan de toxiciteit
+    # tussen de oude en de nieuwe drempel ligt, waarvan de categorie of wijk een andere waarde heeft gekregen, of die
+    # met de trefwoordenlijsten een andere categorie krijgen, worden herberekend; hun verschil wordt bij de sommen
+    # opgeteld. Zonder bestaande weergave worden alle klachten berekend.
+    def _derive(self, source, parameters):
+        n = self._size
+        if source is not None and source.parameters["categories"] == parameters["categories"]:
+            category_codes = source.categories[:n]
+        else:
+            category_codes = self._categories(parameters, n)
+        if source is None:
+            view = _View(parameters, max(n, _INITIAL_CAPACITY))
+            for group in GROUPS:
+                view.priority_sums[group] = [0] * len(self._names[group])
+                view.threat_sums[group] = [0] * len(self._names[group])
+            view.category_counts = [0] * len(self._names["categorie"])
+            indices = np.arange(n)
+        else:
+            old = source.parameters
+            view = source.copy(parameters)
+            dirty = np.zeros(n, dtype=bool)
+            if old["tox_threshold"] != parameters["tox_threshold"]:
+                low, high = sorted([old["tox_threshold"], parameters["tox_threshold"]])
+                toxicity = self._toxicity[:n]
+                dirty |= (toxicity > low) & (toxicity <= high)
+            toggled = set(old["high_priority_categories"]) ^ set(parameters["high_priority_categories"])
+            changed = {name for name in old["neighborhood_scores"].keys() | parameters["neighborhood_scores"].keys()
+                       if old["neighborhood_scores"].get(name) != parameters["neighborhood_scores"].get(name)}
+            for group, labels in (("categorie", toggled), ("wijk", changed)):
+                codes = [self._code_of[group][label] for label in labels if label in self._code_of[group]]
+                if codes:
+                    dirty |= np.isin(view.codes(self, group)[:n], codes)
+            dirty |= view.categories[:n] != category_codes
+            indices = np.flatnonzero(dirty)
+        if len(indices) == 0:
+            return view
+
+        priority, threat = self._score(indices, category_codes[indices], parameters)
+        # Het oude aandeel van een klacht gaat van de sommen van haar oude groep af, het nieuwe gaat naar de nieuwe
+        # groep; voor een nieuwe weergave is het oude aandeel nul
+        old = {group: view.codes(self, group)[indices] for group in GROUPS}
+        old_priority = view.priority[indices].astype(np.int64)
+        old_threat = view.threat[indices].astype(np.int64)
+        view.categories[indices] = category_codes[indices]
+        view.priority[indices] = priority
+        view.threat[indices] = threat
+        size = len(self._names["categorie"])
+        counts = np.bincount(category_codes[indices], minlength=size)
+        if source is not None:
+            counts -= np.bincount(old["categorie"], minlength=size)
+        for code in np.flatnonzero(counts):
+            view.category_counts[code] += int(counts[code])
+        for group in GROUPS:
+            size = len(self._names[group])
+            new = view.codes(self, group)[indices]
+            for sums, before, after in ((view.priority_sums[group], old_priority, priority),
+                                        (view.threat_sums[group], old_threat, threat)):
+                changes = (np.bincount(new, weights=after.astype(np.int64), minlength=size)
+                           - np.bincount(old[group], weights=before, minlength=size))
+                for code in np.flatnonzero(changes):
+                    sums[code] += int(changes[code])
+        self.rescored += len(indices)
+        return view
+
+    def _view(self, parameters):
+        key = parameter_key(parameters)
+        view = self._views.get(key)
+        if view is None:
+            # Bij voorkeur een weergave met dezelfde trefwoordenlijsten, dan hoeft de categorie niet opnieuw bepaald
+            views = list(reversed(self._views.values()))
+            source = next((view for view in views if view.parameters["categories"] == parameters["categories"]),
+                          views[0] if views else None)
+            view = self._views[key] = self._derive(source, parameters)
+            while len(self._views) > self.max_views:
+                self._views.popitem(last=False)
+        self._views.move_to_end(key)
+        return view
+
+    # Functie: Aantal klachten, gemiddelde prioriteitsscore en aandeel dreigend per wijk of per categorie (`group`),
+    # met de gegeven parameters (zie results.snapshot_parameters; standaard die van de constructor). Gesorteerd op
+    # aantal klachten.
+    def summary(self, group="wijk", parameters=None):
+        if group not in GROUPS:
+            raise ValueError(f"Onbekende groepering {group!r}; kies uit {', '.join(GROUPS)}.")
+        with self._lock:
+            view = self._view(parameters or self.default_parameters)
+            counts = np.array(view.category_counts if group == "categorie" else self._counts[group], dtype=np.int64)
+            frame = pd.DataFrame({
+                group: list(self._names[group]),
+                "aantal": counts,
+                "gemiddelde_prioriteit": np.array(view.priority_sums[group], dtype=np.float64) / np.maximum(counts, 1),
+                "aandeel_dreigend": np.array(view.threat_sums[group], dtype=np.float64) / np.maximum(counts, 1),
+            })
+        return frame.sort_values("aantal", ascending=False, kind="stable").reset_index(drop=True)
+
+    # Functie: Dezelfde kengetallen over alle klachten samen.
+    def totals(self, parameters=None):
+        with self._lock:
+            view = self._view(parameters or self.default_parameters)
+            count = self._size
+            priority = sum(view.priority_sums["wijk"])
+            threats = sum(view.threat_sums["wijk"])
+        return {"aantal": count, "gemiddelde_prioriteit": priority / count if count else 0.0,
+                "aandeel_dreigend": threats / count if count else 0.0}
+
+    def stats(self):
+        return {"klachten": self._size, "wijken": len(self._names["wijk"]),
+                "categorieen": len(self._names["categorie"]), "weergaven": len(self._views),
+                "herberekend": self.rescored}
+
+
+# Functie: Bouwt de samenvattingen op uit de klachtenopslag. Met background keert de functie direct terug en worden de
+# samenvattingen in een achtergrondthread opgebouwd; `loaded` geeft aan wanneer dat klaar is.
+def rollups_from_store(store, parameters=None, background=False, **kwargs):
+    rollups = Rollups(parameters, store=store, **kwargs)
+    if background:
+        threading.Thread(target=sync_rollups, args=(rollups, store), name="samenvattingen", daemon=True).start()
+    else:
+        sync_rollups(rollups, store)
+    return rollups
+
+
+# Functie: Neemt de klachten op die sinds de vorige aanroep aan de opslag zijn toegevoegd, bijvoorbeeld door de app of
+# door een ingest-worker in een ander proces. Met wait=False keert de functie direct terug als er al een synchronisatie
+# bezig is (bijvoorbeeld het opbouwen op de achtergrond). Geeft het aantal nieuwe klachten terug.
+def sync_rollups(rollups, store, chunk_size=10000, wait=True):
+    if not rollups._sync_lock.acquire(blocking=wait):
+        return 0
+    try:
+        added = 0
+        chunk = []
+        for row in store.iter_rows(chunk_size, after_id=rollups.synced_id):
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                added += rollups.add_rows(chunk)
+                rollups.synced_id = chunk[-1]["id"]
+                chunk = []
+        if chunk:
+            added += rollups.add_rows(chunk)
+            rollups.synced_id = chunk[-1]["id"]
+        rollups.loaded = True
+        return added
+    finally:
+        rollups._sync_lock.release()
@@ -0,0 +1,287 @@
+# Scoringsservice met micro-batching. Gelijktijdige verzoeken (bijvoorbeeld van verschillende Streamlit-sessies) worden
+# een paar milliseconden verzameld en als één batch door het model gehaald. Elk verzoek krijgt een eigen future terug.
+# Dezelfde service kan via een kleine asyncio HTTP-server ook aan andere processen worden aangeboden.
+import asyncio
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+from concurrent.futures import Future
+from urllib.parse import parse_qs
+
+import numpy as np
+
+from klachtenbot.cache import cached_toxicity_batch
+from klachtenbot.metrics import SIZE_BUCKETS, metrics
+from klachtenbot.model import registry
+from klachtenbot.results import snapshot_parameters
+from klachtenbot.rollups import Rollups, sync_rollups
+from klachtenbot.toxicity import AGGREGATES, DEFAULT_BATCH_SIZE, DEFAULT_MAX_LENGTH
+
+DEFAULT_MAX_BATCH_SIZE = int(os.environ.get("KLACHTENBOT_MAX_BATCH_SIZE", str(DEFAULT_BATCH_SIZE)))
+DEFAULT_MAX_WAIT_MS = float(os.environ.get("KLACHTENBOT_MAX_WAIT_MS", "5"))
+# Scoringsinstellingen die een client per verzoek mag kiezen, met hun type. Backend, voorfilter en categoriemodel
+# (bestanden op de server) liggen vast bij het starten van de service.
+REQUEST_OPTIONS = {"max_length": int, "chunked": bool, "stride": int, "aggregate": str, "prefilter_threshold": float}
+
+_STOP = object()
+
+
+class ScoringService:
+    def __init__(self, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS, model_id=None,
+                 default_options=None):
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.model_id = model_id
+        self.default_options = default_options or {}
+        self.requests = 0
+        self.batches = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="klachtenbot-scoring", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        with self._lock:
+            if self._thread is not None:
+                self._queue.put(_STOP)
+                self._thread.join()
+                self._thread = None
+
+    # Functie: Plaatst een tekst in de wachtrij en geeft een future terug die (toxiciteitsscore, semantische categorie
+    # of None) oplevert; de categorie komt uit dezelfde forward pass (zie klachtenbot.categorizer). Extra options (zoals
+    # chunked of backend) worden doorgegeven aan de scoring; alleen verzoeken met dezelfde options delen een forward
+    # pass.
+    def submit(self, text, **options):
+        self.start()
+        future = Future()
+        options = {**self.default_options, **options}
+        self._queue.put((text, tuple(sorted(options.items())), future))
+        return future
+
+    # Functie: De toxiciteitsscore van één tekst; met with_category=True (score, semantische categorie of None).
+    def score(self, text, timeout=None, with_category=False, **options):
+        score, category = self.submit(text, **options).result(timeout)
+        return (score, category) if with_category else score
+
+    async def score_async(self, text, with_category=False, **options):
+        score, category = await asyncio.wrap_future(self.submit(text, **options))
+        return (score, category) if with_category else score
+
+    def score_many(self, texts, with_categories=False, **options):
+        futures = [self.submit(text, **options) for text in texts]
+        results = [future.result() for future in futures]
+        scores = np.array([score for score, _ in results], dtype=np.float32)
+        return (scores, [category for _, category in results]) if with_categories else scores
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+        }
+
+    # Functie: Verzamelt verzoeken tot de batch vol is of max_wait_ms na het eerste verzoek is verstreken.
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait_ms / 1000
+            stopping = False
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._process(batch)
+            if stopping:
+                return
+
+    def _process(self, batch):
+        metrics.observe("batch_size", len(batch), SIZE_BUCKETS, source="service")
+        groups = {}
+        for text, options, future in batch:
+            if future.set_running_or_notify_cancel():
+                groups.setdefault(options, []).append((text, future))
+        for options, items in groups.items():
+            try:
+                scores, labels = cached_toxicity_batch([text for text, _ in items], batch_size=self.max_batch_size,
+                                                       model_id=self.model_id, with_categories=True, **dict(options))
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+            for (_, future), score, label in zip(items, scores, labels):
+                future.set_result((float(score), label))
+            self.requests += len(items)
+            self.batches += 1
+
+
+# Functie: Controleert de options van een verzoek aan de service (zie REQUEST_OPTIONS). Opties met de waarde None
+# vallen weg (de instelling van de service geldt); een onbekende optie of een verkeerd type geeft een ValueError.
+def score_options(options):
+    if not isinstance(options, dict):
+        raise ValueError("options moet een JSON-object zijn")
+    checked = {}
+    for name, value in options.items():
+        if value is None:
+            continue
+        expected = REQUEST_OPTIONS.get(name)
+        if expected is None:
+            raise ValueError(f"optie {name!r} is niet toegestaan; kies uit {', '.join(REQUEST_OPTIONS)}")
+        if expected is float and isinstance(value, int) and not isinstance(value, bool):
+            value = float(value)
+        if not isinstance(value, expected) or (expected is int and isinstance(value, bool)):
+            raise ValueError(f"optie {name!r} moet van het type {expected.__name__} zijn")
+        checked[name] = value
+    if not 1 <= checked.get("max_length", DEFAULT_MAX_LENGTH) <= DEFAULT_MAX_LENGTH:
+        raise ValueError(f"max_length moet tussen 1 en {DEFAULT_MAX_LENGTH} liggen")
+    if checked.get("stride", 0) < 0:
+        raise ValueError("stride mag niet negatief zijn")
+    if checked.get("aggregate", AGGREGATES[0]) not in AGGREGATES:
+        raise ValueError(f"aggregate moet een van {', '.join(AGGREGATES)} zijn")
+    if not 0 <= checked.get("prefilter_threshold", 0.0) <= 1:
+        raise ValueError("prefilter_threshold moet tussen 0 en 1 liggen")
+    return checked
+
+
+# Klasse: Client voor een scoringsservice in een ander proces (zie serve); zelfde interface als ScoringService. Alleen
+# de options uit REQUEST_OPTIONS kunnen per verzoek gekozen worden.
+class HttpScoringClient:
+    def __init__(self, url, timeout=60):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def score_many(self, texts, with_categories=False, **options):
+        body = json.dumps({"texts": list(texts), "options": score_options(options)}).encode("utf-8")
+        request = urllib.request.Request(self.url + "/score", data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            payload = json.load(response)
+        scores = np.array(payload["scores"], dtype=np.float32)
+        # Een service van vóór de semantische categorie stuurt alleen scores
+        categories = payload.get("categories") or [None] * len(scores)
+        return (scores, categories) if with_categories else scores
+
+    def score(self, text, timeout=None, with_category=False, **options):
+        scores, categories = self.score_many([text], with_categories=True, **options)
+        return (float(scores[0]), categories[0]) if with_category else float(scores[0])
+
+    def stats(self):
+        with urllib.request.urlopen(self.url + "/health", timeout=self.timeout) as response:
+            return json.load(response)["service"]
+
+
+async def _respond(writer, status, payload, content_type="application/json"):
+    body = payload.encode("utf-8") if isinstance(payload, str) else json.dumps(payload).encode("utf-8")
+    reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}[status]
+    writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+                 f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("ascii") + body)
+    await writer.drain()
+    writer.close()
+
+
+# Functie: Antwoord op GET /rollups?groep=wijk|categorie&drempel=0.5: de samenvatting per wijk of categorie (zie
+# klachtenbot.rollups) met de standaardparameters en eventueel een andere toxiciteitsdrempel.
+def _rollups_payload(rollups, store, query):
+    sync_rollups(rollups, store)
+    group = query.get("groep", ["wijk"])[0]
+    parameters = snapshot_parameters(float(query.get("drempel", ["0.5"])[0]))
+    return {"groep": group, "totaal": rollups.totals(parameters),
+            "rijen": rollups.summary(group, parameters).to_dict("records")}
+
+
+# Functie: Minimale HTTP-server bovenop een ScoringService. POST /score met {"texts": [...], "options": {...}} geeft
+# {"scores": [...], "categories": [...]} (de semantische categorie per tekst, of null); alleen de options uit
+# REQUEST_OPTIONS zijn toegestaan, andere geven 400. GET /health geeft de modelstatus en de batchstatistieken; GET
+# /metrics geeft de meetwaarden in het tekstformaat van Prometheus (zie klachtenbot.metrics). Met een klachtenopslag
+# geeft GET /rollups de samenvatting per wijk of categorie.
+async def serve(service, host="127.0.0.1", port=8765, store=None):
+    rollups = Rollups(store=store) if store is not None else None
+
+    async def handle(reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            method, path = request_line[0], request_line[1]
+            path, _, query = path.partition("?")
+        except (IndexError, ValueError, asyncio.IncompleteReadError):
+            await _respond(writer, 400, {"error": "ongeldig verzoek"})
+            return
+
+        if method == "GET" and path == "/health":
+            status = registry.status(service.model_id, service.default_options.get("backend"))
+            await _respond(writer, 200, {"model": status, "service": service.stats()})
+        elif method == "GET" and path == "/metrics":
+            await _respond(writer, 200, metrics.prometheus_text(), "text/plain; version=0.0.4")
+        elif method == "GET" and path == "/rollups" and rollups is not None:
+            try:
+                payload = await asyncio.to_thread(_rollups_payload, rollups, store, parse_qs(query))
+            except ValueError as e:
+                await _respond(writer, 400, {"error": str(e)})
+            else:
+                await _respond(writer, 200, payload)
+        elif method == "POST" and path == "/score":
+            try:
+                request = json.loads(body)
+                options = score_options(request.get("options") or {})
+                texts = request["texts"]
+                if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                    raise ValueError("texts moet een lijst met teksten zijn")
+                results = await asyncio.gather(*(service.score_async(text, with_category=True, **options)
+                                                 for text in texts))
+            except (ValueError, KeyError, TypeError) as e:
+                await _respond(writer, 400, {"error": str(e)})
+            except Exception as e:
+                await _respond(writer, 500, {"error": repr(e)})
+            else:
+                await _respond(writer, 200, {"scores": [score for score, _ in results],
+                                             "categories": [category for _, category in results]})
+        else:
+            await _respond(writer, 404, {"error": f"onbekend pad {path}"})
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+_default_service = None
+_default_lock = threading.Lock()
+
+
+# Functie: De scoringsservice voor dit proces. Als KLACHTENBOT_SERVICE_URL is gezet wordt een externe service gebruikt.
+def get_service():
+    global _default_service
+    url = os.environ.get("KLACHTENBOT_SERVICE_URL")
+    if url:
+        return HttpScoringClient(url)
+    with _default_lock:
+        if _default_service is None:
+            _default_service = ScoringService().start()
+        return _default_service
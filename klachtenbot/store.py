@@ -0,0 +1,412 @@
+# Persistente opslag van geanalyseerde klachten in SQLite. Klachten worden alleen toegevoegd (append-only) en zijn
+# gedeeld tussen alle sessies en processen. Naast de afgeleide kolommen van het moment van analyse worden de ruwe
+# kenmerken bewaard (toxiciteit, urgentie, trefwoorden per categorie), zodat een overzicht ook met andere parameters
+# gesorteerd en gefilterd kan worden zonder het model opnieuw aan te roepen.
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import pandas as pd
+
+from klachtenbot.columnar import ResultBatch
+from klachtenbot.results import changed_keywords, keyword_test, parameter_key, recategorizer
+
+DEFAULT_DB_PATH = os.environ.get("KLACHTENBOT_DB", "klachtenbot.db")
+# Maximaal aantal parametersets waarvoor een rangschikking van het overzicht wordt bijgehouden (zie _ranking)
+DEFAULT_RANKING_VIEWS = int(os.environ.get("KLACHTENBOT_RANKING_VIEWS", "2"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS klachten (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tijdstip TEXT NOT NULL,
+    klacht TEXT NOT NULL,
+    wijk TEXT,
+    categorie TEXT,
+    prioriteitsscore INTEGER,
+    dreigend INTEGER,
+    toxiciteit REAL,
+    trefwoorden TEXT,
+    urgent INTEGER,
+    treffers TEXT,
+    cluster INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_klachten_wijk ON klachten (wijk);
+CREATE INDEX IF NOT EXISTS idx_klachten_categorie ON klachten (categorie);
+CREATE INDEX IF NOT EXISTS idx_klachten_prioriteit ON klachten (prioriteitsscore DESC, tijdstip);
+CREATE INDEX IF NOT EXISTS idx_klachten_tijdstip ON klachten (tijdstip);
+CREATE INDEX IF NOT EXISTS idx_klachten_toxiciteit ON klachten (toxiciteit);
+CREATE TABLE IF NOT EXISTS afhandeling (
+    klacht_id INTEGER NOT NULL REFERENCES klachten (id),
+    tijdstip TEXT NOT NULL,
+    status TEXT NOT NULL,
+    medewerker TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_afhandeling_klacht ON afhandeling (klacht_id);
+CREATE TABLE IF NOT EXISTS clusters (
+    id INTEGER PRIMARY KEY REFERENCES klachten (id),
+    aantal INTEGER NOT NULL
+);
+"""
+
+# Rangschikking van het overzicht per parameterset, in een database in het geheugen van dit proces. De indexen maken
+# sorteren op prioriteit en bladeren met LIMIT/OFFSET even duur bij honderd of een miljoen klachten.
+RANKING_SCHEMA = """
+ATTACH DATABASE ':memory:' AS weergaven;
+CREATE TABLE weergaven.rangschikking (
+    weergave INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    prioriteitsscore INTEGER NOT NULL,
+    dreigend INTEGER NOT NULL,
+    tijdstip TEXT NOT NULL,
+    wijk TEXT,
+    categorie TEXT,
+    los INTEGER NOT NULL,
+    PRIMARY KEY (weergave, id)
+) WITHOUT ROWID;
+CREATE INDEX weergaven.idx_rangschikking_prioriteit ON rangschikking (weergave, prioriteitsscore DESC, tijdstip, id);
+CREATE INDEX weergaven.idx_rangschikking_dreigend
+    ON rangschikking (weergave, dreigend, prioriteitsscore DESC, tijdstip, id);
+CREATE INDEX weergaven.idx_rangschikking_los ON rangschikking (weergave, prioriteitsscore DESC, tijdstip, id) WHERE los;
+CREATE INDEX weergaven.idx_rangschikking_los_dreigend
+    ON rangschikking (weergave, dreigend, prioriteitsscore DESC, tijdstip, id) WHERE los;
+"""
+
+ORDERS = {
+    "prioriteit": "prioriteitsscore DESC, tijdstip ASC, id ASC",
+    "nieuwste": "tijdstip DESC, id DESC",
+    "oudste": "tijdstip ASC, id ASC",
+}
+OVERVIEW_COLUMNS = ["id", "tijdstip", "klacht", "wijk", "categorie", "prioriteitsscore", "dreigend"]
+# Een samengevoegd overzicht toont per cluster van bijna-dubbele klachten één rij met het aantal klachten
+COLLAPSED_COLUMNS = OVERVIEW_COLUMNS + ["aantal"]
+# Aantal klachten van het cluster waarvan een klacht de representant is (1 voor een klacht zonder kopieën)
+_CLUSTER_SIZE = "COALESCE((SELECT aantal FROM clusters WHERE clusters.id = {table}.id), 1)"
+EXPORT_COLUMNS = ["id", "tijdstip", "klacht", "wijk", "categorie", "prioriteitsscore", "dreigend", "toxiciteit",
+                  "trefwoorden", "urgent", "cluster"]
+
+
+def _now():
+    return datetime.now().isoformat(sep=" ", timespec="seconds")
+
+
+# Klasse: Een bijgehouden rangschikking: het nummer in de kolom weergave, de parameters en het hoogste verwerkte id.
+class _Ranking:
+    __slots__ = ("number", "parameters", "synced_id")
+
+    def __init__(self, number, parameters):
+        self.number = number
+        self.parameters = parameters
+        self.synced_id = 0
+
+
+class ComplaintStore:
+    def __init__(self, path=DEFAULT_DB_PATH, ranking_views=DEFAULT_RANKING_VIEWS):
+        self.path = path
+        self.ranking_views = max(1, ranking_views)
+        self._rankings = OrderedDict()
+        self.rescored = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        # WAL: lezers (andere sessies en processen) worden niet geblokkeerd door schrijvers
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # round() zoals in Python (naar even bij .5), zodat de scores gelijk zijn aan calculate_priority_score
+        self._db.create_function("py_round", 1, round, deterministic=True)
+        new_clusters = self._db.execute("SELECT 1 FROM sqlite_master WHERE name = 'clusters'").fetchone() is None
+        self._db.executescript(SCHEMA)
+        # Opslag van vóór de clusters van bijna-dubbele klachten
+        if "cluster" not in {column[1] for column in self._db.execute("PRAGMA table_info(klachten)")}:
+            self._db.execute("ALTER TABLE klachten ADD COLUMN cluster INTEGER")
+        # Opslag van vóór de tabel met clustergroottes: eenmalig afleiden uit de kolom cluster
+        if new_clusters:
+            with self._db:
+                self._db.execute("INSERT OR IGNORE INTO clusters (id, aantal) SELECT cluster, COUNT(*) + 1"
+                                 " FROM klachten WHERE cluster IS NOT NULL GROUP BY cluster")
+        self._db.executescript(RANKING_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # Functie: Voegt één of meer resultaatrijen toe (zoals gemaakt door results.score_row). Geeft de nieuwe ids terug.
+    # Een kopie van een eerdere klacht verwijst met "cluster" naar het id van de representant, of met "cluster_row"
+    # naar de positie van de representant in dezelfde aanroep (zie duplicates.score_rows). De grootte van het cluster
+    # wordt in dezelfde transactie bijgewerkt.
+    def append(self, rows):
+        ids = []
+        with self._lock, self._db:
+            for row in rows:
+                cluster = row.get("cluster")
+                if cluster is None and row.get("cluster_row") is not None:
+                    cluster = ids[row["cluster_row"]]
+                cursor = self._db.execute(
+                    "INSERT INTO klachten (tijdstip, klacht, wijk, categorie, prioriteitsscore, dreigend, toxiciteit,"
+                    " trefwoorden, urgent, treffers, cluster) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (row.get("tijdstip") or _now(), row["klacht"], row["wijk"], row["categorie"],
+                     int(row["prioriteitsscore"]), int(bool(row["dreigend"])), float(row["toxiciteit"]),
+                     row.get("trefwoorden", ""), int(bool(row.get("urgent", False))),
+                     json.dumps(row.get("treffers") or {}, ensure_ascii=False), cluster))
+                ids.append(cursor.lastrowid)
+                if cluster is not None:
+                    self._db.execute("INSERT INTO clusters (id, aantal) VALUES (?, 2)"
+                                     " ON CONFLICT (id) DO UPDATE SET aantal = aantal + 1", (cluster,))
+        return ids
+
+    # Functie: Laatste id in de opslag. Verandert bij elke toevoeging en is daarmee bruikbaar als cachesleutel.
+    def version(self):
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(MAX(id), 0) FROM klachten").fetchone()[0]
+
+    # Functie: Bouwt de SQL-expressies voor dreigend en prioriteitsscore uit de ruwe kenmerken en de kolom categorie,
+    # met de parameters van results.snapshot_parameters.
+    def _derived(self, parameters):
+        threshold = parameters["tox_threshold"]
+        high_priority = list(parameters["high_priority_categories"])
+        neighborhoods = list(parameters["neighborhood_scores"].items())
+        threat = "(toxiciteit > ?)"
+        high_priority_sql = f"categorie IN ({', '.join('?' * len(high_priority))})" if high_priority else "0"
+        neighborhood_sql = ("CASE wijk " + " ".join("WHEN ? THEN ?" for _ in neighborhoods) + " ELSE 0 END"
+                            if neighborhoods else "0")
+        priority = (f"MAX(1, MIN(10, py_round(2 + CASE WHEN toxiciteit > ? THEN toxiciteit * 3 ELSE 0 END"
+                    f" + CASE WHEN {high_priority_sql} THEN 3 ELSE 0 END + CASE WHEN urgent THEN 2 ELSE 0 END"
+                    f" + {neighborhood_sql})))")
+        priority_args = [threshold] + high_priority + [value for pair in neighborhoods for value in pair]
+        return threat, priority, [threshold], priority_args
+
+    def _where(self, neighborhoods, categories, threat, threat_sql, threat_args, clauses=(), args=(), table=""):
+        clauses, args = list(clauses), list(args)
+        if neighborhoods:
+            clauses.append(f"{table}wijk IN ({', '.join('?' * len(neighborhoods))})")
+            args += list(neighborhoods)
+        if categories:
+            clauses.append(f"{table}categorie IN ({', '.join('?' * len(categories))})")
+            args += list(categories)
+        if threat is not None:
+            clauses.append(f"{threat_sql} = ?")
+            args += threat_args + [int(bool(threat))]
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", args
+
+    # Functie: SQL-expressie voor de categorie van klacht c met de trefwoordenlijsten van de parameters. Bij andere dan
+    # de standaardlijsten gaat dat via py_categorie (zie results.Recategorizer), die alleen klachten met een gewijzigd
+    # trefwoord opnieuw vergelijkt. Aanroepen met self._lock.
+    def _category_sql(self, parameters):
+        recategorize = recategorizer(parameters)
+        if recategorize is None:
+            return "c.categorie"
+
+        def category(text, stored, treffers):
+            if not recategorize.affects(text):
+                return stored
+            return recategorize.category(text, stored, json.loads(treffers or "{}"))
+
+        self._db.create_function("py_categorie", 3, category, deterministic=True)
+        return "py_categorie(c.klacht, c.categorie, c.treffers)"
+
+    # Functie: De klachten tot en met until_id die met de trefwoordenlijsten van de parameters een andere categorie
+    # krijgen dan de opgeslagen categorie, als {id: categorie}. Bijvoorbeeld voor de samenvattingen per categorie.
+    def recategorized(self, parameters, until_id):
+        with self._lock:
+            category_sql = self._category_sql(parameters)
+            if category_sql == "c.categorie":
+                return {}
+            rows = self._db.execute(
+                f"WITH k AS MATERIALIZED (SELECT c.id, c.categorie AS oud, {category_sql} AS categorie"
+                f" FROM klachten AS c WHERE c.id <= ?) SELECT id, categorie FROM k WHERE categorie IS NOT oud",
+                (until_id,)).fetchall()
+        return dict(rows)
+
+    # Functie: Voorwaarden voor de klachten c waarvan categorie, dreiging of prioriteitsscore verschilt tussen twee
+    # parametersets, met o de rij in de rangschikking voor de oude parameters: de toxiciteit ligt tussen de oude en de
+    # nieuwe drempel, de categorie of wijk heeft een andere waarde gekregen, of de tekst bevat een trefwoord dat is
+    # toegevoegd, verwijderd of verplaatst. Aanroepen met self._lock.
+    def _changed(self, old, new):
+        clauses, args = [], []
+        if old["tox_threshold"] != new["tox_threshold"]:
+            clauses.append("c.toxiciteit > ? AND c.toxiciteit <= ?")
+            args += sorted([old["tox_threshold"], new["tox_threshold"]])
+        toggled = sorted(set(old["high_priority_categories"]) ^ set(new["high_priority_categories"]))
+        if toggled:
+            clauses.append(f"o.categorie IN ({', '.join('?' * len(toggled))})")
+            args += toggled
+        changed = sorted(name for name in old["neighborhood_scores"].keys() | new["neighborhood_scores"].keys()
+                         if old["neighborhood_scores"].get(name) != new["neighborhood_scores"].get(name))
+        if changed:
+            clauses.append(f"c.wijk IN ({', '.join('?' * len(changed))})")
+            args += changed
+        contains = keyword_test(changed_keywords(old["categories"], new["categories"]))
+        if contains is not None:
+            self._db.create_function("py_trefwoorden", 1, contains, deterministic=True)
+            clauses.append("py_trefwoorden(c.klacht)")
+        return " OR ".join(f"({clause})" for clause in clauses), args
+
+    # Functie: De rangschikking voor een parameterset, bijgewerkt tot de laatste klacht. Zolang er minder dan
+    # ranking_views zijn, krijgt een nieuwe parameterset een eigen rangschikking; daarna wordt de langst niet gebruikte
+    # omgezet en worden alleen de klachten herberekend waarop de gewijzigde parameters invloed hebben. Nieuwe klachten
+    # worden per aanroep toegevoegd. Aanroepen met self._lock.
+    def _ranking(self, parameters):
+        threat_sql, priority_sql, threat_args, priority_args = self._derived(parameters)
+        category_sql = self._category_sql(parameters)
+        # De categorie één keer per klacht bepalen, ook al komt ze zowel in de prioriteitsscore als in de rij voor
+        materialized = "" if category_sql == "c.categorie" else "MATERIALIZED "
+        key = parameter_key(parameters)
+        version = self._db.execute("SELECT COALESCE(MAX(id), 0) FROM klachten").fetchone()[0]
+        with self._db:
+            ranking = self._rankings.get(key)
+            if ranking is None and len(self._rankings) < self.ranking_views:
+                ranking = self._rankings[key] = _Ranking(len(self._rankings), parameters)
+            elif ranking is None:
+                _, ranking = self._rankings.popitem(last=False)
+                changed, changed_args = self._changed(ranking.parameters, parameters)
+                if changed:
+                    cursor = self._db.execute(
+                        f"UPDATE weergaven.rangschikking AS r SET prioriteitsscore = n.prioriteitsscore,"
+                        f" dreigend = n.dreigend, categorie = n.categorie FROM (WITH k AS MATERIALIZED"
+                        f" (SELECT c.id, c.wijk, c.toxiciteit, c.urgent, {category_sql} AS categorie FROM klachten AS c"
+                        f" JOIN weergaven.rangschikking AS o ON o.weergave = ? AND o.id = c.id WHERE {changed})"
+                        f" SELECT id, {priority_sql} AS prioriteitsscore, {threat_sql} AS dreigend, categorie FROM k)"
+                        f" AS n WHERE r.weergave = ? AND r.id = n.id AND (r.prioriteitsscore != n.prioriteitsscore"
+                        f" OR r.dreigend != n.dreigend OR r.categorie IS NOT n.categorie)",
+                        [ranking.number] + changed_args + priority_args + threat_args + [ranking.number])
+                    self.rescored += cursor.rowcount
+                ranking.parameters = parameters
+                self._rankings[key] = ranking
+            if version > ranking.synced_id:
+                self._db.execute(
+                    f"WITH k AS {materialized}(SELECT c.id, c.tijdstip, c.wijk, c.toxiciteit, c.urgent,"
+                    f" c.cluster IS NULL AS los, {category_sql} AS categorie FROM klachten AS c"
+                    f" WHERE c.id > ? AND c.id <= ?) INSERT INTO weergaven.rangschikking"
+                    f" SELECT ?, id, {priority_sql}, {threat_sql}, tijdstip, wijk, categorie, los FROM k",
+                    [ranking.synced_id, version, ranking.number] + priority_args + threat_args)
+                ranking.synced_id = version
+        self._rankings.move_to_end(key)
+        return ranking
+
+    # Functie: Eén pagina van het overzicht, gefilterd op wijk, categorie en dreigend en gesorteerd volgens `order`
+    # (zie ORDERS). Alleen de opgevraagde rijen worden uit de database gehaald. Met parameters komen categorie,
+    # prioriteitsscore en dreiging uit de rangschikking voor die parameters (zie _ranking). Met collapse wordt elk
+    # cluster van bijna-dubbele klachten één rij: de representant (de eerste klacht van het cluster), met in "aantal"
+    # het aantal klachten van het hele cluster. Filters en sortering gaan dan over de representant.
+    def query(self, neighborhoods=None, categories=None, threat=None, order="prioriteit", limit=50, offset=0,
+              parameters=None, collapse=False):
+        if parameters is not None:
+            return self._query_ranking(neighborhoods, categories, threat, order, limit, offset, parameters, collapse)
+        where, where_args = self._where(neighborhoods, categories, threat, "dreigend", [],
+                                        ["cluster IS NULL"] if collapse else [])
+        sql = (f"SELECT id, tijdstip, klacht, wijk, categorie, prioriteitsscore, dreigend"
+               f"{', ' + _CLUSTER_SIZE.format(table='klachten') if collapse else ''} FROM klachten{where}"
+               f" ORDER BY {ORDERS[order]} LIMIT ? OFFSET ?")
+        with self._lock:
+            rows = self._db.execute(sql, where_args + [limit, offset]).fetchall()
+        return self._frame(rows, collapse)
+
+    def _query_ranking(self, neighborhoods, categories, threat, order, limit, offset, parameters, collapse):
+        size = ", " + _CLUSTER_SIZE.format(table="k") if collapse else ""
+        with self._lock:
+            ranking = self._ranking(parameters)
+            if order == "prioriteit":
+                # Eerst de pagina via de index op de rangschikking, daarna alleen die rijen uit klachten
+                where, args = self._where(neighborhoods, categories, threat, "dreigend", [],
+                                          ["weergave = ?"] + (["los"] if collapse else []), [ranking.number])
+                rows = self._db.execute(
+                    f"SELECT k.id, k.tijdstip, k.klacht, k.wijk, r.categorie, r.prioriteitsscore, r.dreigend{size} FROM"
+                    f" (SELECT id, categorie, prioriteitsscore, dreigend, tijdstip FROM weergaven.rangschikking{where}"
+                    f" ORDER BY {ORDERS['prioriteit']} LIMIT ? OFFSET ?) AS r"
+                    f" JOIN klachten AS k ON k.id = r.id ORDER BY r.prioriteitsscore DESC, r.tijdstip ASC, r.id ASC",
+                    args + [limit, offset]).fetchall()
+            else:
+                # Op tijdstip via de index op klachten, met per klacht de rij uit de rangschikking
+                where, args = self._where(neighborhoods, categories, threat, "r.dreigend", [],
+                                          ["r.los"] if collapse else [], table="r.")
+                order_by = ", ".join(f"k.{column}" for column in ORDERS[order].split(", "))
+                rows = self._db.execute(
+                    f"SELECT k.id, k.tijdstip, k.klacht, k.wijk, r.categorie, r.prioriteitsscore, r.dreigend{size}"
+                    f" FROM klachten AS k CROSS JOIN weergaven.rangschikking AS r ON r.weergave = ? AND r.id = k.id"
+                    f"{where} ORDER BY {order_by} LIMIT ? OFFSET ?",
+                    [ranking.number] + args + [limit, offset]).fetchall()
+        return self._frame(rows, collapse)
+
+    @staticmethod
+    def _frame(rows, collapse):
+        frame = pd.DataFrame(rows, columns=COLLAPSED_COLUMNS if collapse else OVERVIEW_COLUMNS)
+        frame["dreigend"] = frame["dreigend"].astype(bool)
+        return frame
+
+    # Functie: Aantal rijen van het overzicht; met collapse het aantal clusters.
+    def count(self, neighborhoods=None, categories=None, threat=None, parameters=None, collapse=False):
+        with self._lock:
+            if parameters is not None:
+                ranking = self._ranking(parameters)
+                where, args = self._where(neighborhoods, categories, threat, "dreigend", [],
+                                          ["weergave = ?"] + (["los"] if collapse else []), [ranking.number])
+                return self._db.execute(f"SELECT COUNT(*) FROM weergaven.rangschikking{where}", args).fetchone()[0]
+            where, args = self._where(neighborhoods, categories, threat, "dreigend", [],
+                                      ["cluster IS NULL"] if collapse else [])
+            return self._db.execute(f"SELECT COUNT(*) FROM klachten{where}", args).fetchone()[0]
+
+    # Functie: Legt een statuswijziging van een klacht vast (bijvoorbeeld opgepakt of afgerond via de werklijst). Ook
+    # dit is append-only: de laatste regel per klacht is de huidige status; zonder regel is de klacht "open". Met
+    # expected wordt de wijziging alleen vastgelegd als de huidige status daarin voorkomt; controle en vastleggen
+    # gebeuren in één schrijftransactie, zodat twee processen niet allebei dezelfde klacht kunnen oppakken. Geeft
+    # terug of de wijziging is vastgelegd.
+    def record_status(self, complaint_id, status, operator=None, expected=None):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if expected is not None:
+                    current = self._db.execute(
+                        "SELECT COALESCE((SELECT status FROM afhandeling WHERE klacht_id = ? ORDER BY rowid DESC"
+                        " LIMIT 1), 'open')", (complaint_id,)).fetchone()[0]
+                    if current not in expected:
+                        self._db.rollback()
+                        return False
+                self._db.execute("INSERT INTO afhandeling (klacht_id, tijdstip, status, medewerker)"
+                                 " VALUES (?, ?, ?, ?)", (complaint_id, _now(), status, operator))
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+        return True
+
+    # Functie: De statuswijzigingen na regel after_rowid, in volgorde van vastleggen, als (regel, klacht-id, status,
+    # medewerker). Met de laatste regel als hoogwatermerk worden alleen nieuwe wijzigingen opgehaald.
+    def status_changes(self, after_rowid=0):
+        with self._lock:
+            return self._db.execute("SELECT rowid, klacht_id, status, medewerker FROM afhandeling WHERE rowid > ?"
+                                    " ORDER BY rowid", (after_rowid,)).fetchall()
+
+    # Functie: Alle opgeslagen rijen als dicts, in blokken, bijvoorbeeld om de werklijst of samenvattingen op te bouwen.
+    # Met after_id alleen de rijen die daarna zijn toegevoegd.
+    def iter_rows(self, chunk_size=10000, after_id=0):
+        last_id = after_id
+        while True:
+            with self._lock:
+                cursor = self._db.execute("SELECT * FROM klachten WHERE id > ? ORDER BY id LIMIT ?",
+                                          (last_id, chunk_size))
+                names = [d[0] for d in cursor.description]
+                rows = cursor.fetchall()
+            if not rows:
+                return
+            for values in rows:
+                row = dict(zip(names, values))
+                row["dreigend"] = bool(row["dreigend"])
+                row["urgent"] = bool(row["urgent"])
+                row["treffers"] = json.loads(row["treffers"] or "{}")
+                yield row
+            last_id = rows[-1][0]
+
+    # Functie: De opgeslagen klachten in blokken als ResultBatch (zie klachtenbot.columnar), zonder een dict per rij;
+    # bijvoorbeeld voor een export naar Parquet of Arrow. Met after_id alleen de rijen die daarna zijn toegevoegd.
+    def iter_batches(self, chunk_size=50000, after_id=0, columns=EXPORT_COLUMNS):
+        last_id = after_id
+        select = ", ".join(["id"] + [column for column in columns if column != "id"])
+        while True:
+            with self._lock:
+                rows = self._db.execute(f"SELECT {select} FROM klachten WHERE id > ? ORDER BY id LIMIT ?",
+                                        (last_id, chunk_size)).fetchall()
+            if not rows:
+                return
+            values = dict(zip(["id"] + [column for column in columns if column != "id"], zip(*rows)))
+            yield ResultBatch.from_columns({column: values[column] for column in columns})
+            last_id = rows[-1][0]
@@ -0,0 +1,91 @@
+# Generator van synthetische Nederlandse klachten voor benchmarks en belastingtests. De lengte, de dichtheid van
+# trefwoorden en het aandeel (bijna) dubbele klachten zijn instelbaar; met dezelfde seed is de uitvoer reproduceerbaar.
+import random
+
+from klachtenbot.triage import categories, default_neighborhoods, urgent_keywords
+
+OPENINGS = ["Geachte gemeente,", "Beste medewerker,", "Hallo,", "Goedendag,", ""]
+CLOSINGS = ["Met vriendelijke groet,", "Ik hoop op een snelle reactie.", "Alvast bedankt.", "Groeten,", ""]
+PROBLEM_TEMPLATES = [
+    "Bij ons in de straat is er een probleem met {keyword}.",
+    "Al weken is er overlast door {keyword} en niemand doet er iets aan.",
+    "Ik wil graag melden dat {keyword} bij ons in de buurt niet in orde is.",
+    "Kan de gemeente iets doen aan {keyword}? Het wordt steeds erger.",
+    "Sinds vorige maand is {keyword} een groot probleem geworden.",
+]
+URGENT_TEMPLATES = [
+    "De situatie is {keyword}, er moet echt snel iets gebeuren.",
+    "Het is inmiddels {keyword} voor de kinderen die hier spelen.",
+    "Er is sprake van {keyword}, graag met spoed actie.",
+]
+FILLER = [
+    "Ik woon hier al twintig jaar en heb dit nog nooit zo meegemaakt.",
+    "Mijn buren hebben er ook al meerdere keren over gebeld.",
+    "Het zou fijn zijn als iemand even komt kijken.",
+    "Ik heb eerder al een melding gedaan maar nooit iets teruggehoord.",
+    "Vooral in het weekend is het erg vervelend.",
+    "De foto's kan ik desgewenst nasturen.",
+    "Ik begrijp dat er veel meldingen binnenkomen, maar dit duurt nu wel erg lang.",
+    "Het gaat om het stuk tussen de supermarkt en het busstation.",
+]
+TOXIC = ["Jullie zijn echt een stelletje idioten.", "Wat een waardeloze gemeente is dit.",
+         "Doe eens normaal je werk, luiaards."]
+
+
+class ComplaintGenerator:
+    def __init__(self, seed=42, keyword_density=1.0, urgent_rate=0.2, toxic_rate=0.05, duplicate_rate=0.1,
+                 length="mixed"):
+        self.random = random.Random(seed)
+        self.keyword_density = keyword_density
+        self.urgent_rate = urgent_rate
+        self.toxic_rate = toxic_rate
+        self.duplicate_rate = duplicate_rate
+        self.length = length
+        self._history = []
+        self._categories = [category for category, words in categories.items() if words]
+
+    def _sentence_count(self):
+        if self.length == "short":
+            return self.random.randint(1, 2)
+        if self.length == "long":
+            return self.random.randint(30, 120)
+        # Gemengd: vooral korte meldingen, af en toe een lange brief
+        if self.random.random() < 0.9:
+            return self.random.choice([1, 2, 3, 4, 6, 8, 12])
+        return self.random.randint(30, 120)
+
+    def _new_complaint(self):
+        r = self.random
+        category = r.choice(self._categories)
+        sentences = [r.choice(OPENINGS)]
+        for _ in range(self._sentence_count()):
+            if r.random() < self.keyword_density / 2:
+                sentences.append(r.choice(PROBLEM_TEMPLATES).format(keyword=r.choice(categories[category])))
+            else:
+                sentences.append(r.choice(FILLER))
+        if r.random() < self.urgent_rate:
+            sentences.insert(2, r.choice(URGENT_TEMPLATES).format(keyword=r.choice(urgent_keywords)))
+        if r.random() < self.toxic_rate:
+            sentences.append(r.choice(TOXIC))
+        sentences.append(r.choice(CLOSINGS))
+        return " ".join(s for s in sentences if s)
+
+    # Functie: Maakt een kopie van een eerdere klacht, soms met een kleine aanpassing (zoals bij petities).
+    def _duplicate(self):
+        text = self.random.choice(self._history)
+        if self.random.random() < 0.5:
+            return text
+        return text + " " + self.random.choice(
+            ["Groet, een bewoner.", "Namens de bewonerscommissie.", "PS: graag reactie."])
+
+    # Functie: Geeft één synthetische klacht en een wijk terug.
+    def complaint(self):
+        if self._history and self.random.random() < self.duplicate_rate:
+            text = self._duplicate()
+        else:
+            text = self._new_complaint()
+            self._history.append(text)
+        return text, self.random.choice(list(default_neighborhoods))
+
+    def generate(self, n):
+        return [self.complaint() for _ in range(n)]
@@ -0,0 +1,42 @@
+# Klein lokaal testmodel met dezelfde architectuur als robBERT (RoBERTa voor sequentieclassificatie), maar met een
+# kleine woordenlijst en willekeurige gewichten. Bedoeld voor benchmarks en tests zonder netwerktoegang; de scores
+# zeggen niets over toxiciteit.
+import os
+
+from klachtenbot.synthetic import ComplaintGenerator
+
+DEFAULT_TEST_MODEL_DIR = os.path.join(os.path.expanduser("~"), ".cache", "klachtenbot", "test-model")
+
+
+# Functie: Traint een woordtokenizer op synthetische klachten en slaat die samen met een klein willekeurig
+# geïnitialiseerd RoBERTa-model op in `path`. Bestaat het model al, dan wordt het hergebruikt.
+def build_test_model(path=DEFAULT_TEST_MODEL_DIR, hidden_size=64, layers=2, heads=2, max_length=512, seed=0,
+                     overwrite=False):
+    if os.path.exists(os.path.join(path, "config.json")) and not overwrite:
+        return path
+
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers, processors, trainers
+    from transformers import PreTrainedTokenizerFast, RobertaConfig, RobertaForSequenceClassification
+
+    special = ["<s>", "<pad>", "</s>", "<unk>", "<mask>"]
+    tokenizer = Tokenizer(models.WordLevel(unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    corpus = [text for text, _ in ComplaintGenerator(seed=seed, duplicate_rate=0).generate(2000)]
+    tokenizer.train_from_iterator(corpus, trainers.WordLevelTrainer(special_tokens=special))
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="<s> $A </s>", pair="<s> $A </s> </s> $B </s>", special_tokens=[("<s>", 0), ("</s>", 2)])
+    fast = PreTrainedTokenizerFast(tokenizer_object=tokenizer, bos_token="<s>", eos_token="</s>", unk_token="<unk>",
+                                   pad_token="<pad>", mask_token="<mask>", cls_token="<s>", sep_token="</s>",
+                                   model_max_length=max_length)
+
+    torch.manual_seed(seed)
+    config = RobertaConfig(vocab_size=fast.vocab_size, hidden_size=hidden_size, num_hidden_layers=layers,
+                           num_attention_heads=heads, intermediate_size=4 * hidden_size,
+                           max_position_embeddings=max_length + 2, num_labels=2, pad_token_id=1,
+                           bos_token_id=0, eos_token_id=2)
+    model = RobertaForSequenceClassification(config).eval()
+    os.makedirs(path, exist_ok=True)
+    fast.save_pretrained(path)
+    model.save_pretrained(path)
+    return path
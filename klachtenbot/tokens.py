@@ -0,0 +1,191 @@
+# Tokenisatie voor het toxiciteitsmodel: een cache met token-id's per genormaliseerde tekst, indeling van teksten in
+# lengtebakjes en strak gepadde batches. Zo wordt een korte melding nooit samen met een brief van twee pagina's tot
+# dezelfde lengte opgevuld, en wordt een tekst die al eens getokeniseerd is niet opnieuw door de tokenizer gehaald.
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_TOKEN_CACHE_SIZE = int(os.environ.get("KLACHTENBOT_TOKEN_CACHE_SIZE", "10000"))
+# Bovengrenzen (in tokens) van de lengtebakjes. Een batch bevat alleen teksten uit hetzelfde bakje.
+DEFAULT_BUCKETS = (16, 32, 64, 128, 256, 384, 512)
+
+_whitespace = re.compile(r"\s+")
+
+
+# Functie: Normaliseert een tekst (unicode-normalisatie en witruimte), zodat kleine verschillen in opmaak dezelfde
+# sleutel opleveren.
+def normalize_text(text):
+    return _whitespace.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+# Klasse: Begrensde LRU-cache met de vensters (token-id's en attention mask) per genormaliseerde tekst en
+# tokenisatie-instellingen. Houdt ook bij hoeveel tokens er gescoord en hoeveel er opgevuld zijn.
+class TokenCache:
+    def __init__(self, maxsize=DEFAULT_TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.real_tokens = 0
+        self.padded_tokens = 0
+        # Aantal tokens als de batches zonder sortering en bakjes in aanvoervolgorde waren gevormd
+        self.unsorted_padded_tokens = 0
+
+    def get(self, key):
+        with self._lock:
+            windows = self._entries.get(key)
+            if windows is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return windows
+
+    def put(self, key, windows):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = windows
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.reset_stats()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "batches": self.batches,
+            "real_tokens": self.real_tokens,
+            "padded_tokens": self.padded_tokens,
+            "padding_ratio": 1 - self.real_tokens / self.padded_tokens if self.padded_tokens else 0.0,
+            "unsorted_padding_ratio": (1 - self.real_tokens / self.unsorted_padded_tokens
+                                       if self.unsorted_padded_tokens else 0.0),
+        }
+
+
+# Eén tokencache per proces
+token_cache = TokenCache()
+
+
+# Functie: Tokeniseert teksten met gebruik van de cache. Zonder chunking wordt afgekapt op max_length; met chunking
+# wordt elke tekst in overlappende vensters van max_length tokens gesplitst (stride = aantal overlappende tokens).
+# Geeft per venster de token-id's (np.int32) en per venster de index van de tekst waar het bij hoort.
+def encode(tokenizer, texts, max_length, chunked, stride, tokenizer_id="", cache=None):
+    cache = token_cache if cache is None else cache
+    if chunked and not 0 <= stride < max_length - tokenizer.num_special_tokens_to_add():
+        raise ValueError(f"stride ({stride}) moet kleiner zijn dan de venstergrootte ({max_length}).")
+    settings = (tokenizer_id, max_length, stride if chunked else None)
+
+    per_text = [None] * len(texts)
+    missing = {}
+    for i, text in enumerate(texts):
+        normalized = normalize_text(text)
+        windows = cache.get((settings, normalized))
+        if windows is None:
+            missing.setdefault(normalized, []).append(i)
+        else:
+            per_text[i] = windows
+
+    if missing:
+        unique = list(missing)
+        if chunked:
+            encoded = tokenizer(unique, truncation=True, max_length=max_length, stride=stride,
+                                return_overflowing_tokens=True, return_attention_mask=False)
+            owners = encoded["overflow_to_sample_mapping"]
+        else:
+            encoded = tokenizer(unique, truncation=True, max_length=max_length, return_attention_mask=False)
+            owners = range(len(unique))
+        grouped = [[] for _ in unique]
+        for owner, ids in zip(owners, encoded["input_ids"]):
+            grouped[owner].append(np.asarray(ids, dtype=np.int32))
+        for normalized, windows in zip(unique, grouped):
+            windows = tuple(windows)
+            cache.put((settings, normalized), windows)
+            for i in missing[normalized]:
+                per_text[i] = windows
+
+    features, owners = [], []
+    for i, windows in enumerate(per_text):
+        features.extend(windows)
+        owners.extend([i] * len(windows))
+    return features, owners
+
+
+def _bucket(length, buckets):
+    for bound in buckets:
+        if length <= bound:
+            return bound
+    return length
+
+
+# Functie: Verdeelt vensters in batches: gesorteerd op lengte, hoogstens batch_size per batch en nooit over de grens
+# van een lengtebakje heen. Geeft per batch de indices van de vensters terug.
+def bucket_batches(lengths, batch_size, buckets=DEFAULT_BUCKETS):
+    order = sorted(range(len(lengths)), key=lengths.__getitem__)
+    batches = []
+    current, current_bucket = [], None
+    for index in order:
+        bucket = _bucket(lengths[index], buckets)
+        if current and (len(current) == batch_size or bucket != current_bucket):
+            batches.append(current)
+            current = []
+        current.append(index)
+        current_bucket = bucket
+    if current:
+        batches.append(current)
+    return batches
+
+
+# Functie: Maakt van een batch vensters de invoer voor het model, opgevuld tot het langste venster in de batch.
+def pad_batch(tokenizer, windows):
+    import torch
+
+    longest = max(len(ids) for ids in windows)
+    input_ids = np.full((len(windows), longest), tokenizer.pad_token_id, dtype=np.int64)
+    attention_mask = np.zeros((len(windows), longest), dtype=np.int64)
+    left = tokenizer.padding_side == "left"
+    for row, ids in enumerate(windows):
+        if left:
+            input_ids[row, longest - len(ids):] = ids
+            attention_mask[row, longest - len(ids):] = 1
+        else:
+            input_ids[row, :len(ids)] = ids
+            attention_mask[row, :len(ids)] = 1
+    batch = {"input_ids": torch.from_numpy(input_ids), "attention_mask": torch.from_numpy(attention_mask)}
+    if "token_type_ids" in tokenizer.model_input_names:
+        batch["token_type_ids"] = torch.zeros_like(batch["input_ids"])
+    return batch
+
+
+# Functie: Telt het aantal echte en opgevulde tokens van een reeks batches, en wat het opvullen zonder sortering (in
+# aanvoervolgorde) gekost zou hebben.
+def record_padding(lengths, batches, batch_size, cache=None):
+    cache = token_cache if cache is None else cache
+    real = sum(lengths)
+    padded = sum(len(batch) * max(lengths[i] for i in batch) for batch in batches)
+    unsorted = sum(len(lengths[i:i + batch_size]) * max(lengths[i:i + batch_size])
+                   for i in range(0, len(lengths), batch_size))
+    with cache._lock:
+        cache.batches += len(batches)
+        cache.real_tokens += real
+        cache.padded_tokens += padded
+        cache.unsorted_padded_tokens += unsorted
+    return real, padded
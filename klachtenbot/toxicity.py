@@ -0,0 +1,274 @@
+# Toxiciteitsscores op basis van het robBERT-model, voor losse klachten en voor grote aantallen tegelijk.
+import threading
+import time
+from itertools import islice
+
+import numpy as np
+
+from klachtenbot.backends import BACKENDS, resolve_backend, rss_bytes
+from klachtenbot.categorizer import resolve_categorizer
+from klachtenbot.metrics import SIZE_BUCKETS, metrics
+from klachtenbot.model import registry
+from klachtenbot.prefilter import AGREEMENT_THRESHOLD, DEFAULT_PREFILTER, load_prefilter
+from klachtenbot.tokens import bucket_batches, encode, pad_batch, record_padding
+
+DEFAULT_MAX_LENGTH = 512
+DEFAULT_BATCH_SIZE = 32
+# Aantal teksten dat tegelijk op lengte wordt gesorteerd. Begrenst het geheugen bij lange iterators.
+DEFAULT_SORT_WINDOW = 2048
+# Aantal overlappende tokens tussen opeenvolgende vensters bij het scoren van lange klachten
+DEFAULT_STRIDE = 128
+# Manieren om de scores van de vensters van één lange tekst samen te voegen
+AGGREGATES = ("max", "mean")
+
+
+# Functie: Korte omschrijving van de scoringsinstellingen, zodat scores met verschillende instellingen niet met elkaar
+# verward worden (bijvoorbeeld in de cache). De standaardinstellingen geven een lege string. Het categoriemodel hoort
+# erbij, omdat de semantische categorie samen met de score wordt bewaard; met een categoriemodel geldt het voorfilter
+# niet (zie analyze_toxicity_batch).
+def scoring_variant(max_length=DEFAULT_MAX_LENGTH, chunked=False, stride=DEFAULT_STRIDE, aggregate="max", backend=None,
+                    prefilter=None, prefilter_threshold=None, categorizer=None):
+    backend = resolve_backend(backend)
+    prefix = "" if backend == "torch" else f"{backend}:"
+    categorizer = resolve_categorizer(categorizer)
+    prefilter = _resolve_prefilter(prefilter) if categorizer is None else None
+    if categorizer is not None:
+        prefix += f"categorizer:{categorizer.fingerprint}:"
+    if prefilter is not None:
+        threshold = prefilter.clean_below if prefilter_threshold is None else prefilter_threshold
+        prefix += f"prefilter:{prefilter.name}:{threshold}:"
+    if chunked:
+        return f"{prefix}chunked:{max_length}:{stride}:{aggregate}"
+    return prefix if max_length == DEFAULT_MAX_LENGTH else f"{prefix}truncate:{max_length}"
+
+
+# Functie: Het voorfilter voor deze aanroep: een pad naar een getraind voorfilter, standaard KLACHTENBOT_PREFILTER.
+# Een lege string schakelt het voorfilter uit.
+def _resolve_prefilter(prefilter):
+    path = DEFAULT_PREFILTER if prefilter is None else prefilter
+    return load_prefilter(path) if path else None
+
+
+# Functie: Analyseren van toxiciteit op basis van robBERT-model. Geeft een probability score tussen 0 en 1.
+def analyze_toxicity(text, model_id=None, backend=None):
+    import torch
+    loaded = registry.get(model_id, backend)
+    with metrics.time("tokenize"):
+        windows, _ = encode(loaded.tokenizer, [text], DEFAULT_MAX_LENGTH, False, DEFAULT_STRIDE, loaded.model_id)
+        inputs = {k: v.to(loaded.device) for k, v in pad_batch(loaded.tokenizer, windows).items()}
+    with metrics.time("forward"), torch.no_grad():
+        outputs = loaded.model(**inputs)
+    with metrics.time("softmax"):
+        probabilities = torch.nn.functional.softmax(outputs.logits, dim=-1)
+        toxicity_score = probabilities[0][1].item()
+    metrics.event("toxicity", score=toxicity_score, model_id=loaded.model_id)
+    return toxicity_score
+
+
+def _windows(texts, size):
+    iterator = iter(texts)
+    while True:
+        window = list(islice(iterator, size))
+        if not window:
+            return
+        yield window
+
+
+# Functie: Eén forward pass over een micro-batch van reeds getokeniseerde vensters. Padding gebeurt alleen tot het
+# langste venster in deze batch. Met embed=True wordt ook de laatste verborgen toestand van de encoder opgevangen en
+# per venster over de echte tokens gemiddeld; dan komt (scores, embeddings) terug, met embeddings None als de backend
+# geen encoder heeft om op in te haken (onnx).
+def _score_encoded(loaded, windows, embed=False):
+    import torch
+    with metrics.time("pad"):
+        batch = {k: v.to(loaded.device) for k, v in pad_batch(loaded.tokenizer, windows).items()}
+    metrics.observe("batch_size", len(windows), SIZE_BUCKETS, source="model")
+    encoder = getattr(loaded.model, "base_model", None) if embed else None
+    captured = {}
+    if encoder is not None:
+        thread = threading.get_ident()
+
+        # Alleen de eigen aanroep opvangen; het model kan tegelijk in een andere thread draaien
+        def capture(module, args, output):
+            if threading.get_ident() == thread:
+                captured["hidden"] = output[0]
+
+        hook = encoder.register_forward_hook(capture)
+    try:
+        with metrics.time("forward"), torch.no_grad():
+            logits = loaded.model(**batch).logits
+    finally:
+        if encoder is not None:
+            hook.remove()
+    with metrics.time("softmax"):
+        scores = torch.nn.functional.softmax(logits, dim=-1)[:, 1].float().cpu().numpy()
+    if not embed:
+        return scores
+    hidden = captured.get("hidden")
+    if hidden is None:
+        return scores, None
+    with metrics.time("pool"):
+        mask = batch["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        embeddings = ((hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)).float().cpu().numpy()
+    return scores, embeddings
+
+
+def _aggregate(window_scores, owners, count, aggregate):
+    if aggregate not in AGGREGATES:
+        raise ValueError(f"Onbekende aggregatie {aggregate}; kies uit {', '.join(AGGREGATES)}.")
+    owners = np.asarray(owners)
+    if aggregate == "max":
+        scores = np.zeros(count, dtype=np.float32)
+        np.maximum.at(scores, owners, window_scores)
+        return scores
+    sums = np.bincount(owners, weights=window_scores, minlength=count)
+    return (sums / np.maximum(np.bincount(owners, minlength=count), 1)).astype(np.float32)
+
+
+def _mean_by_owner(embeddings, owners, count):
+    sums = np.zeros((count, embeddings.shape[1]), dtype=np.float32)
+    np.add.at(sums, owners, embeddings)
+    return sums / np.maximum(np.bincount(owners, minlength=count), 1)[:, None]
+
+
+# Functie: Haalt één venster teksten door het model: tokeniseren (met cache), indelen in lengtebakjes en per batch een
+# forward pass. Geeft de scores en (met embed=True) de embeddings per tokenvenster terug, met per venster de tekst.
+def _forward(loaded, window, batch_size, max_length, chunked, stride, embed=False):
+    with metrics.time("tokenize"):
+        features, owners = encode(loaded.tokenizer, window, max_length, chunked, stride, loaded.model_id)
+    lengths = [len(ids) for ids in features]
+    batches = bucket_batches(lengths, batch_size)
+    record_padding(lengths, batches, batch_size)
+
+    scores = np.empty(len(lengths), dtype=np.float32)
+    embeddings = None
+    for indices in batches:
+        if not embed:
+            scores[indices] = _score_encoded(loaded, [features[i] for i in indices])
+            continue
+        scores[indices], batch_embeddings = _score_encoded(loaded, [features[i] for i in indices], embed=True)
+        if batch_embeddings is None:
+            embed = False
+            continue
+        if embeddings is None:
+            embeddings = np.empty((len(lengths), batch_embeddings.shape[1]), dtype=np.float32)
+        embeddings[indices] = batch_embeddings
+    return scores, (embeddings if embed else None), owners
+
+
+# Functie: Scoort één venster teksten met het model. Met een categoriemodel wordt uit dezelfde forward pass ook de
+# semantische categorie van elke tekst bepaald (de embeddings van de vensters van een lange tekst worden gemiddeld).
+# Geeft de scores en per tekst de semantische categorie (of None) terug.
+def _score_window(loaded, window, batch_size, max_length, chunked, stride, aggregate, categorizer=None):
+    scores, embeddings, owners = _forward(loaded, window, batch_size, max_length, chunked, stride,
+                                          embed=categorizer is not None)
+    if chunked:
+        scores = _aggregate(scores, owners, len(window), aggregate)
+    labels = [None] * len(window)
+    if embeddings is not None:
+        with metrics.time("categorize"):
+            if chunked:
+                embeddings = _mean_by_owner(embeddings, np.asarray(owners), len(window))
+            labels = categorizer.assign(embeddings)
+    return scores, labels
+
+
+# Functie: Embeddings (gemiddelde laatste verborgen toestand) van teksten, bijvoorbeeld om centroids voor het
+# categoriemodel te berekenen. Teksten worden na max_length tokens afgekapt.
+def embed_texts(texts, batch_size=DEFAULT_BATCH_SIZE, max_length=DEFAULT_MAX_LENGTH, model_id=None, backend=None):
+    loaded = registry.get(model_id, backend)
+    parts = []
+    for window in _windows(texts, DEFAULT_SORT_WINDOW):
+        _, embeddings, _ = _forward(loaded, window, batch_size, max_length, False, DEFAULT_STRIDE, embed=True)
+        if embeddings is None:
+            raise ValueError(f"De backend {loaded.backend} levert geen embeddings; gebruik torch of torch-int8.")
+        parts.append(embeddings)
+    return np.concatenate(parts) if parts else np.empty((0, 0), dtype=np.float32)
+
+
+# Functie: Het categoriemodel (zie resolve_categorizer), alleen als het bij dit model hoort.
+def _categorizer_for(loaded, categorizer):
+    if categorizer is not None and categorizer.model_id and categorizer.model_id != loaded.model_id:
+        metrics.event("categorizer_skipped", categorizer=categorizer.name, model_id=loaded.model_id)
+        return None
+    return categorizer
+
+
+# Functie: Toxiciteitsscores voor een lijst of iterator van teksten. De token-id's komen uit de tokencache; de teksten
+# worden op tokenlengte gesorteerd en per lengtebakje in strak gepadde micro-batches door het model gehaald. Geeft een
+# NumPy-array terug in invoervolgorde.
+# Met chunked=True worden teksten langer dan max_length niet afgekapt maar in overlappende vensters gescoord; de
+# vensters van alle teksten delen dezelfde batches en worden per tekst samengevoegd met `aggregate` (max of mean).
+# Met backend kan een gekwantiseerd of ONNX-model gekozen worden (zie klachtenbot.backends). Met een voorfilter (zie
+# klachtenbot.prefilter) krijgen klachten die zeker schoon zijn de schatting van het voorfilter in plaats van een
+# modelscore. Met een categoriemodel (standaard KLACHTENBOT_CATEGORIZER) wordt van elke tekst ook de semantische
+# categorie bepaald (zie klachtenbot.categorizer); met with_categories=True komt die per tekst (of None) als tweede
+# waarde terug. Elke tekst heeft daarvoor een forward pass nodig, dus met een categoriemodel geldt het voorfilter niet.
+def analyze_toxicity_batch(texts, batch_size=DEFAULT_BATCH_SIZE, max_length=DEFAULT_MAX_LENGTH, model_id=None,
+                           sort_window=DEFAULT_SORT_WINDOW, chunked=False, stride=DEFAULT_STRIDE, aggregate="max",
+                           backend=None, prefilter=None, prefilter_threshold=None, categorizer=None,
+                           with_categories=False):
+    loaded = registry.get(model_id, backend)
+    categorizer = resolve_categorizer(categorizer)
+    prefilter = _resolve_prefilter(prefilter) if categorizer is None else None
+    categorizer = _categorizer_for(loaded, categorizer)
+    results, labels = [], []
+    for window in _windows(texts, max(sort_window, batch_size)):
+        if prefilter is None:
+            scores, window_labels = _score_window(loaded, window, batch_size, max_length, chunked, stride, aggregate,
+                                                  categorizer)
+            results.append(scores)
+            labels.extend(window_labels)
+            continue
+
+        # Alleen teksten waarover het voorfilter twijfelt (en een controlesteekproef) gaan door het model
+        with metrics.time("prefilter"):
+            scores, routed, audited = prefilter.route(window, prefilter_threshold)
+        selected = np.flatnonzero(routed)
+        if len(selected):
+            scores[selected], _ = _score_window(loaded, [window[i] for i in selected], batch_size, max_length,
+                                                chunked, stride, aggregate)
+        uncertain = int(np.sum(routed & ~audited))
+        prefilter.record(passed=len(window) - uncertain, routed=uncertain, audited=int(audited.sum()),
+                         agreed=int(np.sum(scores[audited] <= AGREEMENT_THRESHOLD)))
+        results.append(scores)
+        labels.extend([None] * len(window))
+
+    scores = np.concatenate(results) if results else np.empty(0, dtype=np.float32)
+    return (scores, labels) if with_categories else scores
+
+
+# Functie: Vergelijkt de backends op dezelfde teksten: laadtijd, extra geheugen (RSS), latentie per klacht en de
+# grootste afwijking ten opzichte van de fp32-scores. Een backend is bruikbaar als die afwijking binnen `tolerance`
+# blijft. Het fp32-model wordt altijd als eerste geladen als referentie. Voorfilter en categoriemodel staan uit, ook als
+# ze in de omgeving zijn ingesteld, zodat alleen de forward pass wordt vergeleken.
+def compare_backends(texts, backends=BACKENDS, model_id=None, batch_size=DEFAULT_BATCH_SIZE, tolerance=0.02, repeat=3):
+    texts = list(texts)
+    reference = None
+    report = []
+    for backend in ["torch"] + [b for b in backends if b != "torch"]:
+        rss_before = rss_bytes()
+        loaded = registry.warm_up(model_id, backend)
+        rss_after = rss_bytes()
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            scores = analyze_toxicity_batch(texts, batch_size=batch_size, model_id=model_id, backend=backend,
+                                            prefilter="", categorizer="")
+            timings.append(time.perf_counter() - start)
+        if reference is None:
+            reference = scores
+        best = min(timings)
+        max_diff = float(np.max(np.abs(scores - reference))) if len(texts) else 0.0
+        if backend in backends:
+            report.append({
+                "backend": backend,
+                "load_seconds": loaded.load_seconds,
+                "rss_mb": (rss_after - rss_before) / 2**20,
+                "ms_per_complaint": 1000 * best / max(len(texts), 1),
+                "complaints_per_second": len(texts) / best if best > 0 else 0.0,
+                "max_abs_diff": max_diff,
+                "within_tolerance": max_diff <= tolerance,
+            })
+    return report
@@ -0,0 +1,309 @@
+# Triagelogica van de Klachtenbot: categorieën, wijken, prioriteitsscore en de analyse van een klacht. Alle
+# parameters die in de app uit het zijpaneel komen worden hier expliciet doorgegeven, zodat dezelfde logica ook
+# zonder Streamlit (bijvoorbeeld vanuit de command line) gebruikt kan worden.
+import numpy as np
+import pandas as pd
+
+from klachtenbot.cache import cached_toxicity, cached_toxicity_batch
+from klachtenbot.keywords import get_matcher
+from klachtenbot.metrics import metrics
+from klachtenbot.toxicity import DEFAULT_BATCH_SIZE
+
+###############################################
+
+# Definieer categorieën en bijbehorende trefwoorden. Trefwoorden kunnen door gebruiker worden aangepast in het zijpaneel.
+categories = {
+    "Onbekend": [],
+    
+    "Infrastructuur": [
+        "wegen", "verkeer", "infrastructuur", "borden", "tunnel", "brug", "wegdek", "wegmarkering", 
+        "rotonde", "snelweg", "stoeprand", "verkeerslichten", "fietspad", "tegel", "putdeksel", "afsluiting", 
+        "fout wegdek", "slecht wegdek", "put", "stoep", "gaten in weg", "werkzaamheden", "wegenis", "wegomlegging", 
+        "verkeersregelaar", "belasting", "verkeershinder", "rijstrook", "oever", "bruggen", "kruispunt", 
+        "beton", "storing", "wegonderhoud", "wegconstructie", "rijbaan", "verkeersbord", "afslag", "politieblokkade", 
+        "borden", "drempel", "sloot", "wegversmalling", "wegbeveiliging", "achterstallig onderhoud", "slipgevaar", 
+        "fietsers", "auto", "afzetting", "straatmeubilair", "hoeken", "achteruitrijden", "snelheidsmeter", "geluidswal"
+    ],
+    
+    "Afvalbeheer": [
+        "afval", "vuilnis", "zwerfvuil", "container", "recycling", "scheiding", "plastic", "papier", "glas", 
+        "groenafval", "restafval", "tuinafval", "milieu", "ophaaldienst", "afvalzak", "afvalbak", "afvalbakken", 
+        "containerpark", "geur", "vuil", "verwerking", "afvalscheiding", "afvalophaal", "bak", "afvalcontainer", 
+        "hondenscheet", "zwerfvuilplaag", "struiken", "plastic zak", "luiers", "borden", "onvoldoende vuilnisbakken", 
+        "afvalindustrie", "restafval", "goederen", "grofvuil", "afvalinslag", "storten", "ongewenst vuil", "afvalverwerking", 
+        "plastic in zee", "afvalput", "geurhinder", "vuilniswagen", "kliko", "dierafval", "afvalmonsters", 
+        "afvaldistributie", "geurvervuiling", "hondenpoep", "afvalbeheer", "chemisch afval", "teveel afval", 
+        "verpakking", "afvalreductie", "gemeente vuil", "gesloten vuilnisbak", "groenafvalophaling", "niet gehaalde zakken"
+    ],
+
+    "Verlichting": [
+        "verlichting", "lampen", "straatverlichting", "verlichtingstekort", "lampen defect", "verlichtingspaal", 
+        "licht", "verlichtingsinstallatie", "lantaarnpaal", "verlichtingsproblemen", "lamp kapot", "flikkering", 
+        "onderhoud verlichting", "lampen branden niet", "energiebesparing verlichting", "lichtsterkte", "oplichtende paal", 
+        "verlichtingsoplossing", "kapotte straatlamp", "fout verlichting", "verkeerde verlichting", "verlichting vervangen", 
+        "verlichting uit", "lichteffecten", "brandende lamp", "lamp vervangen", "verlichtingstekort", "verlichte straat", 
+        "donkere straten", "overlast verlichting", "straatverlichting dimmen", "overlast van verlichting", 
+        "energiezuinige verlichting", "verlichtingsplan", "lichten", "straatlampen", "palen", "lampen schijnen", 
+        "lichtvervuiling", "lantaarns", "dimbaar", "lampen storen", "knipperende verlichting", "verlichtingsinfrastructuur", 
+        "led verlichting", "donkere zones", "nachtverlichting", "verlichting hangende kabels", "verlichting bij overgangen"
+    ],
+
+    "Overlast": [
+        "overlast", "lawaai", "hinder", "storing", "geluid", "overlastgevers", "buurtlawaai", "lawaai overlast", 
+        "storingen", "luidruchtig", "herrie", "geluidsoverlast", "overlast van verkeer", "geluidsoverlast woningen", 
+        "huisdieren", "gesprek", "drummen", "hoorn", "restaurantlawaai", "luide muziek", "scooters", "motorrijders", "vuurwerk", 
+        "geluidsbarrières", "overlast van apparaten", "verkeersgeluiden", "gedoe", "geluidshinder", "horecagelegenheden", 
+        "restauranthinder", "misbruik", "drukte", "onwenselijk gedrag", "groepjes", "stoornis", "woningen", 
+        "onrustige buurt", "buurtprobleem", "geluidsoverlast speeltuinen", "burenlawaai", "luidruchtige feestjes", 
+        "geen privacy", "lawaai van voertuigen", "overlast van bewoners", "lawaai tijdens nacht", "open ramen", 
+        "drukte op straat", "ergernis", "overtreding van stilte", "storing wifi", "smog", "overlast van roken", 
+        "lawaai van kinderen", "probleem met afval", "afvaloverlast", "jongerenlawaai", "weergalmende geluiden",
+        "hangjongeren", "hangjeugd"
+    ],
+
+    "Groenbeheer": [
+        "groen", "tuinen", "plantsoen", "bomen", "gras", "groenvoorziening", "groenonderhoud", "tuinbeheer", 
+        "planten", "bloemen", "tuin", "wilde planten", "planten in de openbare ruimte", "snoeien", "struiken", "takken", 
+        "schoonmaken", "groene plekken", "plantsoenonderhoud", "groene energie", "bomenkap", "dode bomen", "bloemplantsoen", 
+        "bladeren", "verwaarlozing", "onvoldoende groen", "tuinieren", "hagen", "waterbeheer", "wateroverlast", "bloei", 
+        "bomen planten", "tuinservice", "plantgoed", "boomverzorging", "groencompensatie", "zaaien", "gronddoelen", 
+        "ecologisch beheer", "buitenruimte", "bloemenperk", "moestuin", "wildgroei", "plantenverzorging", "kappen", 
+        "bloemenperken", "terrasbeplanting", "tuinonderhoud", "groenvoorzieningen", "onderhoud bomen", "aarden", 
+        "groenisolatie", "wilde bloemen", "afgevallen bladeren", "plantsoendiensten", "groenvoorzieningbeheer", "groenplan", 
+        "natuurbehoud", "natuurbescherming", "groenbeheer", "milieuplan", "rondstruinen", "groenplan"
+    ],
+
+    "Waterbeheer": [
+        "overstroming", "wateroverlast", "waterschade", "riolering", "watervoorziening", "afvoer", "dijk", "vloed", 
+        "stormwater", "waterput", "waterkwaliteit", "afwateren", "kanaal", "rivier", "waterbeheer", "pompstation", 
+        "waterpompen", "overbelaste riolering", "watervloed", "drainage", "regenwater", "waterkracht", "irrigatie", 
+        "sloot", "onderwaterdorp", "droogte", "waterproblematiek", "waterafvoer", "watermolen", "waterafvoersysteem", 
+        "dijkverhoging", "regensensor", "moeras", "polder", "waterberging", "vijver", "regenwatertank", "waterprijs", 
+        "waterinfrastructuur", "binnendijk", "beek", "waterzuivering", "afvoerleidingen", "vloedwal", "wateropvang", 
+        "ondergrondse waterpomp", "dijken", "waterproblemen", "grondwater", "schade door water", "boezem", "regenpijp", 
+        "waterputting", "waterpeil", "vijverbeheer", "overstromingsgebieden", "waterpompstations", "waterschapslasten"
+    ],
+
+    "Verkeer en Mobiliteit": [
+        "verkeer", "files", "verkeersdrukte", "verkeershinder", "stoplichten", "verkeersongeluk", "toegangspaden", 
+        "verkeerscirculatie", "parkeren", "parkeerproblemen", "verkeersregelaar", "omleiding", "auto's", "verkeersbord", 
+        "fietsers", "scooters", "motoren", "taxi's", "ov$", "trein", "bussen", "verkeersignalen", "verkeersintensiteit", 
+        "snelheidsmetingen", "auto parkeren", "blokken", "snelheid", "rijstroken", "stadsverkeer", "verkeersafsluitingen", 
+        "politiecontrole", "parkeerbelasting", "verkeersrondjes", "verkeersomleiding", "rijbanen", "rondrijden", "filedruk", 
+        "achterstallig onderhoud", "mobility as a service", "overvolle bussen", "overtredingen", "stadsvervoer"
+    ],
+
+    "Belastingen en geldzaken": [
+        "belasting", "aangifte", "inkomstenbelasting", "btw", "ozb", "gemeentebelasting", "heffing", "toeslag", "subsidie", "boete",
+        "betalingsregeling", "schuld", "kwijtschelding", "bezwaar", "belastingaanslag", "belastingdienst", "toeslagen", "hypotheek",
+        "lening", "sparen", "begroting", "inkomen", "uitgaven", "financiën", "rekening", "bankzaken", "verzekering", "pensioen",
+        "uitkering", "bijstand", "ww", "aow", "kinderbijslag", "studiefinanciering", "zorgtoeslag", "huurtoeslag", "kinderopvangtoeslag",
+        "belastingteruggave", "belastingaftrek", "vermogensbelasting", "erfbelasting", "schenkbelasting", "autobelasting", "wegenbelasting",
+        "afvalstoffenheffing", "rioolheffing", "waterschapsbelasting", "precariobelasting", "toeristenbelasting", "hondenbelasting",
+        "parkeergeld", "leges", "naheffing", "betalingsachterstand", "incasso", "deurwaarder", "bewindvoering", "budgetbeheer",
+        "schuldhulpverlening", "faillissement", "wsnp", "belastingvrije voet", "box 3", "voorlopige aanslag", "definitieve aanslag"
+]
+}
+
+###############################################
+
+# Lijst van Utrechtse wijken met prioriteitsscores tussen -2 en +2. Deze kunnen worden aangepast door de gebruiker in het zijpaneel.
+default_neighborhoods = {
+    "Binnenstad": 0,
+    "Lombok": 1,
+    "Wittevrouwen": -1,
+    "Oog in Al": -2,
+    "Leidsche Rijn": -1,
+    "Overvecht": 2,
+    "Kanaleneiland": 2,
+    "Zuilen": 1,
+    "Tuindorp": -2,
+    "Hoograven": 1,
+    "Tolsteeg": -1,
+    "Vleuten-De Meern": -1,
+    "Voordorp": -2,
+    "De Uithof (Utrecht Science Park)": 0,
+    "Nieuw Engeland": 1,
+    "Dichterswijk": 0,
+    "Rivierenwijk": 1,
+    "Hoge Weide": -1,
+    "Parkwijk": 0,
+    "Terwijde": -1,
+    "Papendorp": 2,
+    "Elinkwijk": 2,
+}
+
+###############################################
+
+# Trefwoorden die op urgentie wijzen en de prioriteitsscore verhogen
+urgent_keywords = ["gevaarlijk", "onveilig", "spoed", "levensgevaar", "gewond", "overstroming", "brand", 
+                   "explosie", "instorting", "giftig", "gaslek", "stroomuitval", "ongeluk", "aanrijding", 
+                   "verwonding", "verstikking", "verdrinking", "bedreiging", "inbraak", "overval", "vandalisme", 
+                   "agressie", "geweld", "paniek", "evacuatie", "noodsituatie", "ramp", "crisis", "epidemie", 
+                   "besmetting", "vergiftiging", "ontploffing", "verzakking", "botsing", "calamiteit"]
+
+# Categorieën die standaard met hoge prioriteit worden behandeld
+DEFAULT_HIGH_PRIORITY_CATEGORIES = ["Infrastructuur", "Verkeer en Mobiliteit", "Waterbeheer"]
+
+# Functie: Berekenen van de prioriteitsscore op basis van toxicity score, categorie, keywords en wijkscore. Deze score wordt afgerond tussen 1 en 10.
+# Of de tekst urgentietrefwoorden bevat kan via `urgent` worden doorgegeven als die al bekend is.
+def calculate_priority_score(toxicity_score, category, found_keywords, text, neighborhood_score, tox_threshold=0.5,
+                             high_priority_categories=DEFAULT_HIGH_PRIORITY_CATEGORIES, urgent=None):
+    base_score = 2
+
+    # Adjust score based on toxicity
+    if toxicity_score > tox_threshold:
+        toxicity_factor = toxicity_score * 3  # Scale toxicity appropriately
+        base_score += toxicity_factor
+
+    # Adjust score based on category
+    if category in high_priority_categories:
+        base_score += 3
+    if category in categories and not "Onbekend":
+        base_score += 1
+        
+    # Adjust score based on urgent keywords
+    if urgent is None:
+        urgent = bool(get_matcher({}, urgent_keywords).find(text))
+    if urgent:
+        base_score += 2
+
+    # Add neighborhood score
+    base_score += neighborhood_score
+
+    # Ensure the final score is between 1 and 10
+    final_score = max(1, min(round(base_score), 10))
+    return final_score
+
+# Functie: Zoekt voor een kolom met labels (wijk, categorie) per rij een waarde op. Elk uniek label wordt maar één
+# keer opgezocht; bij pandas-categoricals gaat dit direct via de codes.
+def _lookup(labels, mapping, default=0.0):
+    if not hasattr(labels, "dtype"):
+        labels = np.asarray(labels, dtype=object)
+    codes, uniques = pd.factorize(labels)
+    table = np.array([mapping.get(label, default) for label in uniques] + [default], dtype=np.float64)
+    return table[codes]  # code -1 (ontbrekende waarde) valt op de laatste plek: de default
+
+# Functie: Zet een kolom met wijknamen (of al berekende wijkscores) om naar een array met wijkscores.
+def _neighborhood_values(neighborhoods, neighborhood_scores):
+    if hasattr(neighborhoods, "dtype") and pd.api.types.is_numeric_dtype(neighborhoods.dtype):
+        return np.asarray(neighborhoods, dtype=np.float64)
+    return _lookup(neighborhoods, neighborhood_scores)
+
+# Functie: Gevectoriseerde variant van calculate_priority_score voor een hele reeks klachten tegelijk. Neemt arrays of
+# pandas-kolommen met toxiciteit, categorie, urgentie (bool) en wijk (naam of wijkscore) en geeft een NumPy-array met
+# prioriteitsscores terug, gelijk aan het resultaat van calculate_priority_score per rij.
+def score_priorities(toxicity, category, urgent, neighborhood, tox_threshold=0.5,
+                     high_priority_categories=DEFAULT_HIGH_PRIORITY_CATEGORIES, neighborhood_scores=None):
+    neighborhood_scores = default_neighborhoods if neighborhood_scores is None else neighborhood_scores
+    toxicity = np.asarray(toxicity, dtype=np.float64)
+
+    base_score = np.full(toxicity.shape, 2.0)
+    base_score += np.where(toxicity > tox_threshold, toxicity * 3, 0.0)
+    base_score += _lookup(category, dict.fromkeys(high_priority_categories, 3.0))
+    base_score += np.where(np.asarray(urgent, dtype=bool), 2.0, 0.0)
+    base_score += _neighborhood_values(neighborhood, neighborhood_scores)
+
+    # np.rint rondt, net als round(), af naar het dichtstbijzijnde even getal bij .5
+    return np.clip(np.rint(base_score), 1, 10).astype(np.int8)
+
+# Functie: Kiest de categorie met de meeste herkende trefwoorden. Bij gelijke aantallen wint de eerste categorie.
+def select_category(category_matches):
+    if len(category_matches) == 0:
+        return "Onbekend"
+    return max(category_matches, key=lambda category: len(category_matches[category]))
+
+# Functie: Kiest de categorie van een klacht: die met de meeste herkende trefwoorden of, als er geen enkel trefwoord is
+# herkend, de semantische categorie uit de forward pass van het toxiciteitsmodel (zie klachtenbot.categorizer), die
+# samen met de toxiciteitsscore is teruggegeven.
+def categorize(category_matches, semantic=None):
+    if not any(category_matches.values()) and semantic in category_matches:
+        return semantic
+    return select_category(category_matches)
+
+# Functie: Analyseer klacht. Identificeert de categorie, herkende trefwoorden, dreiging en prioriteitsscore. Een vooraf
+# berekende toxicity_score (bijvoorbeeld uit analyze_toxicity_batch) slaat de modelaanroep over, met semantic_category
+# de semantische categorie die daarbij is bepaald; anders wordt de score (met de categorie) uit de toxiciteitscache
+# gehaald als deze tekst al eerder is gescoord.
+# Met toxicity_options (bijvoorbeeld {"chunked": True}) wordt bepaald hoe het model lange teksten scoort; met service
+# wordt de score via een gedeelde scoringsservice berekend. Met matches en category (trefwoordtreffers, urgentie en
+# categorie van een bijna-dubbele klacht, zie duplicates) wordt de trefwoordherkenning overgeslagen.
+def analyze_complaint(text, updated_categories, neighborhood_score, tox_threshold=0.5,
+                      high_priority_categories=DEFAULT_HIGH_PRIORITY_CATEGORIES, toxicity_score=None,
+                      toxicity_options=None, service=None, matches=None, category=None, semantic_category=None):
+    if toxicity_score is None and service is not None:
+        toxicity_score, semantic_category = service.score(text, with_category=True, **(toxicity_options or {}))
+    elif toxicity_score is None:
+        toxicity_score, semantic_category = cached_toxicity(text, with_category=True, **(toxicity_options or {}))
+    
+    # Match keywords using the updated categories, in a single pass together with the urgent keywords
+    with metrics.time("keywords"):
+        if matches is None:
+            matches = get_matcher(updated_categories, urgent_keywords).match(text)
+        category_matches, urgent_hits = matches
+
+        # Find the category with the most matches (or the semantic category if nothing matches)
+        matched_category = category or categorize(category_matches, semantic_category)
+
+    # Collect relevant keywords
+    relevant_keywords = category_matches.get(matched_category, [])
+    metrics.event("category", category=matched_category, keywords=relevant_keywords)
+
+    # Calculate priority score
+    with metrics.time("priority"):
+        priority_score = calculate_priority_score(toxicity_score, matched_category, relevant_keywords, text,
+                                                  neighborhood_score, tox_threshold, high_priority_categories,
+                                                  bool(urgent_hits))
+
+    threat = toxicity_score > tox_threshold
+    return (
+        f"Klacht over {matched_category}: {', '.join(relevant_keywords)}",
+        matched_category,
+        threat,
+        relevant_keywords,
+        toxicity_score,
+        priority_score
+    )
+
+# Functie: Zet de uitkomst van één analyse om in een resultaatrij met dezelfde kolomnamen als het overzicht in de app.
+def make_result(text, neighborhood, category, priority_score, threat, found_keywords, toxicity_score):
+    return {
+        "klacht": text,
+        "wijk": neighborhood,
+        "categorie": category,
+        "prioriteitsscore": priority_score,
+        "dreigend": bool(threat),
+        "toxiciteit": float(toxicity_score),
+        "trefwoorden": ", ".join(found_keywords),
+    }
+
+# Functie: Analyseer een reeks klachten in één keer. De toxiciteit wordt gebatcht berekend (met de cache); de
+# categorie-, trefwoord-, urgentie- en wijklogica is gelijk aan die van analyze_complaint. Onbekende wijken krijgen
+# wijkscore 0. Met `service` (een ScoringService of HttpScoringClient) wordt de toxiciteit door een gedeelde
+# scoringsservice berekend; met toxicity_scores zijn de scores al berekend (bijvoorbeeld door een ScoringPool), met
+# semantic_categories de semantische categorieën die daarbij zijn bepaald.
+def triage_batch(texts, neighborhoods_per_text, updated_categories=None, neighborhood_scores=None, tox_threshold=0.5,
+                 high_priority_categories=DEFAULT_HIGH_PRIORITY_CATEGORIES, batch_size=DEFAULT_BATCH_SIZE,
+                 model_id=None, toxicity_options=None, service=None, toxicity_scores=None, semantic_categories=None):
+    updated_categories = categories if updated_categories is None else updated_categories
+    neighborhood_scores = default_neighborhoods if neighborhood_scores is None else neighborhood_scores
+
+    if toxicity_scores is not None:
+        pass
+    elif service is not None:
+        toxicity_scores, semantic_categories = service.score_many(texts, with_categories=True,
+                                                                  **(toxicity_options or {}))
+    else:
+        toxicity_scores, semantic_categories = cached_toxicity_batch(texts, batch_size=batch_size, model_id=model_id,
+                                                                     with_categories=True, **(toxicity_options or {}))
+    if semantic_categories is None:
+        semantic_categories = [None] * len(toxicity_scores)
+    results = []
+    for text, neighborhood, toxicity_score, semantic in zip(texts, neighborhoods_per_text, toxicity_scores,
+                                                             semantic_categories):
+        _, category, threat, found_keywords, toxicity_score, priority_score = analyze_complaint(
+            text, updated_categories, neighborhood_scores.get(neighborhood, 0), tox_threshold,
+            high_priority_categories, toxicity_score=float(toxicity_score), semantic_category=semantic)
+        results.append(make_result(text, neighborhood, category, priority_score, threat, found_keywords,
+                                   toxicity_score))
+    return results
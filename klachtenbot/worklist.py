@@ -0,0 +1,251 @@
+# Werklijst voor medewerkers: een prioriteitswachtrij (heap) op prioriteitsscore en daarna leeftijd, die bijgehouden
+# wordt terwijl klachten binnenkomen. Ophalen van de volgende klacht, oppakken, afronden en teruggeven kosten
+# O(log n); verwijderde of gewijzigde items worden lui uit de heap opgeruimd. Met een klachtenopslag worden oppakken,
+# afronden en teruggeven daarin vastgelegd (zie claim_next), zodat werklijsten in verschillende processen dezelfde
+# status zien.
+import heapq
+import itertools
+import threading
+import time
+
+PENDING = "open"
+CLAIMED = "opgepakt"
+COMPLETED = "afgerond"
+
+
+class WorkItem:
+    __slots__ = ("item_id", "priority", "age", "payload", "operator", "claimed_at", "removed")
+
+    def __init__(self, item_id, priority, age, payload):
+        self.item_id = item_id
+        self.priority = priority
+        self.age = age
+        self.payload = payload
+        self.operator = None
+        self.claimed_at = None
+        self.removed = False
+
+    # Hoogste prioriteit eerst, bij gelijke prioriteit de oudste klacht eerst
+    def __lt__(self, other):
+        return (-self.priority, self.age) < (-other.priority, other.age)
+
+    def as_dict(self):
+        return {"id": self.item_id, "prioriteitsscore": self.priority, **(self.payload or {})}
+
+
+class WorkList:
+    def __init__(self):
+        self._heap = []
+        self._pending = {}
+        self._claimed = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        # Hoogste id uit de opslag en laatste statusregel die al in de werklijst zijn verwerkt (zie sync_worklist)
+        self.synced_id = 0
+        self.status_rowid = 0
+        # Wordt True zodra de werklijst een eerste keer uit de opslag is opgebouwd
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._pending)
+
+    # Functie: Voegt een klacht toe of past de prioriteit van een openstaande klacht aan. `age` bepaalt de volgorde
+    # bij gelijke prioriteit (lager = ouder); standaard de volgorde van toevoegen.
+    def push(self, item_id, priority, age=None, payload=None):
+        with self._lock:
+            self._push(item_id, priority, age, payload)
+
+    def _push(self, item_id, priority, age=None, payload=None):
+        old = self._pending.pop(item_id, None)
+        if old is not None:
+            old.removed = True
+            age = old.age if age is None else age
+            payload = old.payload if payload is None else payload
+        if item_id in self._claimed:
+            return
+        item = WorkItem(item_id, priority, next(self._counter) if age is None else age, payload)
+        self._pending[item_id] = item
+        heapq.heappush(self._heap, item)
+        # Verwijderde items blijven tot ze bovenaan komen in de heap staan; ruim op als ze de overhand krijgen
+        if len(self._heap) > 2 * len(self._pending) + 64:
+            self._heap = [item for item in self._heap if not item.removed]
+            heapq.heapify(self._heap)
+
+    # Functie: Bouwt de werklijst in één keer op uit (id, prioriteit, leeftijd, payload)-tuples; O(n) via heapify.
+    def extend(self, items):
+        with self._lock:
+            for item_id, priority, age, payload in items:
+                old = self._pending.pop(item_id, None)
+                if old is not None:
+                    old.removed = True
+                item = WorkItem(item_id, priority, next(self._counter) if age is None else age, payload)
+                self._pending[item_id] = item
+                self._heap.append(item)
+            heapq.heapify(self._heap)
+
+    def _pop(self):
+        while self._heap:
+            item = heapq.heappop(self._heap)
+            if not item.removed:
+                return item
+        return None
+
+    # Functie: De volgende n klachten zonder ze op te pakken.
+    def peek(self, n=10):
+        with self._lock:
+            items = []
+            while len(items) < n:
+                item = self._pop()
+                if item is None:
+                    break
+                items.append(item)
+            for item in items:
+                heapq.heappush(self._heap, item)
+            return [item.as_dict() for item in items]
+
+    # Functie: Pakt de n klachten met de hoogste prioriteit op voor een medewerker. Ze verdwijnen uit de open lijst.
+    def claim(self, n=1, operator=None):
+        with self._lock:
+            claimed = []
+            while len(claimed) < n:
+                item = self._pop()
+                if item is None:
+                    break
+                del self._pending[item.item_id]
+                item.operator = operator
+                item.claimed_at = time.time()
+                self._claimed[item.item_id] = item
+                claimed.append(item.as_dict())
+            return claimed
+
+    # Functie: Rondt een opgepakte (of nog openstaande) klacht af.
+    def complete(self, item_id):
+        with self._lock:
+            item = self._claimed.pop(item_id, None) or self._pending.pop(item_id, None)
+            if item is None:
+                return False
+            item.removed = True
+            return True
+
+    # Functie: Wijst een klacht toe aan een medewerker, bijvoorbeeld omdat hij in een ander proces is opgepakt. Een
+    # openstaande klacht verdwijnt uit de open lijst.
+    def assign(self, item_id, operator):
+        with self._lock:
+            item = self._claimed.get(item_id)
+            if item is None:
+                item = self._pending.pop(item_id, None)
+                if item is None:
+                    return False
+                item.removed = True
+                item.claimed_at = time.time()
+                self._claimed[item_id] = item
+            item.operator = operator
+            return True
+
+    # Functie: Zet een opgepakte klacht terug in de open lijst, met de oorspronkelijke prioriteit en leeftijd.
+    def release(self, item_id):
+        with self._lock:
+            item = self._claimed.pop(item_id, None)
+            if item is None:
+                return False
+            self._push(item.item_id, item.priority, item.age, item.payload)
+            return True
+
+    def claimed_by(self, operator):
+        with self._lock:
+            return [item.as_dict() for item in self._claimed.values() if item.operator == operator]
+
+    def status(self, item_id):
+        with self._lock:
+            if item_id in self._pending:
+                return PENDING
+            if item_id in self._claimed:
+                return CLAIMED
+            return None
+
+    def stats(self):
+        with self._lock:
+            return {"open": len(self._pending), "opgepakt": len(self._claimed), "heap": len(self._heap)}
+
+
+# Functie: Bouwt een werklijst op uit de klachtenopslag. Afgeronde en bij binnenkomst als dreigend aangemerkte klachten
+# worden overgeslagen; de leeftijd is het id (volgorde van binnenkomst). Met background keert de functie direct terug
+# en wordt de werklijst in een achtergrondthread opgebouwd; `loaded` geeft aan wanneer dat klaar is.
+def worklist_from_store(store, background=False):
+    worklist = WorkList()
+    if background:
+        threading.Thread(target=sync_worklist, args=(worklist, store), name="werklijst", daemon=True).start()
+    else:
+        sync_worklist(worklist, store)
+    return worklist
+
+
+# Functie: Neemt de klachten en statuswijzigingen op die sinds de vorige aanroep aan de opslag zijn toegevoegd,
+# bijvoorbeeld door de app of door een ingest-worker in een ander proces. Met wait=False keert de functie direct terug
+# als er al een synchronisatie bezig is (bijvoorbeeld het opbouwen op de achtergrond). Geeft het aantal nieuwe rijen
+# terug.
+def sync_worklist(worklist, store, wait=True):
+    if not worklist._sync_lock.acquire(blocking=wait):
+        return 0
+    try:
+        # Eerst de statusregels: elke regel hoort bij een klacht die daarna ook bij de nieuwe rijen zit
+        changes = store.status_changes(worklist.status_rowid)
+        rows = list(store.iter_rows(after_id=worklist.synced_id))
+        items = [(row["id"], row["prioriteitsscore"], row["id"],
+                  {"tijdstip": row["tijdstip"], "klacht": row["klacht"], "wijk": row["wijk"],
+                   "categorie": row["categorie"]})
+                 for row in rows if not row["dreigend"]]
+        if worklist.synced_id == 0:
+            worklist.extend(items)
+        else:
+            for item in items:
+                worklist.push(*item)
+        if rows:
+            worklist.synced_id = rows[-1]["id"]
+        for _, complaint_id, status, operator in changes:
+            if status == COMPLETED:
+                worklist.complete(complaint_id)
+            elif status == CLAIMED:
+                worklist.assign(complaint_id, operator)
+            elif status == PENDING:
+                worklist.release(complaint_id)
+        if changes:
+            worklist.status_rowid = changes[-1][0]
+        worklist.loaded = True
+        return len(rows)
+    finally:
+        worklist._sync_lock.release()
+
+
+# Functie: Pakt de n klachten met de hoogste prioriteit op en legt dat in de opslag vast. Is een klacht intussen in
+# een ander proces opgepakt of afgerond, dan wordt de werklijst bijgewerkt en de volgende klacht geprobeerd.
+def claim_next(worklist, store, operator, n=1):
+    claimed = []
+    while len(claimed) < n:
+        items = worklist.claim(1, operator)
+        if not items:
+            break
+        if store.record_status(items[0]["id"], CLAIMED, operator, expected=(PENDING,)):
+            claimed.append(items[0])
+        else:
+            sync_worklist(worklist, store)
+    return claimed
+
+
+# Functie: Rondt een klacht af in de werklijst en in de opslag.
+def complete_item(worklist, store, item_id, operator=None):
+    if not store.record_status(item_id, COMPLETED, operator, expected=(PENDING, CLAIMED)):
+        sync_worklist(worklist, store)
+        return False
+    worklist.complete(item_id)
+    return True
+
+
+# Functie: Zet een opgepakte klacht terug in de open lijst, in de werklijst en in de opslag.
+def release_item(worklist, store, item_id, operator=None):
+    if not store.record_status(item_id, PENDING, operator, expected=(CLAIMED,)):
+        sync_worklist(worklist, store)
+        return False
+    worklist.release(item_id)
+    return True
@@ -0,0 +1,10 @@
+# Gedeelde fixtures. Het kleine lokale testmodel (zie klachtenbot.testmodel) wordt één keer gebouwd, zodat tests met
+# het model zonder netwerktoegang draaien.
+import pytest
+
+from klachtenbot.testmodel import build_test_model
+
+
+@pytest.fixture(scope="session")
+def test_model():
+    return build_test_model()
@@ -0,0 +1,74 @@
+# De toxiciteitscache: LRU in het geheugen, hits en misses in het SQLite-bestand, een andere sleutel bij een ander
+# model of andere scoringsinstellingen, en alleen cache misses gaan door het model.
+import numpy as np
+import pytest
+
+import klachtenbot.cache
+from klachtenbot.cache import ToxicityCache, cache_key, cached_toxicity_batch
+from klachtenbot.toxicity import analyze_toxicity_batch, scoring_variant
+
+
+def test_lru_in_het_geheugen():
+    cache = ToxicityCache(maxsize=2)
+    cache.put_many([("Afval op straat", 0.1), ("Kapotte lantaarnpaal", 0.2)])
+    assert cache.get("Afval op straat") == pytest.approx(0.1)
+    cache.put("Losse stoeptegel", 0.3)
+    # De minst recent gebruikte tekst valt eruit
+    assert cache.get("Kapotte lantaarnpaal") is None
+    assert cache.get("Afval op straat") == pytest.approx(0.1)
+    assert cache.get("Losse stoeptegel") == pytest.approx(0.3)
+    assert cache.stats()["size"] == 2
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_sleutel():
+    # Witruimte en Unicode-normalisatie geven dezelfde sleutel; een ander model of andere instellingen niet
+    assert cache_key("  Afval\n op  straat ") == cache_key("Afval op straat")
+    assert cache_key("Café") == cache_key("Café")
+    assert cache_key("Afval", "model-a") != cache_key("Afval", "model-b")
+    assert cache_key("Afval") != cache_key("Afval", variant=scoring_variant(chunked=True, prefilter=""))
+    assert cache_key("Afval") != cache_key("afval")
+
+    cache = ToxicityCache()
+    cache.put("Afval", 0.4, "model-a")
+    assert cache.get("Afval", "model-a") == pytest.approx(0.4)
+    assert cache.get("Afval", "model-b") is None
+    assert cache.get("Afval", "model-a", variant="chunked:512:128:max") is None
+
+
+def test_sqlite_bestand(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ToxicityCache(maxsize=1, path=path)
+    cache.put_many([("Afval", 0.1), ("Herrie", 0.2)])
+    # Uit de LRU gevallen, maar nog in het bestand
+    assert cache.get("Afval") == pytest.approx(0.1)
+
+    reopened = ToxicityCache(path=path)
+    assert reopened.get("Herrie") == pytest.approx(0.2)
+    assert reopened.get("Herrie", "ander-model") is None
+    assert (reopened.hits, reopened.misses) == (1, 1)
+    reopened.clear()
+    assert ToxicityCache(path=path).get("Herrie") is None
+
+
+def test_alleen_misses_door_het_model(test_model, monkeypatch):
+    calls = []
+
+    def counting(texts, **kwargs):
+        calls.append(list(texts))
+        return analyze_toxicity_batch(texts, **kwargs)
+
+    monkeypatch.setattr(klachtenbot.cache, "analyze_toxicity_batch", counting)
+    options = {"model_id": test_model, "prefilter": "", "categorizer": ""}
+    cache = ToxicityCache()
+    texts = ["Afval naast de container", "Kapotte lantaarnpaal", "Afval  naast de container", "Herrie"]
+    scores = cached_toxicity_batch(texts, cache=cache, **options)
+    # Dubbele teksten in dezelfde batch gaan één keer door het model
+    assert calls == [["Afval naast de container", "Kapotte lantaarnpaal", "Herrie"]]
+    assert scores[0] == scores[2]
+    expected = analyze_toxicity_batch([texts[0], texts[1], texts[3]], **options)
+    np.testing.assert_allclose(scores[[0, 1, 3]], expected, atol=1e-6)
+
+    again = cached_toxicity_batch(texts + ["Losse stoeptegel"], cache=cache, **options)
+    assert calls[1:] == [["Losse stoeptegel"]]
+    np.testing.assert_array_equal(again[:4], scores)
@@ -0,0 +1,114 @@
+# De semantische categorie komt uit dezelfde forward pass als de toxiciteit en gaat samen met de score mee: uit de cache
+# (ook na het verwijderen uit de LRU en in een nieuw proces), via de scoringsservice en HTTP, en uit de werkprocessen
+# van een ScoringPool. Gebruikt het lokale testmodel; de categorieën zelf zeggen niets.
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+
+from klachtenbot.cache import ToxicityCache, cached_toxicity_batch
+from klachtenbot.categorizer import SemanticCategorizer
+from klachtenbot.pool import ScoringPool
+from klachtenbot.service import HttpScoringClient, ScoringService, serve
+from klachtenbot.toxicity import analyze_toxicity_batch, embed_texts, scoring_variant
+from klachtenbot.triage import analyze_complaint, categories
+
+TEXTS = ["De stoep ligt vol glas en niemand ruimt het op.", "Al dagen hangt er een vieze lucht bij het plein.",
+         "Waarom duurt het zo lang voordat iemand reageert?", "Het bankje in het park is kapot."]
+
+
+@pytest.fixture(scope="module")
+def categorizers(test_model, tmp_path_factory):
+    # Twee categoriemodellen op voorbeelden van twee categorieën; met min_similarity -1 krijgt elke tekst een categorie
+    directory = tmp_path_factory.mktemp("categorieen")
+    examples = [f"Klacht over {word}" for word in categories["Afvalbeheer"][:8] + categories["Groenbeheer"][:8]]
+    embeddings = embed_texts(examples, model_id=test_model)
+    labels = ["Afvalbeheer"] * 8 + ["Groenbeheer"] * 8
+    paths = []
+    for name, (first, second) in (("a.npz", ("Afvalbeheer", "Groenbeheer")), ("b.npz", ("Groenbeheer", "Afvalbeheer"))):
+        swapped = [first if label == "Afvalbeheer" else second for label in labels]
+        categorizer = SemanticCategorizer.from_embeddings(embeddings, swapped, min_similarity=-1.0)
+        paths.append(categorizer.save(str(directory / name)))
+    return paths
+
+
+def _direct(test_model, path, texts=TEXTS):
+    return analyze_toxicity_batch(texts, model_id=test_model, prefilter="", categorizer=path, with_categories=True)
+
+
+def test_categorie_komt_mee_met_de_score(test_model, categorizers):
+    scores, labels = _direct(test_model, categorizers[0])
+    assert all(label in ("Afvalbeheer", "Groenbeheer") for label in labels)
+    _, swapped = _direct(test_model, categorizers[1])
+    assert swapped == [{"Afvalbeheer": "Groenbeheer", "Groenbeheer": "Afvalbeheer"}[label] for label in labels]
+    # Zonder categoriemodel geen categorie
+    assert _direct(test_model, "")[1] == [None] * len(TEXTS)
+
+
+def test_categorie_uit_de_cache(test_model, categorizers, tmp_path):
+    path = str(tmp_path / "scores.db")
+    cache = ToxicityCache(maxsize=2, path=path)
+    options = {"model_id": test_model, "prefilter": "", "categorizer": categorizers[0]}
+    _, expected = _direct(test_model, categorizers[0])
+    _, labels = cached_toxicity_batch(TEXTS, cache=cache, with_categories=True, **options)
+    assert labels == expected
+    # Uit de LRU (maxsize 2) en uit het bestand, ook na opnieuw openen
+    _, labels = cached_toxicity_batch(TEXTS, cache=cache, with_categories=True, **options)
+    assert labels == expected and cache.hits == len(TEXTS)
+    reopened = ToxicityCache(path=path)
+    _, labels = cached_toxicity_batch(TEXTS, cache=reopened, with_categories=True, **options)
+    assert labels == expected and reopened.misses == 0
+    # Een ander categoriemodel hoort bij een andere sleutel
+    assert scoring_variant(prefilter="", categorizer=categorizers[0]) != scoring_variant(
+        prefilter="", categorizer=categorizers[1])
+    _, swapped = cached_toxicity_batch(TEXTS, cache=reopened, with_categories=True,
+                                       **{**options, "categorizer": categorizers[1]})
+    assert swapped == _direct(test_model, categorizers[1])[1]
+
+
+def test_zonder_trefwoorden_de_semantische_categorie(test_model, categorizers):
+    text = TEXTS[3]
+    _, (label,) = _direct(test_model, categorizers[0], [text])
+    options = {"model_id": test_model, "prefilter": "", "categorizer": categorizers[0]}
+    _, category, *_ = analyze_complaint(text, {"Onbekend": [], "Afvalbeheer": ["container"], "Groenbeheer": ["gras"]},
+                                        0, toxicity_options=options)
+    assert category == label
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_via_de_service_en_http(test_model, categorizers):
+    service = ScoringService(model_id=test_model, default_options={"prefilter": "", "categorizer": categorizers[0]})
+    scores, expected = _direct(test_model, categorizers[0])
+    assert service.score(TEXTS[0], with_category=True) == (pytest.approx(float(scores[0])), expected[0])
+    assert service.score_many(TEXTS, with_categories=True)[1] == expected
+
+    port = _free_port()
+    threading.Thread(target=lambda: asyncio.run(serve(service, port=port)), daemon=True).start()
+    client = HttpScoringClient(f"http://127.0.0.1:{port}")
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            client.stats()
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+    http_scores, labels = client.score_many(TEXTS, with_categories=True)
+    assert labels == expected
+    assert http_scores.tolist() == pytest.approx(scores.tolist())
+    service.stop()
+
+
+def test_uit_de_werkprocessen(test_model, categorizers):
+    _, expected = _direct(test_model, categorizers[0])
+    with ScoringPool(workers=2, model_id=test_model, batch_size=2) as pool:
+        _, labels = pool.score_many(TEXTS, with_categories=True, prefilter="", categorizer=categorizers[0])
+    assert labels == expected
@@ -0,0 +1,50 @@
+# Lege waarden in kolommen met een vaste breedte (bijvoorbeeld cluster voor een klacht die geen kopie is) blijven leeg
+# in rijen, pandas, Arrow en na samenvoegen, in plaats van 0 of False te worden.
+import numpy as np
+import pandas as pd
+import pytest
+
+from klachtenbot.columnar import MaskedColumn, ResultBatch, read_results, write_results
+
+ROWS = [
+    {"id": 1, "klacht": "Afval", "wijk": "Lombok", "toxiciteit": 0.25, "dreigend": False, "cluster": None},
+    {"id": 2, "klacht": "Afval!", "wijk": "Lombok", "toxiciteit": None, "dreigend": None, "cluster": 1},
+    {"id": 3, "klacht": None, "wijk": None, "toxiciteit": 0.5, "dreigend": True, "cluster": None},
+]
+COLUMNS = list(ROWS[0])
+
+
+def test_lege_waarden_in_rijen_en_pandas():
+    batch = ResultBatch.from_rows(ROWS, COLUMNS)
+    assert isinstance(batch.columns["id"], np.ndarray)
+    assert isinstance(batch.columns["cluster"], MaskedColumn)
+    assert [batch.row(i) for i in range(len(batch))] == ROWS
+    frame = batch.to_pandas()
+    assert str(frame["cluster"].dtype) == "Int64" and str(frame["dreigend"].dtype) == "boolean"
+    assert frame["cluster"].isna().tolist() == [True, False, True]
+    assert frame["toxiciteit"].isna().tolist() == [False, True, False]
+    assert frame["id"].dtype == np.int64
+
+
+def test_samenvoegen_met_en_zonder_lege_waarden():
+    full = ResultBatch.from_rows([{**row, "toxiciteit": 0.1, "dreigend": False, "cluster": 7} for row in ROWS],
+                                 COLUMNS)
+    assert isinstance(full.columns["cluster"], np.ndarray)
+    for batches in ([full, ResultBatch.from_rows(ROWS, COLUMNS)], [ResultBatch.from_rows(ROWS, COLUMNS), full]):
+        batch = ResultBatch.concat(batches)
+        expected = [row for part in batches for row in (part.row(i) for i in range(len(part)))]
+        assert [batch.row(i) for i in range(len(batch))] == expected
+        assert sum(row["cluster"] is None for row in expected) == 2
+
+
+def test_arrow_en_bestanden(tmp_path):
+    pytest.importorskip("pyarrow")
+    batch = ResultBatch.from_rows(ROWS, COLUMNS)
+    table = batch.to_arrow()
+    assert table.column("cluster").to_pylist() == [None, 1, None]
+    assert table.column("dreigend").to_pylist() == [False, None, True]
+    for name in ("uit.arrow", "uit.parquet"):
+        path = str(tmp_path / name)
+        write_results([ResultBatch.from_rows(ROWS[:1], COLUMNS), batch], path)
+        assert read_results(path).column("cluster").to_pylist() == [None, None, 1, None]
+    assert pd.isna(read_results(path).to_pandas()["cluster"][0])
@@ -0,0 +1,109 @@
+# Herkenning van bijna-dubbele klachten: kopieën met een kleine aanpassing vinden hun cluster, losse klachten niet, en
+# score_rows laat alleen nieuwe teksten door het (lokale test)model scoren.
+import time
+
+import pytest
+
+from klachtenbot.duplicates import NearDuplicateIndex, index_from_store, score_rows, sync_index
+from klachtenbot.results import snapshot_parameters
+from klachtenbot.store import ComplaintStore
+from klachtenbot.synthetic import ComplaintGenerator
+from klachtenbot.toxicity import analyze_toxicity_batch
+
+
+def _texts(n, seed):
+    return [text for text, _ in ComplaintGenerator(seed=seed, duplicate_rate=0).generate(n)]
+
+
+@pytest.fixture
+def toxicity(test_model):
+    calls = []
+
+    def score(texts):
+        calls.append(list(texts))
+        return analyze_toxicity_batch(texts, model_id=test_model, prefilter="", categorizer="", with_categories=True)
+
+    score.calls = calls
+    return score
+
+
+def test_kopie_vindt_cluster():
+    index = NearDuplicateIndex(threshold=0.7)
+    texts = _texts(50, seed=1)
+    for cluster_id, text in enumerate(texts, start=1):
+        index.add(cluster_id, index.signature(text), {"toxiciteit": 0.1})
+    copy = "Beste gemeente, " + texts[10] + " Namens de bewonerscommissie."
+    assert index.match(copy)[0] == 11
+    assert index.match(_texts(1, seed=99)[0]) is None
+    assert index.stats()["hits"] == 1
+    # Met een strengere drempel is de aangepaste kopie geen lid meer, een exacte kopie wel
+    strict = NearDuplicateIndex(threshold=0.99)
+    strict.add(1, strict.signature(texts[10]), {})
+    assert strict.match(copy) is None
+    assert strict.match(texts[10])[0] == 1
+    with pytest.raises(ValueError):
+        NearDuplicateIndex(num_perm=100, bands=32)
+
+
+def test_lru_begrenzing():
+    index = NearDuplicateIndex(maxsize=3)
+    texts = _texts(4, seed=2)
+    for cluster_id, text in enumerate(texts, start=1):
+        index.add(cluster_id, index.signature(text), {})
+    assert len(index) == 3 and 1 not in index
+    assert index.match(texts[0]) is None
+
+
+def test_score_rows_binnen_een_batch(toxicity):
+    index = NearDuplicateIndex()
+    texts = _texts(4, seed=3)
+    batch = [texts[0], texts[1], texts[0] + " PS: graag reactie.", texts[2], texts[1]]
+    rows = score_rows(batch, ["Lombok"] * len(batch), snapshot_parameters(), toxicity, index)
+    # Alleen de drie verschillende teksten gaan door het model
+    assert toxicity.calls == [[texts[0], texts[1], texts[2]]]
+    assert rows[2]["cluster_row"] == 0 and rows[4]["cluster_row"] == 1
+    assert rows[2]["toxiciteit"] == rows[0]["toxiciteit"] and rows[2]["categorie"] == rows[0]["categorie"]
+    assert all("cluster_row" not in rows[position] for position in (0, 1, 3))
+
+
+def test_score_rows_met_opgeslagen_clusters(tmp_path, toxicity):
+    store = ComplaintStore(str(tmp_path / "klachten.db"))
+    index = NearDuplicateIndex()
+    texts = _texts(6, seed=4)
+    first = score_rows(texts[:3], ["Zuilen"] * 3, snapshot_parameters(), toxicity, index)
+    index.add_rows(first, store.append(first))
+    assert len(index) == 3
+    second = score_rows([texts[1] + " Groet, een bewoner.", texts[3]], ["Overvecht"] * 2, snapshot_parameters(),
+                        toxicity, index)
+    assert toxicity.calls[-1] == [texts[3]]
+    stored = {row["klacht"]: row for row in store.iter_rows()}
+    assert second[0]["cluster"] == stored[texts[1]]["id"]
+    assert second[0]["toxiciteit"] == pytest.approx(stored[texts[1]]["toxiciteit"])
+    assert second[0]["wijk"] == "Overvecht"
+    index.add_rows(second, store.append(second))
+    assert len(index) == 4
+    # Zonder index (of met drempel 0) wordt alles gescoord
+    score_rows(texts[:2], ["Zuilen"] * 2, snapshot_parameters(), toxicity, NearDuplicateIndex(threshold=0))
+    assert toxicity.calls[-1] == texts[:2]
+    store.close()
+
+
+def test_synchroniseren_uit_de_opslag(tmp_path, toxicity):
+    store = ComplaintStore(str(tmp_path / "klachten.db"))
+    texts = _texts(20, seed=5)
+    rows = score_rows(texts, ["Lombok"] * len(texts), snapshot_parameters(), toxicity)
+    rows[5]["cluster_row"] = 0
+    store.append(rows)
+    index = index_from_store(store, background=True)
+    deadline = time.monotonic() + 10
+    while index.synced_id < store.version() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # Een kopie wordt geen eigen cluster
+    assert len(index) == 19 and 6 not in index
+    # Een synchronisatie die niet wacht, slaat over als er al een bezig is
+    with index._sync_lock:
+        assert sync_index(index, store, wait=False) == 0
+    more = score_rows(_texts(3, seed=6), ["Lombok"] * 3, snapshot_parameters(), toxicity)
+    store.append(more)
+    assert sync_index(index, store) == 3
+    store.close()
@@ -0,0 +1,122 @@
+# Foutafhandeling van de ingest-worker: ongeldige bestanden en tijdstippen gaan naar fouten/, bestanden die een gestopte
+# worker in bezig/ heeft achtergelaten worden opnieuw gelezen en er staan nooit meer dan max_in_flight klachten uit.
+# De toxiciteit wordt vervangen door nullen, zodat er geen model nodig is.
+import json
+import os
+import subprocess
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+from klachtenbot.ingest import (DONE_DIR, FAILED_DIR, PROCESSING_DIR, DirectorySource, IngestWorker, SocketSource,
+                                submit)
+from klachtenbot.store import ComplaintStore
+
+
+def _write(directory, name, records):
+    with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+        if name.endswith(".jsonl"):
+            f.writelines(json.dumps(record) + "\n" for record in records)
+        else:
+            f.write(records if isinstance(records, str) else json.dumps(records))
+
+
+def _worker(source, store):
+    worker = IngestWorker(source, store)
+    worker._toxicity = lambda texts: (np.zeros(len(texts), dtype=np.float32), [None] * len(texts))
+    return worker
+
+
+def _drain(worker, steps=20):
+    for _ in range(steps):
+        worker.step(timeout=0.01)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ComplaintStore(str(tmp_path / "klachten.db"))
+    yield store
+    store.close()
+
+
+def test_fouten_naar_fouten_map(tmp_path, store):
+    inbox = tmp_path / "inbox"
+    source = DirectorySource(str(inbox), poll_interval=0.001)
+    _write(inbox, "goed.json", [
+        {"klacht": "Afval naast de container", "wijk": "Lombok", "tijdstip": "2026-03-01T09:30"},
+        {"klacht": "Kapotte lantaarnpaal", "tijdstip": "2026-03-01T10:00:00+00:00"}])
+    _write(inbox, "tijdstip.jsonl", [{"klacht": "Losse stoeptegel"}, {"klacht": "Herrie", "tijdstip": "gisteren"}])
+    _write(inbox, "kapot.json", "{geen json")
+    _write(inbox, "geen-klacht.json", {"wijk": "Zuilen"})
+    _drain(_worker(source, store))
+
+    assert sorted(os.listdir(inbox / DONE_DIR)) == ["goed.json"]
+    assert sorted(os.listdir(inbox / FAILED_DIR)) == ["geen-klacht.json", "kapot.json", "tijdstip.jsonl"]
+    rows = {row["klacht"]: row["tijdstip"] for row in store.iter_rows()}
+    assert rows["Afval naast de container"] == "2026-03-01 09:30:00"
+    # Met tijdzone omgerekend naar lokale tijd, zonder tijdzone opgeslagen
+    assert len(rows["Kapotte lantaarnpaal"]) == 19
+    # De geldige klacht vóór de fout in hetzelfde bestand is al opgeslagen
+    assert "Losse stoeptegel" in rows and "Herrie" not in rows
+    source.close()
+
+
+def test_ongeldig_tijdstip_via_socket(tmp_path, store):
+    path = str(tmp_path / "ingest.sock")
+    source = SocketSource(path)
+    try:
+        worker = _worker(source, store)
+        responses = []
+        thread = threading.Thread(target=lambda: responses.extend(submit(path, [
+            {"klacht": "Afval", "ref": 1}, {"klacht": "Herrie", "tijdstip": 20260301, "ref": 2}])))
+        thread.start()
+        while thread.is_alive():
+            worker.step(timeout=0.01)
+        by_ref = {response["ref"]: response for response in responses}
+        assert "id" in by_ref[1]
+        assert "tijdstip" in by_ref[2]["error"]
+    finally:
+        source.close()
+
+
+def test_herstel_na_crash(tmp_path, store):
+    inbox = tmp_path / "inbox"
+    # Een bestand van een worker die niet meer draait, en een los bestand van een oudere versie
+    dead = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+    crashed = inbox / PROCESSING_DIR / dead.stdout.strip()
+    crashed.mkdir(parents=True)
+    _write(crashed, "half.jsonl", [{"klacht": "Afval"}, {"klacht": "Herrie"}])
+    _write(inbox / PROCESSING_DIR, "los.json", {"klacht": "Stoeptegel"})
+    # Een bestand van een worker die nog draait, blijft staan
+    running = inbox / PROCESSING_DIR / str(os.getppid())
+    running.mkdir()
+    _write(running, "bezig.json", {"klacht": "Lantaarnpaal"})
+
+    source = DirectorySource(str(inbox), poll_interval=0.001)
+    assert source.recovered == 2
+    assert not crashed.exists()
+    assert os.listdir(running) == ["bezig.json"]
+    _drain(_worker(source, store))
+    assert sorted(row["klacht"] for row in store.iter_rows()) == ["Afval", "Herrie", "Stoeptegel"]
+    assert sorted(os.listdir(inbox / DONE_DIR)) == ["half.jsonl", "los.json"]
+
+    # Bij stoppen gaan half gelezen bestanden terug naar de map
+    _write(inbox, "nieuw.jsonl", [{"klacht": f"Klacht {i}"} for i in range(5)])
+    assert len(source.take(2, timeout=1)) == 2
+    source.close()
+    assert "nieuw.jsonl" in os.listdir(inbox)
+    assert not (inbox / PROCESSING_DIR / str(os.getpid())).exists()
+
+
+def test_max_in_flight(tmp_path):
+    inbox = tmp_path / "inbox"
+    source = DirectorySource(str(inbox), poll_interval=0.001, max_in_flight=3)
+    _write(inbox, "veel.jsonl", [{"klacht": f"Klacht {i}"} for i in range(10)])
+    messages = source.take(10, timeout=0.05)
+    assert len(messages) == 3
+    assert source.take(10, timeout=0.02) == []
+    messages[0].done(1)
+    assert len(source.take(10, timeout=0.02)) == 1
+    source.close()
@@ -0,0 +1,43 @@
+# De trie-matcher moet hetzelfde opleveren als de oorspronkelijke controle `word in text.lower()` per trefwoord.
+import pytest
+
+from klachtenbot.keywords import KeywordMatcher
+from klachtenbot.synthetic import ComplaintGenerator
+from klachtenbot.triage import categories, urgent_keywords
+
+EXTRA_TEXTS = [
+    "",
+    "PUTDEKSEL los bij de Rotonde",
+    "Het putje in de stoeprand, de stoep en de put",
+    "Geen enkel trefwoord hier.",
+    "wegenwegdekwegen",
+]
+
+
+def _texts():
+    generator = ComplaintGenerator(seed=7, keyword_density=2.0, urgent_rate=0.5)
+    return [text for text, _ in generator.generate(1500)] + EXTRA_TEXTS
+
+
+def test_match_gelijk_aan_substring_controle():
+    matcher = KeywordMatcher(categories, urgent_keywords)
+    for text in _texts():
+        category_matches, urgent_hits = matcher.match(text)
+        lowered = text.lower()
+        assert category_matches == {category: [word for word in words if word in lowered]
+                                    for category, words in categories.items()}
+        assert urgent_hits == [word for word in urgent_keywords if word in lowered]
+
+
+def test_find_gelijk_aan_substring_controle():
+    vocabulary = {word for words in categories.values() for word in words} | set(urgent_keywords)
+    matcher = KeywordMatcher(categories, urgent_keywords)
+    for text in _texts():
+        assert matcher.find(text) == {word for word in vocabulary if word in text.lower()}
+
+
+def test_lege_trefwoorden_worden_geweigerd():
+    with pytest.raises(ValueError):
+        KeywordMatcher({"Afvalbeheer": ["afval", ""]})
+    with pytest.raises(ValueError):
+        KeywordMatcher({}, ["spoed", ""])
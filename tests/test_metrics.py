@@ -0,0 +1,23 @@
+# Meetwaarden van collectors met labels (bijvoorbeeld één reeks per geladen voorfilter) mogen elkaar niet overschrijven.
+from klachtenbot.metrics import Metrics
+
+
+def _collector():
+    return {"cache_size": 3,
+            ("prefilter_passed", (("prefilter", "a.npz"),)): 10,
+            ("prefilter_passed", (("prefilter", 'map\\"b".npz'),)): 20}
+
+
+def test_gelabelde_meetwaarden():
+    metrics = Metrics(enabled=True)
+    metrics.add_collector(_collector)
+    assert metrics.snapshot()["gauges"] == {
+        "cache_size": 3,
+        'prefilter_passed{prefilter="a.npz"}': 10,
+        'prefilter_passed{prefilter="map\\\\\\"b\\".npz"}': 20,
+    }
+    lines = metrics.prometheus_text().splitlines()
+    assert lines.count("# TYPE klachtenbot_prefilter_passed gauge") == 1
+    assert 'klachtenbot_prefilter_passed{prefilter="a.npz"} 10' in lines
+    assert 'klachtenbot_prefilter_passed{prefilter="map\\\\\\"b\\".npz"} 20' in lines
+    assert "klachtenbot_cache_size 3" in lines
@@ -0,0 +1,107 @@
+# De bijgehouden samenvattingen per wijk en categorie moeten gelijk zijn aan een pandas-groupby over alle klachten,
+# ook na nieuwe klachten en na het wisselen van parameters (afgeleide weergaven).
+import random
+import time
+
+import pandas as pd
+import pytest
+
+from klachtenbot.results import snapshot_parameters, score_row
+from klachtenbot.rollups import Rollups, rollups_from_store, sync_rollups
+from klachtenbot.store import ComplaintStore
+from klachtenbot.synthetic import ComplaintGenerator
+from klachtenbot.triage import categories, default_neighborhoods
+
+PARAMETER_SETS = [
+    snapshot_parameters(),
+    snapshot_parameters(0.3, ["Afvalbeheer", "Overlast"]),
+    snapshot_parameters(0.3, ["Afvalbeheer"], {**default_neighborhoods, "Lombok": 3, "Zuilen": -2}),
+    snapshot_parameters(0.8, [], {}),
+]
+
+
+def _rows(n, seed):
+    generator = ComplaintGenerator(seed=seed, urgent_rate=0.3)
+    rng = random.Random(seed)
+    return [score_row(text, neighborhood, rng.random() ** 2, snapshot_parameters())
+            for text, neighborhood in generator.generate(n)]
+
+
+def _groupby(store, parameters, group):
+    # Met andere trefwoordenlijsten worden alle trefwoorden van elke klacht opnieuw gezocht
+    rematch = parameters["categories"] != snapshot_parameters()["categories"]
+    frame = pd.DataFrame([score_row(row["klacht"], row["wijk"], row["toxiciteit"], parameters) if rematch else
+                          score_row(row["klacht"], row["wijk"], row["toxiciteit"], parameters,
+                                    (row["treffers"], row["urgent"]), row["categorie"])
+                          for row in store.iter_rows()])
+    return frame.groupby(group).agg(aantal=("prioriteitsscore", "size"),
+                                    gemiddelde_prioriteit=("prioriteitsscore", "mean"),
+                                    aandeel_dreigend=("dreigend", "mean"))
+
+
+def _check(rollups, store, parameters):
+    for group in ("wijk", "categorie"):
+        summary = rollups.summary(group, parameters).set_index(group).sort_index()
+        expected = _groupby(store, parameters, group).sort_index()
+        assert list(summary.index) == list(expected.index)
+        assert list(summary["aantal"]) == list(expected["aantal"])
+        assert summary["gemiddelde_prioriteit"].tolist() == pytest.approx(expected["gemiddelde_prioriteit"].tolist())
+        assert summary["aandeel_dreigend"].tolist() == pytest.approx(expected["aandeel_dreigend"].tolist())
+    totals = rollups.totals(parameters)
+    assert totals["aantal"] == sum(1 for _ in store.iter_rows())
+
+
+@pytest.mark.parametrize("max_views", [1, 8])
+def test_gelijk_aan_groupby(tmp_path, max_views):
+    store = ComplaintStore(str(tmp_path / "klachten.db"))
+    rows = _rows(900, seed=13)
+    store.append(rows[:300])
+    rollups = rollups_from_store(store, max_views=max_views)
+    for step, start in enumerate(range(300, len(rows), 200)):
+        for parameters in PARAMETER_SETS[step % 2:]:
+            _check(rollups, store, parameters)
+        store.append(rows[start:start + 200])
+        assert sync_rollups(rollups, store) == len(rows[start:start + 200])
+    for parameters in reversed(PARAMETER_SETS):
+        _check(rollups, store, parameters)
+    store.close()
+
+
+def test_opbouwen_op_de_achtergrond(tmp_path):
+    store = ComplaintStore(str(tmp_path / "klachten.db"))
+    store.append(_rows(300, seed=2))
+    rollups = rollups_from_store(store, background=True)
+    deadline = time.monotonic() + 10
+    while not rollups.loaded and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert rollups.loaded and len(rollups) == 300
+    # Een synchronisatie die niet wacht, slaat over als er al een bezig is
+    with rollups._sync_lock:
+        assert sync_rollups(rollups, store, wait=False) == 0
+    store.close()
+
+
+def test_andere_trefwoordenlijsten(tmp_path):
+    store = ComplaintStore(str(tmp_path / "klachten.db"))
+    rows = _rows(900, seed=17)
+    store.append(rows[:600])
+    rollups = rollups_from_store(store, max_views=2)
+    parameter_sets = [
+        snapshot_parameters(0.3, ["Infrastructuur"], updated_categories={
+            **categories, "Infrastructuur": categories["Infrastructuur"] + ["straat"]}),
+        snapshot_parameters(0.3, ["Overlast"], updated_categories={**categories, "Overlast": ["lawaai"]}),
+        snapshot_parameters(0.5, ["Overlast"], updated_categories={**categories, "Overlast": ["lawaai"]}),
+    ]
+    for parameters in parameter_sets + [snapshot_parameters()]:
+        _check(rollups, store, parameters)
+    # Nieuwe klachten in een weergave met andere lijsten
+    store.append(rows[600:])
+    sync_rollups(rollups, store)
+    for parameters in parameter_sets[::-1]:
+        _check(rollups, store, parameters)
+    store.close()
+    # Zonder opslag zijn de teksten van verwerkte klachten niet beschikbaar
+    rollups = Rollups()
+    rollups.add_rows(rows[:10])
+    with pytest.raises(ValueError):
+        rollups.summary("categorie", parameter_sets[0])
@@ -0,0 +1,30 @@
+# Alleen de scoringsinstellingen uit REQUEST_OPTIONS mogen via de HTTP-service worden meegegeven.
+import pytest
+
+from klachtenbot.service import score_options
+
+
+def test_toegestane_options():
+    assert score_options({"chunked": True, "max_length": 256, "stride": 64, "aggregate": "mean",
+                          "prefilter_threshold": 0}) == {"chunked": True, "max_length": 256, "stride": 64,
+                                                         "aggregate": "mean", "prefilter_threshold": 0.0}
+    # None betekent: de instelling van de service
+    options = {"backend": None, "prefilter": None, "categorizer": None, "chunked": False}
+    assert score_options(options) == {"chunked": False}
+
+
+@pytest.mark.parametrize("options", [
+    {"prefilter": "/etc/passwd"},
+    {"categorizer": "/tmp/categorieen.npz"},
+    {"backend": "onnx"},
+    {"batch_size": 4096},
+    {"chunked": "ja"},
+    {"max_length": True},
+    {"max_length": 100000},
+    {"stride": -1},
+    {"aggregate": "som"},
+    ["chunked"],
+])
+def test_andere_options_worden_geweigerd(options):
+    with pytest.raises(ValueError):
+        score_options(options)
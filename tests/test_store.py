@@ -0,0 +1,181 @@
+# De in SQL berekende prioriteitsscore en dreiging moeten gelijk zijn aan score_row, en het bladeren door het overzicht
+# (ook via de bijgehouden rangschikking per parameterset) aan sorteren en filteren van alle klachten in Python.
+import random
+
+import pytest
+
+from klachtenbot.results import snapshot_parameters, score_row
+from klachtenbot.store import ComplaintStore
+from klachtenbot.synthetic import ComplaintGenerator
+from klachtenbot.triage import categories, default_neighborhoods
+
+PARAMETER_SETS = [
+    snapshot_parameters(),
+    snapshot_parameters(0.3, ["Afvalbeheer", "Overlast"]),
+    snapshot_parameters(0.3, ["Afvalbeheer"], {**default_neighborhoods, "Lombok": 3, "Zuilen": -2}),
+    snapshot_parameters(0.8, [], {}),
+]
+
+
+# Trefwoordenlijsten met een toegevoegd, een verwijderd en een verplaatst trefwoord, en een ingekorte lijst
+KEYWORD_SETS = [
+    {**categories, "Infrastructuur": categories["Infrastructuur"] + ["straat"]},
+    {**categories, "Afvalbeheer": categories["Afvalbeheer"][1:],
+     "Infrastructuur": [word for word in categories["Infrastructuur"] if word != "verkeer"]},
+    {**categories, "Overlast": ["lawaai"]},
+]
+
+
+def _rows(n, seed):
+    generator = ComplaintGenerator(seed=seed, urgent_rate=0.3)
+    rng = random.Random(seed)
+    rows = []
+    for i, (text, neighborhood) in enumerate(generator.generate(n)):
+        # Ook toxiciteit precies op een drempel; veel gelijke tijdstippen, zodat id de volgorde beslist
+        toxicity = 0.3 if i % 50 == 0 else rng.random() ** 2
+        row = score_row(text, neighborhood, toxicity, snapshot_parameters())
+        row["tijdstip"] = f"2026-03-{1 + i % 28:02d} 09:00:00"
+        rows.append(row)
+    return rows
+
+
+def _expected(store, parameters, neighborhoods=None, threat=None):
+    expected = []
+    for row in store.iter_rows():
+        scored = score_row(row["klacht"], row["wijk"], row["toxiciteit"], parameters, (row["treffers"], row["urgent"]),
+                           row["categorie"])
+        if neighborhoods and row["wijk"] not in neighborhoods or threat is not None and scored["dreigend"] != threat:
+            continue
+        expected.append((row["id"], scored["prioriteitsscore"], scored["dreigend"], row["tijdstip"]))
+    expected.sort(key=lambda item: (-item[1], item[3], item[0]))
+    return [item[:3] for item in expected]
+
+
+def _page(frame):
+    return [(int(i), int(p), bool(d)) for i, p, d in zip(frame["id"], frame["prioriteitsscore"], frame["dreigend"])]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ComplaintStore(str(tmp_path / "klachten.db"))
+    store.append(_rows(1200, seed=5))
+    yield store
+    store.close()
+
+
+def test_sql_prioriteit_gelijk_aan_score_row(store):
+    for parameters in PARAMETER_SETS:
+        expected = _expected(store, parameters)
+        # Via de rangschikking en via de berekende kolommen in SQL (andere sortering)
+        assert _page(store.query(limit=len(expected), parameters=parameters)) == expected
+        newest = store.query(order="oudste", limit=len(expected), parameters=parameters)
+        assert sorted(_page(newest)) == sorted(expected)
+
+
+def test_bladeren_en_tellen(store):
+    neighborhoods = ["Lombok", "Zuilen", "Overvecht"]
+    for parameters in PARAMETER_SETS[:2]:
+        for filters in [{}, {"threat": False}, {"threat": True}, {"neighborhoods": neighborhoods, "threat": False}]:
+            expected = _expected(store, parameters, **filters)
+            pages = []
+            for offset in range(0, len(expected) + 37, 37):
+                pages += _page(store.query(limit=37, offset=offset, parameters=parameters, **filters))
+            assert pages == expected
+            assert store.count(parameters=parameters, **filters) == len(expected)
+
+
+@pytest.mark.parametrize("ranking_views", [1, 2])
+def test_rangschikking_na_toevoegen_en_andere_parameters(tmp_path, ranking_views):
+    store = ComplaintStore(str(tmp_path / "klachten.db"), ranking_views=ranking_views)
+    rows = _rows(900, seed=11)
+    for step, start in enumerate(range(0, len(rows), 150)):
+        store.append(rows[start:start + 150])
+        for parameters in PARAMETER_SETS[step % 2:step % 2 + 3]:
+            expected = _expected(store, parameters)
+            assert _page(store.query(limit=len(expected), parameters=parameters)) == expected
+            assert store.count(threat=True, parameters=parameters) == sum(threat for _, _, threat in expected)
+    assert len(store._rankings) == ranking_views
+    store.close()
+
+
+def _clustered_rows(n, seed):
+    rows = _rows(n, seed)
+    for i, row in enumerate(rows):
+        # Elke vijfde klacht is een kopie van een eerdere representant
+        if i % 5 == 4:
+            row["cluster_row"] = (i // 10) * 10
+    return rows
+
+
+def _expected_collapsed(store, parameters, threat=None):
+    sizes = {}
+    for row in store.iter_rows():
+        key = row["id"] if row["cluster"] is None else row["cluster"]
+        sizes[key] = sizes.get(key, 0) + 1
+    return [(i, p, d, sizes[i]) for i, p, d in _expected(store, parameters, threat=threat) if i in sizes]
+
+
+def _collapsed_page(frame):
+    return [page + (int(size),) for page, size in zip(_page(frame), frame["aantal"])]
+
+
+def test_samengevoegd_bladeren_en_tellen(tmp_path):
+    store = ComplaintStore(str(tmp_path / "klachten.db"))
+    rows = _clustered_rows(600, seed=3)
+    store.append(rows[:300])
+    # In de tweede aanroep verwijzen kopieën van klachten uit de eerste aanroep naar hun id (de ids beginnen bij 1)
+    second = []
+    for row in rows[300:]:
+        if "cluster_row" in row:
+            position = row.pop("cluster_row")
+            row["cluster" if position < 300 else "cluster_row"] = position + 1 if position < 300 else position - 300
+        second.append(row)
+    store.append(second)
+    for parameters in PARAMETER_SETS[:2]:
+        for threat in [None, False, True]:
+            expected = _expected_collapsed(store, parameters, threat)
+            pages = []
+            for offset in range(0, len(expected) + 23, 23):
+                pages += _collapsed_page(store.query(threat=threat, limit=23, offset=offset, parameters=parameters,
+                                                     collapse=True))
+            assert pages == expected
+            assert store.count(threat=threat, parameters=parameters, collapse=True) == len(expected)
+    # Zonder parameters, op de opgeslagen kolommen
+    assert sorted(_collapsed_page(store.query(order="nieuwste", limit=1000, collapse=True))) == sorted(
+        _expected_collapsed(store, snapshot_parameters()))
+    store.close()
+
+
+def test_clustergroottes_uit_oudere_opslag(tmp_path):
+    path = str(tmp_path / "klachten.db")
+    store = ComplaintStore(path)
+    store.append(_clustered_rows(200, seed=4))
+    expected = _expected_collapsed(store, snapshot_parameters())
+    # Een opslag van vóór de tabel met clustergroottes
+    store._db.execute("DROP TABLE clusters")
+    store.close()
+    store = ComplaintStore(path)
+    assert _collapsed_page(store.query(limit=1000, parameters=snapshot_parameters(), collapse=True)) == expected
+    store.close()
+
+
+def test_andere_trefwoordenlijsten(store):
+    parameter_sets = [snapshot_parameters(0.3, ["Infrastructuur", "Overlast"], updated_categories=keywords)
+                      for keywords in KEYWORD_SETS]
+    # Heen en terug, zodat de rangschikking ook vanuit andere lijsten naar de standaardlijsten wordt omgezet
+    default = snapshot_parameters(0.3, ["Infrastructuur", "Overlast"])
+    for parameters in parameter_sets + [default] + parameter_sets[::-1]:
+        # Alle trefwoorden van elke klacht opnieuw zoeken met de nieuwe lijsten
+        rows = list(store.iter_rows())
+        rescored = {row["id"]: score_row(row["klacht"], row["wijk"], row["toxiciteit"], parameters) for row in rows}
+        expected = [(row["id"], rescored[row["id"]]["prioriteitsscore"], rescored[row["id"]]["dreigend"],
+                     rescored[row["id"]]["categorie"]) for row in sorted(
+            rows, key=lambda row: (-rescored[row["id"]]["prioriteitsscore"], row["tijdstip"], row["id"]))]
+        frame = store.query(limit=len(rescored), parameters=parameters)
+        assert [row[:3] for row in expected] == _page(frame)
+        assert [row[3] for row in expected] == list(frame["categorie"])
+        newest = store.query(order="nieuwste", categories=["Infrastructuur"], limit=len(rescored),
+                             parameters=parameters)
+        assert sorted(newest["id"]) == sorted(i for i, row in rescored.items() if row["categorie"] == "Infrastructuur")
+        assert store.count(categories=["Overlast"], parameters=parameters) == sum(
+            row["categorie"] == "Overlast" for row in rescored.values())
@@ -0,0 +1,75 @@
+# Tokencache, indeling in lengtebakjes en gepadde batches. Gebruikt de tokenizer van het lokale testmodel.
+import random
+
+import numpy as np
+import pytest
+
+from klachtenbot.model import registry
+from klachtenbot.tokens import DEFAULT_BUCKETS, TokenCache, bucket_batches, encode, pad_batch, record_padding
+
+
+def test_lru_en_statistieken():
+    cache = TokenCache(maxsize=2)
+    cache.put("a", (np.array([1]),))
+    cache.put("b", (np.array([2]),))
+    assert cache.get("a") is not None
+    # "b" is het langst niet gebruikt en maakt plaats voor "c"
+    cache.put("c", (np.array([3]),))
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+    stats = cache.stats()
+    assert (stats["size"], stats["hits"], stats["misses"]) == (2, 2, 1)
+    assert stats["hit_rate"] == pytest.approx(2 / 3)
+    cache.clear()
+    assert cache.stats()["size"] == 0 and cache.hits == 0
+    # Met maxsize 0 wordt niets bewaard
+    disabled = TokenCache(maxsize=0)
+    disabled.put("a", (np.array([1]),))
+    assert disabled.get("a") is None
+
+
+def test_bakjes():
+    rng = random.Random(3)
+    lengths = [rng.randint(3, 600) for _ in range(500)]
+    batches = bucket_batches(lengths, batch_size=16)
+    assert sorted(index for batch in batches for index in batch) == list(range(len(lengths)))
+    order = [lengths[index] for batch in batches for index in batch]
+    assert order == sorted(order)
+    for batch in batches:
+        assert len(batch) <= 16
+        # Alle vensters van een batch vallen in hetzelfde bakje
+        bounds = {next((bound for bound in DEFAULT_BUCKETS if lengths[index] <= bound), None) for index in batch}
+        assert len(bounds) == 1
+    real, padded = record_padding(lengths, batches, 16, cache=TokenCache())
+    assert real == sum(lengths) and real <= padded
+
+
+def test_padden(test_model):
+    tokenizer = registry.get(test_model).tokenizer
+    windows = [np.array([5, 6, 7], dtype=np.int32), np.array([8], dtype=np.int32)]
+    batch = pad_batch(tokenizer, windows)
+    input_ids = batch["input_ids"].numpy()
+    attention_mask = batch["attention_mask"].numpy()
+    assert input_ids.shape == attention_mask.shape == (2, 3)
+    assert attention_mask.sum(axis=1).tolist() == [3, 1]
+    if tokenizer.padding_side == "left":
+        assert input_ids[1].tolist() == [tokenizer.pad_token_id] * 2 + [8]
+    else:
+        assert input_ids[1].tolist() == [8] + [tokenizer.pad_token_id] * 2
+    np.testing.assert_array_equal(input_ids[0], [5, 6, 7])
+
+
+def test_encode_gebruikt_de_cache(test_model):
+    tokenizer = registry.get(test_model).tokenizer
+    cache = TokenCache()
+    texts = ["Afval naast de container", "Kapotte  lantaarnpaal\nin de straat", "Afval naast de container"]
+    features, owners = encode(tokenizer, texts, 32, False, 0, cache=cache)
+    assert owners == [0, 1, 2]
+    np.testing.assert_array_equal(features[0], features[2])
+    assert (cache.hits, cache.misses) == (0, 3)
+    # Andere witruimte geeft dezelfde sleutel; andere instellingen niet
+    again, _ = encode(tokenizer, ["Kapotte lantaarnpaal in de straat"], 32, False, 0, cache=cache)
+    np.testing.assert_array_equal(again[0], features[1])
+    assert cache.hits == 1
+    encode(tokenizer, ["Kapotte lantaarnpaal in de straat"], 16, False, 0, cache=cache)
+    assert cache.misses == 4
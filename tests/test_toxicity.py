@@ -0,0 +1,76 @@
+# Lange klachten in overlappende tokenvensters: elk venster wordt los gescoord en de scores per tekst samengevoegd
+# met max of mean. Gebruikt het lokale testmodel; de scores zelf zeggen niets over toxiciteit.
+import numpy as np
+import pytest
+
+from klachtenbot.model import registry
+from klachtenbot.synthetic import ComplaintGenerator
+from klachtenbot.tokens import TokenCache, encode
+from klachtenbot.toxicity import _aggregate, _score_encoded, analyze_toxicity_batch
+
+MAX_LENGTH = 32
+STRIDE = 8
+
+
+def _texts():
+    generator = ComplaintGenerator(seed=21, duplicate_rate=0)
+    parts = [text for text, _ in generator.generate(12)]
+    # Eén korte tekst en twee teksten die over meerdere vensters lopen
+    return ["Afval naast de container", " ".join(parts[:5]), " ".join(parts[5:])]
+
+
+def test_samenvoegen_per_tekst():
+    scores = np.array([0.2, 0.9, 0.4, 0.1, 0.6], dtype=np.float32)
+    owners = [0, 0, 0, 2, 2]
+    np.testing.assert_allclose(_aggregate(scores, owners, 3, "max"), [0.9, 0.0, 0.6])
+    np.testing.assert_allclose(_aggregate(scores, owners, 3, "mean"), [0.5, 0.0, 0.35])
+    with pytest.raises(ValueError):
+        _aggregate(scores, owners, 3, "som")
+
+
+def test_vensters_overlappen_met_stride(test_model):
+    loaded = registry.get(test_model)
+    tokenizer = loaded.tokenizer
+    features, owners = encode(tokenizer, _texts(), MAX_LENGTH, True, STRIDE, cache=TokenCache())
+    assert owners[0] == 0 and owners.count(0) == 1
+    special = tokenizer.num_special_tokens_to_add()
+    for text in (1, 2):
+        windows = [features[i] for i, owner in enumerate(owners) if owner == text]
+        assert len(windows) > 2
+        assert all(len(window) <= MAX_LENGTH for window in windows)
+        # Zonder <s> en </s>: de laatste `stride` tokens van een venster zijn de eerste van het volgende
+        content = [window[1:len(window) - special + 1] for window in windows]
+        for previous, following in zip(content, content[1:]):
+            np.testing.assert_array_equal(previous[-STRIDE:], following[:STRIDE])
+    with pytest.raises(ValueError):
+        encode(tokenizer, _texts(), MAX_LENGTH, True, MAX_LENGTH, cache=TokenCache())
+
+
+@pytest.mark.parametrize("aggregate", ["max", "mean"])
+def test_gelijk_aan_losse_vensters(test_model, aggregate):
+    loaded = registry.get(test_model)
+    texts = _texts()
+    features, owners = encode(loaded.tokenizer, texts, MAX_LENGTH, True, STRIDE, cache=TokenCache())
+    window_scores = np.concatenate([_score_encoded(loaded, [window]) for window in features])
+    expected = [getattr(np, aggregate)(window_scores[np.asarray(owners) == i]) for i in range(len(texts))]
+
+    options = {"model_id": test_model, "max_length": MAX_LENGTH, "prefilter": "", "categorizer": ""}
+    scores = analyze_toxicity_batch(texts, batch_size=4, chunked=True, stride=STRIDE, aggregate=aggregate, **options)
+    np.testing.assert_allclose(scores, expected, atol=1e-5)
+    # Een tekst die in één venster past, krijgt dezelfde score als zonder vensters
+    truncated = analyze_toxicity_batch(texts, batch_size=4, **options)
+    assert scores[0] == pytest.approx(truncated[0], abs=1e-6)
+
+
+def test_backends_vergelijken_zonder_voorfilter_en_categoriemodel(test_model, monkeypatch):
+    import klachtenbot.toxicity as toxicity
+    calls = []
+
+    def recording(texts, **kwargs):
+        calls.append(kwargs)
+        return analyze_toxicity_batch(texts, **kwargs)
+
+    monkeypatch.setattr(toxicity, "analyze_toxicity_batch", recording)
+    report = toxicity.compare_backends(_texts(), backends=("torch",), model_id=test_model, repeat=1)
+    assert [row["backend"] for row in report] == ["torch"] and report[0]["max_abs_diff"] == 0.0
+    assert calls and all(call["prefilter"] == "" and call["categorizer"] == "" for call in calls)
@@ -0,0 +1,47 @@
+# De gevectoriseerde prioriteitsscore moet per rij gelijk zijn aan calculate_priority_score.
+import numpy as np
+import pandas as pd
+
+from klachtenbot.triage import (DEFAULT_HIGH_PRIORITY_CATEGORIES, calculate_priority_score, categories,
+                                default_neighborhoods, score_priorities)
+
+
+def _rows(n=5000, seed=3):
+    rng = np.random.default_rng(seed)
+    # Ook scores precies op de drempel en waarden die op .5 uitkomen (afronden naar even)
+    toxicity = np.concatenate([rng.random(n - 4), [0.5, 0.5 + 1e-9, 1 / 6, 5 / 6]])
+    category = rng.choice(list(categories), n)
+    urgent = rng.random(n) < 0.3
+    neighborhood = rng.choice(list(default_neighborhoods) + ["Onbekende wijk"], n)
+    return toxicity, category, urgent, neighborhood
+
+
+def _expected(toxicity, category, urgent, neighborhood, threshold, high_priority, scores):
+    return np.array([calculate_priority_score(t, c, [], "", scores.get(w, 0), threshold, high_priority, bool(u))
+                     for t, c, u, w in zip(toxicity, category, urgent, neighborhood)])
+
+
+def test_gelijk_aan_calculate_priority_score():
+    toxicity, category, urgent, neighborhood = _rows()
+    for threshold, high_priority, scores in [
+        (0.5, DEFAULT_HIGH_PRIORITY_CATEGORIES, default_neighborhoods),
+        (0.2, ["Afvalbeheer", "Overlast"], {name: -score for name, score in default_neighborhoods.items()}),
+        (0.9, [], {}),
+    ]:
+        expected = _expected(toxicity, category, urgent, neighborhood, threshold, high_priority, scores)
+        actual = score_priorities(toxicity, category, urgent, neighborhood, threshold, high_priority, scores)
+        assert actual.dtype == np.int8
+        np.testing.assert_array_equal(actual, expected)
+
+
+def test_pandas_kolommen_en_wijkscores():
+    toxicity, category, urgent, neighborhood = _rows(500)
+    expected = _expected(toxicity, category, urgent, neighborhood, 0.5, DEFAULT_HIGH_PRIORITY_CATEGORIES,
+                         default_neighborhoods)
+    frame = pd.DataFrame({"toxiciteit": toxicity, "categorie": pd.Categorical(category), "urgent": urgent,
+                          "wijk": pd.Categorical(neighborhood)})
+    np.testing.assert_array_equal(score_priorities(frame["toxiciteit"], frame["categorie"], frame["urgent"],
+                                                   frame["wijk"]), expected)
+    # Al berekende wijkscores in plaats van wijknamen
+    neighborhood_scores = np.array([default_neighborhoods.get(name, 0) for name in neighborhood])
+    np.testing.assert_array_equal(score_priorities(toxicity, category, urgent, neighborhood_scores), expected)
@@ -0,0 +1,81 @@
+# Oppakken, afronden en teruggeven via de werklijst, ook met twee werklijsten (bijvoorbeeld twee app-processen) op
+# dezelfde klachtenopslag.
+import time
+
+import pytest
+
+from klachtenbot.results import snapshot_parameters, score_row
+from klachtenbot.store import ComplaintStore
+from klachtenbot.synthetic import ComplaintGenerator
+from klachtenbot.worklist import (CLAIMED, PENDING, claim_next, complete_item, release_item, sync_worklist,
+                                  worklist_from_store)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ComplaintStore(str(tmp_path / "klachten.db"))
+    generator = ComplaintGenerator(seed=9)
+    store.append([score_row(text, neighborhood, 0.1, snapshot_parameters())
+                  for text, neighborhood in generator.generate(200)])
+    yield store
+    store.close()
+
+
+def _order(store):
+    rows = [row for row in store.iter_rows() if not row["dreigend"]]
+    return [row["id"] for row in sorted(rows, key=lambda row: (-row["prioriteitsscore"], row["id"]))]
+
+
+def test_oppakken_en_afronden(store):
+    worklist = worklist_from_store(store)
+    order = _order(store)
+    assert [item["id"] for item in worklist.peek(5)] == order[:5]
+    claimed = claim_next(worklist, store, "anna", 2)
+    assert [item["id"] for item in claimed] == order[:2]
+    assert worklist.status(order[0]) == CLAIMED
+    assert [item["id"] for item in worklist.peek(1)] == order[2:3]
+
+    assert complete_item(worklist, store, order[0], "anna")
+    assert worklist.status(order[0]) is None
+    assert release_item(worklist, store, order[1], "anna")
+    assert worklist.status(order[1]) == PENDING
+    # Een afgeronde klacht kan niet nog eens worden afgerond of teruggegeven
+    assert not complete_item(worklist, store, order[0], "anna")
+    assert not release_item(worklist, store, order[0], "anna")
+    assert [status for _, _, status, _ in store.status_changes()] == [CLAIMED, CLAIMED, "afgerond", PENDING]
+
+
+def test_twee_werklijsten_op_dezelfde_opslag(store):
+    first, second = worklist_from_store(store), worklist_from_store(store)
+    order = _order(store)
+    assert [item["id"] for item in claim_next(first, store, "anna")] == order[:1]
+    # De tweede werklijst weet nog niet dat de klacht is opgepakt; het vastleggen mislukt en de volgende wordt genomen
+    assert [item["id"] for item in claim_next(second, store, "bram")] == order[1:2]
+    assert second.claimed_by("anna")[0]["id"] == order[0]
+
+    complete_item(first, store, order[0], "anna")
+    release_item(second, store, order[1], "bram")
+    sync_worklist(first, store)
+    sync_worklist(second, store)
+    for worklist in (first, second):
+        assert worklist.status(order[0]) is None
+        assert worklist.status(order[1]) == PENDING
+        assert [item["id"] for item in worklist.peek(3)] == order[1:4]
+
+    # Een later opgebouwde werklijst ziet dezelfde status, en alleen nieuwe statusregels worden opnieuw gelezen
+    third = worklist_from_store(store)
+    assert third.status(order[0]) is None and third.status(order[1]) == PENDING
+    assert third.status_rowid == store.status_changes()[-1][0]
+    assert store.status_changes(third.status_rowid) == []
+
+
+def test_opbouwen_op_de_achtergrond(store):
+    worklist = worklist_from_store(store, background=True)
+    deadline = time.monotonic() + 10
+    while not worklist.loaded and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert worklist.loaded
+    assert [item["id"] for item in worklist.peek(5)] == _order(store)[:5]
+    # Een synchronisatie die niet wacht, slaat over als er al een bezig is
+    with worklist._sync_lock:
+        assert sync_worklist(worklist, store, wait=False) == 0